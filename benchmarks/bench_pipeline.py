@@ -0,0 +1,247 @@
+"""Benchmark: load, dedup, patch, write and save phases of the updater pipeline
+
+Runs the current streaming pipeline (and optionally the v1.4.7 pipeline) on
+synthetic Sales_Cube masters and reports wall time, peak RSS and rows/sec per
+phase. Every pipeline runs in its own interpreter so peak memory is not
+carried over from the previous run.
+
+    python benchmarks/bench_pipeline.py --sizes 10k,100k,1m
+    python benchmarks/bench_pipeline.py --sizes 10k --pipelines streaming,legacy --json results.jsonl
+
+The streaming pipeline times both ways of writing the new rows: the patch
+phase appends them by patching the sheet XML (sheetpatch.patch_append, what an
+import normally does) on a copy of the master, the write and save phases run
+the streaming rewrite it falls back to.
+
+The streaming load phase builds the date index from scratch (first run on a
+master). --warm-index times loading an index that is already on disk instead,
+which is what every later run does.
+
+Note: openpyxl writes text as inline strings, which it also reads back much
+more slowly than the shared strings of a workbook saved by Excel, so absolute
+read times on synthetic masters are pessimistic for both pipelines.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from csvtoxcl_updater.memory import peak_rss_mb, reset_peak_rss  # noqa: E402
+
+import synth  # noqa: E402
+
+DATA_DIR = os.path.join(BENCH_DIR, "data")
+PIPELINES = ("streaming", "legacy")
+
+
+# Run the phases one after the other, measuring each on its own
+def run_phases(phases, state):
+    results = []
+    for name, func in phases:
+        reset_peak_rss()
+        start = time.perf_counter()
+        rows = func(state)
+        elapsed = time.perf_counter() - start
+        results.append({
+            "phase": name,
+            "seconds": round(elapsed, 3),
+            "peak_rss_mb": None if peak_rss_mb() is None else round(peak_rss_mb(), 1),
+            "rows": rows,
+            "rows_per_sec": round(rows / elapsed) if elapsed > 0 else None,
+        })
+    return results
+
+
+def streaming_phases():
+    from csvtoxcl_updater.common import prepare_csv, filter_new_dates
+    from csvtoxcl_updater.index import build_index, save_index, load_index
+    from csvtoxcl_updater.sheetpatch import patch_append
+    from csvtoxcl_updater.streaming import write_rewrite, save_rewrite
+    from csvtoxcl_updater.writer import bulk_rows
+
+    def load(state):
+        if state.get("warm_index"):
+            state["index"] = load_index(state["excel_path"])
+        else:
+            state["index"] = build_index(state["excel_path"])
+            save_index(state["excel_path"], state["index"])
+        return state["index"]["row_count"]
+
+    def dedup(state):
+        csv_data, _ = prepare_csv(state["csv_path"], state["index"]["header"])
+        state["new_data"], _, _ = filter_new_dates(csv_data, state["index"]["dates"])
+        return len(csv_data)
+
+    def patch(state):
+        new_data = state["new_data"]
+        date_column = list(new_data.columns).index("Date")
+        layout = patch_append(state["patch_path"], state["index"], bulk_rows(new_data), len(new_data),
+                              len(new_data.columns), date_column=date_column)
+        return layout["row_count"]
+
+    def write(state):
+        new_data = state["new_data"]
+        date_column = list(new_data.columns).index("Date")
+        state["src"], state["dst"], layout = write_rewrite(state["excel_path"], bulk_rows(new_data), date_column=date_column)
+        state["rows"] = layout["row_count"]
+        return layout["row_count"]
+
+    def save(state):
+        save_rewrite(state["excel_path"], state["src"], state["dst"])
+        return state["rows"]
+
+    return [("load", load), ("dedup", dedup), ("patch", patch), ("write", write), ("save", save)]
+
+
+# The v1.4.7 script, cut into the same phases
+def legacy_phases():
+    import pandas as pd
+    from openpyxl import load_workbook
+    from openpyxl.utils.datetime import from_excel
+    from bench_writer import legacy_loop
+    from csvtoxcl_updater.common import normalize_headers
+
+    def parse_excel_date(val):
+        try:
+            if isinstance(val, (int, float)):
+                return from_excel(val).date()
+            return pd.to_datetime(val, errors='coerce').date()
+        except Exception:
+            return None
+
+    def load(state):
+        wb = load_workbook(state["excel_path"])
+        sheet = wb.active
+        for row in range(sheet.max_row, 0, -1):
+            cell_val = sheet.cell(row=row, column=1).value
+            if cell_val is not None and str(cell_val).strip() != "":
+                start_row = row + 1
+                break
+        else:
+            start_row = 2
+        state.update(wb=wb, sheet=sheet, start_row=start_row)
+        return start_row - 2
+
+    def dedup(state):
+        sheet = state["sheet"]
+        csv_df = pd.read_csv(state["csv_path"])
+        excel_headers = list(sheet.iter_rows(min_row=1, max_row=1, values_only=True))[0]
+        if normalize_headers(csv_df.columns) == normalize_headers(excel_headers):
+            csv_data = csv_df.iloc[1:-1].copy()
+        else:
+            csv_data = csv_df[:-1].copy()
+        excel_df = pd.DataFrame([row for row in sheet.iter_rows(min_row=2, values_only=True)], columns=excel_headers)
+        excel_df['__date_only__'] = excel_df['Date'].apply(parse_excel_date)
+        excel_df = excel_df[excel_df['__date_only__'].notnull()]
+        csv_data['__date_only__'] = pd.to_datetime(csv_data['Date'], format='mixed', errors='coerce').dt.date
+        csv_data = csv_data[csv_data['__date_only__'].notnull()]
+        existing_dates = set(excel_df['__date_only__'].unique())
+        duplicate = csv_data['__date_only__'].isin(existing_dates)
+        state["new_data"] = csv_data.loc[~duplicate].drop(columns=['__date_only__'])
+        state["rows"] = len(excel_df)
+        return len(excel_df) + len(csv_data)
+
+    def write(state):
+        legacy_loop(state["sheet"], state["new_data"], state["start_row"])
+        return len(state["new_data"])
+
+    def save(state):
+        state["wb"].save(state["excel_path"])
+        state["wb"].close()
+        return state["rows"] + len(state["new_data"])
+
+    return [("load", load), ("dedup", dedup), ("write", write), ("save", save)]
+
+
+# Child process: run one pipeline on a private copy of the master, print JSON
+def run_case(pipeline, master_path, csv_path, warm_index=False):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        excel_path = os.path.join(tmp_dir, os.path.basename(master_path))
+        shutil.copyfile(master_path, excel_path)
+        phases = streaming_phases() if pipeline == "streaming" else legacy_phases()
+        state = {"excel_path": excel_path, "csv_path": csv_path, "warm_index": warm_index}
+        if pipeline == "streaming":
+            # The patch phase works on its own copy, the rewrite then starts from the same master
+            state["patch_path"] = os.path.join(tmp_dir, "patched.xlsx")
+            shutil.copyfile(master_path, state["patch_path"])
+        if warm_index and pipeline == "streaming":
+            from csvtoxcl_updater.index import build_index, save_index
+            save_index(excel_path, build_index(excel_path))
+
+        devnull = open(os.devnull, "w", encoding="utf-8")
+        stdout, sys.stdout = sys.stdout, devnull  # keep the bilingual console output out of the JSON
+        try:
+            results = run_phases(phases, state)
+        finally:
+            sys.stdout = stdout
+            devnull.close()
+    print(json.dumps(results))
+
+
+def print_table(records):
+    print(f"\n{'rows':>9} {'pipeline':<10} {'phase':<6} {'seconds':>9} {'peak MB':>9} {'rows/sec':>11}")
+    for record in records:
+        for phase in record["phases"]:
+            peak = "-" if phase["peak_rss_mb"] is None else f"{phase['peak_rss_mb']:.0f}"
+            rate = "-" if phase["rows_per_sec"] is None else f"{phase['rows_per_sec']:,}"
+            print(f"{record['master_rows']:>9} {record['pipeline']:<10} {phase['phase']:<6} "
+                  f"{phase['seconds']:>9.2f} {peak:>9} {rate:>11}")
+        total = sum(p["seconds"] for p in record["phases"])
+        print(f"{'':>9} {record['pipeline']:<10} {'total':<6} {total:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10k,100k", help="master sizes in rows, e.g. 10k,100k,1m")
+    parser.add_argument("--csv-rows", type=int, default=5000, help="rows in the daily CSV")
+    parser.add_argument("--overlap-rows", type=int, default=100, help="CSV rows dated on a day already in the master")
+    parser.add_argument("--formatted-tail", type=int, default=0, help="formatting-only rows after the master data")
+    parser.add_argument("--pipelines", default="streaming", help="comma separated: " + ",".join(PIPELINES))
+    parser.add_argument("--header-from", default=None, help="copy the column layout of a real master .xlsx")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="cache for the generated files")
+    parser.add_argument("--warm-index", action="store_true", help="time loading an existing date index instead of building it")
+    parser.add_argument("--json", default=None, help="append the results as JSON lines to this file")
+    parser.add_argument("--run", nargs=3, metavar=("PIPELINE", "MASTER", "CSV"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_case(*args.run, warm_index=args.warm_index)
+        return
+
+    header = synth.header_from_master(args.header_from) if args.header_from else synth.HEADER
+    records = []
+    for size in [synth.parse_size(s) for s in args.sizes.split(",")]:
+        master_path, csv_path = synth.ensure_files(args.data_dir, size, args.csv_rows, header,
+                                                   args.formatted_tail, args.overlap_rows)
+        for pipeline in args.pipelines.split(","):
+            print(f"running {pipeline} on {size} rows ...", flush=True)
+            command = [sys.executable, os.path.abspath(__file__), "--run", pipeline, master_path, csv_path]
+            if args.warm_index:
+                command.append("--warm-index")
+            output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+            records.append({
+                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "pipeline": pipeline,
+                "master_rows": size,
+                "csv_rows": args.csv_rows,
+                "warm_index": args.warm_index,
+                "phases": json.loads(output.strip().splitlines()[-1]),
+            })
+
+    print_table(records)
+    if args.json:
+        with open(args.json, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Benchmark: cold start of the command line entry point, checked against a budget
+
+Every case runs in a fresh interpreter, the way a scheduled task starts it:
+
+    help     python -m csvtoxcl_updater --help (argument parsing only)
+    append   python -m csvtoxcl_updater append daily.csv master.xlsx on a small
+             master whose date index is already on disk
+
+The script also checks which heavy modules each case imported: --help must
+not load pandas, openpyxl or tkinter, and append must not load openpyxl or
+tkinter. It exits with status 1 when a case is over its budget (best of
+--repeat runs) or imported a module it should not have.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --budget-help 0.3 --budget-append 2.0 --repeat 5
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+import synth  # noqa: E402
+
+DATA_DIR = os.path.join(BENCH_DIR, "data")
+HEAVY_MODULES = ("pandas", "openpyxl", "tkinter", "tqdm")
+NOT_ALLOWED = {"help": ("pandas", "openpyxl", "tkinter", "tqdm"), "append": ("openpyxl", "tkinter", "tqdm")}
+
+# Runs main() in the child and reports the heavy modules it ended up importing
+CHILD = """
+import json, sys
+from csvtoxcl_updater.__main__ import main
+try:
+    main(sys.argv[1:])
+except SystemExit:
+    pass
+sys.stdout = sys.__stdout__
+print(json.dumps([m for m in %r if m in sys.modules]))
+"""
+
+
+def run_child(args, cwd):
+    env = dict(os.environ, PYTHONPATH=REPO_DIR + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", CHILD % (HEAVY_MODULES,)] + args, cwd=cwd, env=env,
+                            check=True, capture_output=True, text=True).stdout
+    elapsed = time.perf_counter() - start
+    return elapsed, json.loads(output.strip().splitlines()[-1])
+
+
+def time_case(name, repeat, master_path, csv_path):
+    timings, modules = [], []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        excel_path = os.path.join(tmp_dir, "master.xlsx")
+        for _ in range(repeat):
+            if name == "help":
+                elapsed, modules = run_child(["--help"], tmp_dir)
+            else:
+                shutil.copyfile(master_path, excel_path)
+                shutil.copyfile(master_path + ".index.json", excel_path + ".index.json")
+                elapsed, modules = run_child(["append", csv_path, excel_path], tmp_dir)
+            timings.append(elapsed)
+    return min(timings), modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-help", type=float, default=0.5, help="seconds allowed for --help (default: 0.5)")
+    parser.add_argument("--budget-append", type=float, default=3.0,
+                        help="seconds allowed for a small append (default: 3.0)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case, the best one counts")
+    parser.add_argument("--master-rows", type=int, default=2000, help="rows in the synthetic master")
+    parser.add_argument("--csv-rows", type=int, default=400, help="rows in the daily CSV")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="cache for the generated files")
+    args = parser.parse_args()
+
+    master_path, csv_path = synth.ensure_files(args.data_dir, args.master_rows, args.csv_rows)
+    if not os.path.exists(master_path + ".index.json"):
+        from csvtoxcl_updater.index import build_index, save_index
+        save_index(master_path, build_index(master_path))
+
+    failed = False
+    print(f"{'case':<8} {'seconds':>8} {'budget':>8}  heavy modules imported")
+    for name, budget in (("help", args.budget_help), ("append", args.budget_append)):
+        seconds, modules = time_case(name, args.repeat, master_path, csv_path)
+        bad = [m for m in modules if m in NOT_ALLOWED[name]]
+        status = "ok" if seconds <= budget and not bad else "OVER BUDGET" if not bad else "NOT LAZY: " + ", ".join(bad)
+        failed = failed or status != "ok"
+        print(f"{name:<8} {seconds:>8.2f} {budget:>8.2f}  {', '.join(modules) or '-'}  {status}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Benchmark: v1.4.7 per-cell iterrows() loop against the bulk row writer
+
+    python benchmarks/bench_writer.py --rows 50000 --cols 30
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.utils.datetime import to_excel
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from csvtoxcl_updater.writer import append_dataframe, bulk_rows  # noqa: E402
+
+
+# Daily-CSV shaped frame: Date as text, a few text columns, the rest numbers
+def make_frame(rows, cols):
+    rng = np.random.default_rng(0)
+    data = {"Date": pd.date_range("2025-01-01", periods=max(rows // 500, 1)).strftime("%m/%d/%Y").repeat(500)[:rows]}
+    for i in range(1, cols):
+        if i % 3 == 0:
+            data[f"Text{i}"] = rng.choice(["Alpha", "Beta", "Gamma", "Delta"], size=rows)
+        else:
+            data[f"Num{i}"] = rng.random(rows) * 1000
+    df = pd.DataFrame(data)
+    df.index = range(1, rows + 1)  # same index as csv_df.iloc[1:-1]
+    return df
+
+
+# The write loop exactly as v1.4.7 runs it
+def legacy_loop(sheet, new_data, start_row):
+    for row_idx, row in new_data.iterrows():
+        for col_idx, col_name in enumerate(new_data.columns, start=1):
+            value = row[col_name]
+            cell = sheet.cell(row=start_row + row_idx - 1, column=col_idx)
+
+            if col_name == 'Date':
+                try:
+                    parsed_date = pd.to_datetime(value, errors='coerce')
+                    if pd.notnull(parsed_date):
+                        cell.value = to_excel(parsed_date.to_pydatetime())
+                        cell.number_format = '0'
+                    else:
+                        cell.value = value
+                except Exception:
+                    cell.value = value
+            else:
+                cell.value = value
+
+
+def bulk_sheet(sheet, new_data, start_row):
+    append_dataframe(sheet, new_data, start_row)
+
+
+def bulk_write_only(sheet, new_data, start_row):
+    for row in bulk_rows(new_data):
+        sheet.append(row)
+
+
+# Time writing the rows plus saving the workbook
+def timed(label, func, df, write_only=False):
+    wb = Workbook(write_only=write_only)
+    sheet = wb.create_sheet() if write_only else wb.active
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        start = time.perf_counter()
+        func(sheet, df, 2)
+        written = time.perf_counter()
+        wb.save(os.path.join(tmp_dir, "bench.xlsx"))
+        saved = time.perf_counter()
+    print(f"{label:<32} write {written - start:8.2f} s   write+save {saved - start:8.2f} s")
+    return written - start, saved - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--cols", type=int, default=30)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows, args.cols)
+    print(f"{args.rows} rows x {args.cols} columns = {args.rows * args.cols} cells\n")
+
+    legacy = timed("v1.4.7 iterrows loop", legacy_loop, df)
+    bulk = timed("bulk writer (normal sheet)", bulk_sheet, df)
+    stream = timed("bulk writer (write-only sheet)", bulk_write_only, df, write_only=True)
+
+    print(f"\nspeedup normal sheet:     write {legacy[0] / bulk[0]:6.1f}x   write+save {legacy[1] / bulk[1]:6.1f}x")
+    print(f"speedup write-only sheet: write {legacy[0] / stream[0]:6.1f}x   write+save {legacy[1] / stream[1]:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
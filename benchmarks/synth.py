@@ -0,0 +1,123 @@
+"""Synthetic Sales_Cube data for the benchmarks
+
+Masters are written the way the updater leaves them (Date as an Excel serial
+with number format '0'), daily CSVs the way the ERP exports them: header row,
+the extra first row that iloc[1:-1] strips, the data rows and a trailing
+totals row.
+"""
+
+import csv
+import os
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+
+# Column layout of the Sales_Cube master (use --header-from to copy a real one)
+HEADER = [
+    "Date", "Invoice No", "Customer No", "Customer Name", "Region", "Sales Rep",
+    "Product No", "Product Name", "Product Line", "Quantity", "Unit Price", "Amount", "Currency",
+]
+ROWS_PER_DAY = 400
+START_DATE = pd.Timestamp("2020-01-01")
+EXCEL_EPOCH = pd.Timestamp("1899-12-30")
+
+NUMERIC_HINTS = ("qty", "quantity", "amount", "price", "value", "menge", "betrag", "preis", "umsatz")
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    factor = {"k": 1000, "m": 1000000}.get(text[-1], 1)
+    return int(float(text.rstrip("km")) * factor)
+
+
+def header_from_master(excel_path):
+    wb = load_workbook(excel_path, read_only=True)
+    try:
+        return [str(h) for h in next(wb.active.iter_rows(max_row=1, values_only=True)) if h is not None]
+    finally:
+        wb.close()
+
+
+def _is_numeric(name):
+    return any(hint in name.lower() for hint in NUMERIC_HINTS)
+
+
+# n_rows of sales lines starting at first_row (row position decides the date)
+def make_frame(header, first_row, n_rows, rows_per_day=ROWS_PER_DAY, seed=0):
+    rng = np.random.default_rng(seed + first_row)
+    positions = np.arange(first_row, first_row + n_rows)
+    data = {}
+    for i, name in enumerate(header):
+        if name == "Date":
+            data[name] = START_DATE + pd.to_timedelta(positions // rows_per_day, unit="D")
+        elif _is_numeric(name):
+            data[name] = np.round(rng.random(n_rows) * 1000, 2)
+        else:
+            pool = 40 if i % 2 else 400
+            data[name] = np.char.add(f"{name[:12]} ", rng.integers(0, pool, n_rows).astype(str))
+    return pd.DataFrame(data, columns=header)
+
+
+# Master workbook with n_rows data rows, plus formatting-only rows after the data
+def write_master(path, n_rows, header=HEADER, rows_per_day=ROWS_PER_DAY, formatted_tail=0, chunk=50000):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sales_Cube")
+    ws.append(header)
+    date_pos = header.index("Date")
+
+    for first in range(0, n_rows, chunk):
+        frame = make_frame(header, first, min(chunk, n_rows - first), rows_per_day)
+        frame["Date"] = (frame["Date"] - EXCEL_EPOCH).dt.days
+        for row in frame.itertuples(index=False, name=None):
+            row = list(row)
+            cell = WriteOnlyCell(ws, value=int(row[date_pos]))
+            cell.number_format = '0'
+            row[date_pos] = cell
+            ws.append(row)
+
+    for _ in range(formatted_tail):
+        cell = WriteOnlyCell(ws, value=None)
+        cell.number_format = '0'
+        ws.append([cell])
+
+    wb.save(path)
+
+
+# Daily CSV export: n_rows lines for the day after the master ends, the first
+# overlap_rows of them moved onto the master's last day (to exercise dedup)
+def write_daily_csv(path, master_rows, n_rows, header=HEADER, rows_per_day=ROWS_PER_DAY, overlap_rows=0):
+    first_row = (master_rows // rows_per_day + 1) * rows_per_day
+    frame = make_frame(header, first_row, n_rows, rows_per_day=max(n_rows, 1), seed=1)
+    frame["Date"] = START_DATE + pd.Timedelta(days=first_row // rows_per_day)
+    if overlap_rows:
+        frame.loc[:overlap_rows - 1, "Date"] = START_DATE + pd.Timedelta(days=(master_rows - 1) // rows_per_day)
+    frame["Date"] = frame["Date"].dt.strftime("%m/%d/%Y")
+
+    totals = ["Total"] + ["" for _ in header[1:]]
+    for i, name in enumerate(header):
+        if _is_numeric(name):
+            totals[i] = round(float(frame[name].sum()), 2)
+
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerow(header)
+        writer.writerows(frame.itertuples(index=False, name=None))
+        writer.writerow(totals)
+
+
+# Generated files are cached in data_dir, keyed by size and layout
+def ensure_files(data_dir, master_rows, csv_rows, header=HEADER, formatted_tail=0, overlap_rows=0):
+    os.makedirs(data_dir, exist_ok=True)
+    tag = f"{master_rows}_{len(header)}c_{formatted_tail}t"
+    master_path = os.path.join(data_dir, f"master_{tag}.xlsx")
+    csv_path = os.path.join(data_dir, f"daily_{tag}_{csv_rows}_{overlap_rows}o.csv")
+    if not os.path.exists(master_path):
+        print(f"generating {master_path} ...", flush=True)
+        write_master(master_path + ".part", master_rows, header, formatted_tail=formatted_tail)
+        os.replace(master_path + ".part", master_path)
+    if not os.path.exists(csv_path):
+        write_daily_csv(csv_path, master_rows, csv_rows, header, overlap_rows=overlap_rows)
+    return master_path, csv_path
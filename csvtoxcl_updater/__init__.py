@@ -0,0 +1,4 @@
+# PowerBI Sales Cube Updater / PowerBI Sales Cube Aktualisierer
+# Package form of the csvtoxcl_updater_v1.x scripts.
+
+__version__ = "1.5.0"
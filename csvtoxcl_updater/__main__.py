@@ -0,0 +1,469 @@
+# Command line entry point: python -m csvtoxcl_updater <command> ...
+#
+# Only argparse is imported up front. pandas, openpyxl and tkinter are
+# imported inside the commands that use them, so --help, a mistyped command
+# and scheduled runs on a server without a display start quickly; the file
+# dialogs only come up with the "interactive" command.
+# benchmarks/bench_startup.py keeps the cold start within its budget.
+
+import argparse
+import time
+
+from csvtoxcl_updater import __version__
+
+
+# Script Header Information and Description
+def print_banner():
+    print("=" * 40)
+    print("\U0001F4E6 PowerBI Sales Cube Updater")
+    print("\U0001F4E6 PowerBI Sales Cube Aktualisierer")
+    print("=" * 40)
+    print(f"Version: {__version__}")
+    print("Autor / Author: George Schwenzfeger")
+    print("Kontakt / Contact: gschwenzfeger@bryanmedical.net\n")
+
+    # English
+    print("\U0001F4D8 Description:")
+    print("This script imports sales data from a selected CSV file and appends it to an existing Excel file.")
+    print("✅ Skips rows with dates already present in the Excel.")
+    print("✅ Matches and skips header row if already in Excel.")
+    print("✅ Streams the Excel file, memory use does not grow with its size.")
+    print("✅ Logs every update with bilingual summary.\n")
+
+    # German
+    print("\U0001F4D7 Beschreibung:")
+    print("Dieses Skript importiert Verkaufsdaten aus einer ausgewählten CSV-Datei und fügt sie einer vorhandenen Excel-Datei hinzu.")
+    print("✅ Überspringt Zeilen mit Datumswerten, die bereits in der Excel-Datei vorhanden sind.")
+    print("✅ Erkennt die Kopfzeile und überspringt sie bei Übereinstimmung.")
+    print("✅ Liest die Excel-Datei streamend, der Speicherbedarf wächst nicht mit ihrer Größe.")
+    print("✅ Protokolliert jeden Import mit zweisprachiger Zusammenfassung.\n")
+
+
+# Bring up Windows file chooser and ask for the CSV and the Excel file
+def choose_files():
+    from tkinter import Tk, filedialog
+    from csvtoxcl_updater.common import say
+
+    root = Tk()
+    root.withdraw()
+
+    csv_path = filedialog.askopenfilename(
+        title="Select CSV File / Wähle die CSV-Datei aus",
+        filetypes=[("CSV files", "*.csv")]
+    )
+    if not csv_path:
+        say("❌ No CSV file selected.", "❌ Keine CSV-Datei ausgewählt.")
+        return None, None
+
+    print("\n\U0001F4C4 CSV file selected:\n" + csv_path)
+    print("\U0001F4C4 CSV-Datei ausgewählt:\n" + csv_path)
+
+    excel_path = filedialog.askopenfilename(
+        title="Select Excel File / Wähle die Excel-Datei aus",
+        filetypes=[("Excel files", "*.xlsx")]
+    )
+    if not excel_path:
+        say("❌ No Excel file selected.", "❌ Keine Excel-Datei ausgewählt.")
+        return None, None
+
+    print("\n\U0001F4C8 Excel file selected:\n" + excel_path)
+    print("\U0001F4C8 Excel-Datei ausgewählt:\n" + excel_path + "\n")
+    return csv_path, excel_path
+
+
+# Import one CSV into the master through the streaming engine
+# (queued for the other updater while it holds the master, see lock.py).
+# inline: text columns written as inline strings ("Order No,Comment", see sheetpatch.py)
+def run_import(csv_path, excel_path, instrument=None, inline=None, allow_rewrite=False):
+    from csvtoxcl_updater.instrument import Instrument
+    from csvtoxcl_updater.lock import lock_or_queue, pending_batches
+
+    if instrument is None:
+        instrument = Instrument("import")
+    try:
+        added_rows = 0
+        lock = lock_or_queue(excel_path, [csv_path], inline=inline)
+        if lock is not None:
+            with lock:
+                added_rows = _run_import(csv_path, excel_path, instrument, lock, inline, allow_rewrite)
+    except BaseException:
+        instrument.finish("error", source=csv_path, excel=excel_path)
+        raise
+    instrument.finish(source=csv_path, excel=excel_path, added_rows=added_rows)
+    if pending_batches(excel_path):
+        from csvtoxcl_updater.batch import drain_queue
+        drain_queue(excel_path, allow_rewrite=allow_rewrite)
+    return added_rows
+
+
+def _run_import(csv_path, excel_path, instrument, lock, inline, allow_rewrite):
+    from csvtoxcl_updater.common import say, read_csv_checked, report_headers, filter_new_dates, build_log_message, write_log
+    from csvtoxcl_updater.index import record_append
+    from csvtoxcl_updater.journal import begin_journal
+    from csvtoxcl_updater.pipeline import index_and_parse
+    from csvtoxcl_updater.schema import load_schema
+    from csvtoxcl_updater.sheetpatch import inline_positions, patch_append, strings_log
+    from csvtoxcl_updater.writer import bulk_rows
+
+    start_time = time.time()    #Tracking process time
+
+    # Files other updaters queued meanwhile go in with this one, through the batch import
+    if lock.pending("date", inline=inline):
+        from csvtoxcl_updater.batch import import_locked
+        return import_locked([csv_path], excel_path, lock, instrument=instrument, inline=inline,
+                             start_time=start_time, allow_rewrite=allow_rewrite)
+
+    schema = load_schema(excel_path)
+    # The index is checked while the CSV is parsed (see pipeline.py)
+    with instrument.stage("load", files=1) as stage:
+        index, (csv_data, csv_headers, header_match) = index_and_parse(
+            excel_path, lambda header: read_csv_checked(csv_path, header, schema))
+        stage.update(index_rows=index["row_count"], rows=len(csv_data))
+    header_log = report_headers(header_match, csv_headers, index["header"])
+    with instrument.stage("dedup") as stage:
+        new_data, skipped_dates_list, new_dates = filter_new_dates(csv_data, index["dates"])
+        stage["rows"] = len(new_data)
+
+    added_rows = len(new_data)
+    if added_rows == 0:
+        say("\U0001F501 All dates in the CSV already exist in the Excel file.",
+            "\U0001F501 Alle Datumswerte aus der CSV-Datei sind bereits vorhanden.\n")
+        return 0
+
+    say(f"\U0001F4E5 Appending {added_rows} new rows to Excel...",
+        f"\U0001F4E5 Füge {added_rows} neue Zeilen in Excel ein...\n")
+
+    date_column = list(new_data.columns).index('Date')
+    inline_columns = inline_positions(inline, new_data.columns)
+    with instrument.stage("journal", rows=added_rows):
+        journal = begin_journal(excel_path, index, bulk_rows(new_data), dedup="date",
+                                column_count=len(new_data.columns), date_column=date_column,
+                                inline_columns=inline_columns, allow_rewrite=allow_rewrite)
+    with journal:
+        with instrument.stage("patch") as stage:
+            layout = patch_append(excel_path, index, bulk_rows(new_data), added_rows, len(new_data.columns),
+                                  date_column=date_column, inline_columns=inline_columns, journal=journal)
+            if layout is not None:
+                stage.update(rows=layout["row_count"], added_rows=layout["added_rows"])
+        if layout is None:
+            from csvtoxcl_updater.streaming import write_rewrite, save_rewrite
+            with instrument.stage("write") as stage:
+                src, dst, layout = write_rewrite(excel_path, bulk_rows(new_data), date_column=date_column,
+                                                 allow_lossy=allow_rewrite)
+                stage.update(rows=layout["row_count"], added_rows=layout["added_rows"],
+                             cells=layout["row_count"] * len(index["header"]))
+            with instrument.stage("save", rows=layout["row_count"]):
+                save_rewrite(excel_path, src, dst, journal)
+        with instrument.stage("record"):
+            record_append(excel_path, index, layout)
+
+    elapsed = time.time() - start_time
+    log_message = build_log_message(added_rows, excel_path, elapsed, header_log, skipped_dates_list)
+    log_message += strings_log(layout)
+    write_log(log_message)
+
+    say("✅ Import complete.", "✅ Import abgeschlossen.\n")
+    print(log_message)
+    return added_rows
+
+
+# Interactive flow with file dialogs, as in the v1.x scripts
+def run_interactive():
+    print_banner()
+    try:
+        csv_path, excel_path = choose_files()
+        if csv_path and excel_path:
+            run_import(csv_path, excel_path)
+
+    # Exception handling:
+    except Exception:
+        import traceback
+        print("\n❌ Error occurred / Fehler ist aufgetreten:")
+        traceback.print_exc()
+
+    # Holds terminal window open until user confirmation:
+    input("\U0001F51A Press ENTER to exit / Drücke ENTER zum Beenden...")
+
+
+# infer-schema: write the column schema of the master next to it
+def run_infer_schema(args):
+    import os
+    from csvtoxcl_updater.common import say
+    from csvtoxcl_updater.schema import schema_path, infer_schema, save_schema
+
+    path = args.output or schema_path(args.excel)
+    if os.path.exists(path) and not args.force:
+        say(f"❌ Schema file already exists (use --force to overwrite): {path}",
+            f"❌ Schema-Datei ist bereits vorhanden (--force zum Überschreiben): {path}")
+        return
+    say("\U0001F50D Reading the Excel file to infer the column types...",
+        "\U0001F50D Lese die Excel-Datei, um die Spaltentypen zu bestimmen...\n")
+    schema = infer_schema(args.excel)
+    save_schema(path, schema)
+    for column in schema["columns"]:
+        print(f"   {column['name']}: {column['type']}")
+    say(f"\n✅ Schema written to {path}. Edit the types there if needed.",
+        f"✅ Schema in {path} geschrieben. Typen können dort angepasst werden.")
+
+
+# store init / store export
+def run_store_command(args):
+    from csvtoxcl_updater.common import say
+    from csvtoxcl_updater.store import store_path, lock_store, init_store, get_store, export_excel
+
+    store_dir = args.store or store_path(args.excel)
+    if args.store_command == "init":
+        say(f"\U0001F4E6 Creating the Parquet store from the Excel file: {store_dir}",
+            f"\U0001F4E6 Lege den Parquet-Speicher aus der Excel-Datei an: {store_dir}\n")
+        with lock_store(store_dir):
+            manifest = init_store(args.excel, store_dir)
+        say(f"✅ {manifest['row_count']} rows stored.", f"✅ {manifest['row_count']} Zeilen gespeichert.")
+    else:
+        with lock_store(store_dir):
+            manifest = get_store(store_dir)
+            say("\U0001F4C8 Regenerating the Excel file from the Parquet store...",
+                "\U0001F4C8 Erzeuge die Excel-Datei neu aus dem Parquet-Speicher...\n")
+            layout = export_excel(store_dir, args.excel, manifest, allow_rewrite=args.allow_rewrite)
+        say(f"✅ {layout['row_count']} rows written to {args.excel}.",
+            f"✅ {layout['row_count']} Zeilen in {args.excel} geschrieben.")
+
+
+# db init / db export / db loads
+def run_db_command(args):
+    from csvtoxcl_updater.common import say
+    from csvtoxcl_updater.db import db_path, init_db, open_db, export_excel, list_loads
+
+    path = args.db or db_path(args.excel)
+    if args.db_command == "init":
+        say(f"\U0001F4E6 Creating the database from the Excel file: {path}",
+            f"\U0001F4E6 Lege die Datenbank aus der Excel-Datei an: {path}\n")
+        rows = init_db(args.excel, path, key=args.key)
+        say(f"✅ {rows} rows stored.", f"✅ {rows} Zeilen gespeichert.")
+        return
+
+    conn, header, _ = open_db(path)
+    try:
+        if args.db_command == "export":
+            say("\U0001F4C8 Regenerating the Excel file from the database...",
+                "\U0001F4C8 Erzeuge die Excel-Datei neu aus der Datenbank...\n")
+            layout = export_excel(conn, header, args.excel, allow_rewrite=args.allow_rewrite)
+            say(f"✅ {layout['row_count']} rows written to {args.excel}.",
+                f"✅ {layout['row_count']} Zeilen in {args.excel} geschrieben.")
+        else:
+            print("\U0001F4CB Loads / Ladevorgänge:")
+            for load in list_loads(conn, args.limit):
+                dates = f"{load['first_date']} – {load['last_date']}" if load["first_date"] else "-"
+                print(f"   #{load['id']} {load['loaded_at']} | {load['source']} ({load['mode']}) | "
+                      f"+{load['rows']} / -{load['removed_rows']} | {dates}")
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m csvtoxcl_updater",
+        description="PowerBI Sales Cube Updater / PowerBI Sales Cube Aktualisierer",
+    )
+    commands = parser.add_subparsers(dest="command")
+
+    # Stage timings always go to import_metrics.jsonl, these add the heavy dumps
+    diagnostics = argparse.ArgumentParser(add_help=False)
+    diagnostics.add_argument("--profile", metavar="FILE", default=None,
+                             help="write a cProfile dump of the run (open with pstats or snakeviz)")
+    diagnostics.add_argument("--trace-memory", metavar="FILE", default=None,
+                             help="trace Python allocations: peak per stage in the metrics, top allocations to FILE")
+
+    # Sheets that can't be patched in place are rewritten, which drops styles, widths and charts
+    rewrite = argparse.ArgumentParser(add_help=False)
+    rewrite.add_argument("--allow-rewrite", action="store_true",
+                         help="rewrite the whole workbook when it can't be patched in place, even though that "
+                              "drops column widths, styles, charts and pivot tables")
+
+    append = commands.add_parser("append", parents=[diagnostics, rewrite], help="import one CSV file into the master")
+    append.add_argument("csv", help="daily CSV export")
+    append.add_argument("excel", help="master Excel file (.xlsx)")
+    append.add_argument("--inline-strings", metavar="COLUMNS", default=None,
+                        help="comma separated text columns written as inline strings instead of shared strings")
+
+    commands.add_parser("interactive", help="choose the CSV and the Excel file in dialogs (as in the v1.x scripts)")
+
+    batch = commands.add_parser("batch", parents=[diagnostics, rewrite], help="import every CSV of a folder or glob in one pass")
+    batch.add_argument("source", help="folder with daily CSV files, or a glob such as 'daily/*.csv'")
+    batch.add_argument("excel", help="master Excel file (.xlsx)")
+    batch.add_argument("--workers", type=int, default=None,
+                       help="processes used to parse the CSVs (default: one per CPU core)")
+    batch.add_argument("--dedup", choices=("date", "row"), default="date",
+                       help="skip whole dates already in Excel (default) or only rows already in Excel")
+    batch.add_argument("--key", default=None,
+                       help="with --dedup row: comma separated key columns (default: the whole row)")
+    batch.add_argument("--inline-strings", metavar="COLUMNS", default=None,
+                       help="comma separated text columns written as inline strings instead of shared strings")
+
+    replace = commands.add_parser("replace", parents=[diagnostics, rewrite], help="replace the Excel rows of every date the CSV files cover")
+    replace.add_argument("source", help="corrected CSV file, folder or glob")
+    replace.add_argument("excel", help="master Excel file (.xlsx)")
+    replace.add_argument("--workers", type=int, default=None,
+                         help="processes used to parse the CSVs (default: one per CPU core)")
+
+    plan = commands.add_parser("plan", help="show what an import would do, without opening or changing the master")
+    plan.add_argument("source", help="CSV file, folder or glob")
+    plan.add_argument("excel", help="master Excel file (.xlsx)")
+    plan.add_argument("--workers", type=int, default=None,
+                      help="processes used to parse the CSVs (default: one per CPU core)")
+    plan.add_argument("--dedup", choices=("date", "row", "replace"), default="date",
+                      help="plan for skipping dates (default), skipping rows already in Excel, or replacing dates")
+    plan.add_argument("--key", default=None,
+                      help="with --dedup row: comma separated key columns (default: the whole row)")
+
+    infer = commands.add_parser("infer-schema", help="create the column schema (<excel>.schema.json) from the master")
+    infer.add_argument("excel", help="master Excel file (.xlsx)")
+    infer.add_argument("--output", default=None, help="schema file (default: <excel>.schema.json)")
+    infer.add_argument("--force", action="store_true", help="overwrite an existing schema file")
+
+    stream = commands.add_parser("stream", parents=[diagnostics, rewrite],
+                                 help="import one very large CSV in chunks with bounded memory")
+    stream.add_argument("csv", help="CSV export")
+    stream.add_argument("excel", help="master Excel file (.xlsx)")
+    stream.add_argument("--chunk-rows", type=int, default=None,
+                        help="CSV rows read at a time (default: 100000)")
+    stream.add_argument("--dedup", choices=("date", "row"), default="date",
+                        help="skip whole dates already in Excel (default) or only rows already in Excel")
+    stream.add_argument("--key", default=None,
+                        help="with --dedup row: comma separated key columns (default: the whole row)")
+
+    route = commands.add_parser("route", parents=[diagnostics, rewrite],
+                                help="parse the CSV files once and update every target of a routing config")
+    route.add_argument("source", help="CSV file, folder or glob")
+    route.add_argument("config", help="routing config (.json) listing the target workbooks/sheets")
+    route.add_argument("--workers", type=int, default=None,
+                       help="processes used to parse the CSVs (default: one per CPU core)")
+    route.add_argument("--dedup", choices=("date", "row", "replace"), default="date",
+                       help="skip dates already in a target (default), skip rows already in it, or replace dates")
+    route.add_argument("--key", default=None,
+                       help="with --dedup row: comma separated key columns (default: the whole row)")
+    route.add_argument("--inline-strings", metavar="COLUMNS", default=None,
+                       help="comma separated text columns written as inline strings instead of shared strings")
+
+    watch = commands.add_parser("watch", parents=[rewrite], help="keep running and import every CSV that lands in a folder")
+    watch.add_argument("folder", help="drop folder, e.g. '03_Daily Files'")
+    watch.add_argument("excel", help="master Excel file (.xlsx)")
+    watch.add_argument("--poll", type=float, default=None, help="seconds between folder checks (default: 2)")
+    watch.add_argument("--settle", type=float, default=None,
+                       help="seconds a file must stay unchanged before it is imported (default: 3)")
+    watch.add_argument("--catch-up", action="store_true", help="also import the CSV files already in the folder")
+    watch.add_argument("--once", action="store_true", help="stop as soon as there is nothing left to import")
+    watch.add_argument("--workers", type=int, default=None,
+                       help="processes used to parse the CSVs (default: one per CPU core)")
+    watch.add_argument("--dedup", choices=("date", "row"), default="date",
+                       help="skip whole dates already in Excel (default) or only rows already in Excel")
+    watch.add_argument("--key", default=None,
+                       help="with --dedup row: comma separated key columns (default: the whole row)")
+    watch.add_argument("--inline-strings", metavar="COLUMNS", default=None,
+                       help="comma separated text columns written as inline strings instead of shared strings")
+
+    store = commands.add_parser("store", help="Parquet store next to the master, with the Excel file as an export")
+    store_commands = store.add_subparsers(dest="store_command", required=True)
+    store_init = store_commands.add_parser("init", help="create the Parquet store from the master Excel file")
+    store_init.add_argument("excel", help="master Excel file (.xlsx)")
+    store_append = store_commands.add_parser("append", parents=[diagnostics, rewrite], help="import CSV files into the Parquet store")
+    store_append.add_argument("source", help="CSV file, folder or glob")
+    store_append.add_argument("excel", help="master Excel file (.xlsx) the store belongs to")
+    store_append.add_argument("--workers", type=int, default=None,
+                              help="processes used to parse the CSVs (default: one per CPU core)")
+    store_append.add_argument("--replace", action="store_true",
+                              help="replace the stored rows of every date the CSV files cover")
+    store_append.add_argument("--export", action="store_true", help="regenerate the Excel file afterwards")
+    store_export = store_commands.add_parser("export", parents=[rewrite], help="regenerate the Excel file from the Parquet store")
+    store_export.add_argument("excel", help="master Excel file (.xlsx)")
+    for sub in (store_init, store_append, store_export):
+        sub.add_argument("--store", default=None, help="store folder (default: <excel>.parquet)")
+
+    db = commands.add_parser("db", help="SQLite database next to the master, with the Excel file as an export")
+    db_commands = db.add_subparsers(dest="db_command", required=True)
+    db_init = db_commands.add_parser("init", help="create the database from the master Excel file")
+    db_init.add_argument("excel", help="master Excel file (.xlsx)")
+    db_init.add_argument("--key", default=None,
+                         help="comma separated columns for --dedup row (default: the whole row)")
+    db_append = db_commands.add_parser("append", parents=[diagnostics, rewrite], help="import CSV files into the database")
+    db_append.add_argument("source", help="CSV file, folder or glob")
+    db_append.add_argument("excel", help="master Excel file (.xlsx) the database belongs to")
+    db_append.add_argument("--workers", type=int, default=None,
+                           help="processes used to parse the CSVs (default: one per CPU core)")
+    db_append.add_argument("--dedup", choices=("date", "row", "replace"), default="date",
+                           help="skip dates already stored (default), skip rows already stored, or replace dates")
+    db_append.add_argument("--export", action="store_true", help="regenerate the Excel file afterwards")
+    db_export = db_commands.add_parser("export", parents=[rewrite], help="regenerate the Excel file from the database")
+    db_export.add_argument("excel", help="master Excel file (.xlsx)")
+    db_loads = db_commands.add_parser("loads", help="show what was loaded when")
+    db_loads.add_argument("excel", help="master Excel file (.xlsx)")
+    db_loads.add_argument("--limit", type=int, default=20, help="number of loads to show (default: 20)")
+    for sub in (db_init, db_append, db_export, db_loads):
+        sub.add_argument("--db", default=None, help="database file (default: <excel>.sqlite)")
+
+    args = parser.parse_args(argv)
+
+    if args.command is None:
+        parser.print_help()
+        return 0
+    if args.command == "interactive":
+        run_interactive()
+        return 0
+
+    if args.command == "plan":
+        from csvtoxcl_updater.plan import run_plan
+        run_plan(args.source, args.excel, dedup=args.dedup, key=args.key, workers=args.workers)
+        return 0
+    if args.command == "infer-schema":
+        run_infer_schema(args)
+        return 0
+    if args.command == "watch":
+        from csvtoxcl_updater.watch import run_watch, POLL_SECONDS, SETTLE_SECONDS
+        run_watch(args.folder, args.excel, dedup=args.dedup, key=args.key, workers=args.workers,
+                  inline=args.inline_strings, poll=args.poll or POLL_SECONDS, settle=args.settle or SETTLE_SECONDS,
+                  catch_up=args.catch_up, once=args.once, allow_rewrite=args.allow_rewrite)
+        return 0
+    if args.command == "store" and args.store_command != "append":
+        run_store_command(args)
+        return 0
+    if args.command == "db" and args.db_command != "append":
+        run_db_command(args)
+        return 0
+
+    from csvtoxcl_updater.instrument import Instrument
+
+    command = f"{args.command} append" if args.command in ("store", "db") else args.command
+    instrument = Instrument(command, profile_path=args.profile, trace_memory_path=args.trace_memory)
+    if args.command == "append":
+        run_import(args.csv, args.excel, instrument=instrument, inline=args.inline_strings,
+                   allow_rewrite=args.allow_rewrite)
+    elif args.command == "batch":
+        from csvtoxcl_updater.batch import run_batch
+        run_batch(args.source, args.excel, workers=args.workers, dedup=args.dedup, key=args.key,
+                  instrument=instrument, inline=args.inline_strings, allow_rewrite=args.allow_rewrite)
+    elif args.command == "replace":
+        from csvtoxcl_updater.batch import run_batch
+        run_batch(args.source, args.excel, workers=args.workers, dedup="replace", instrument=instrument,
+                  allow_rewrite=args.allow_rewrite)
+    elif args.command == "stream":
+        from csvtoxcl_updater.chunked import run_chunked_import, CHUNK_ROWS
+        run_chunked_import(args.csv, args.excel, dedup=args.dedup, key=args.key,
+                           chunk_rows=args.chunk_rows or CHUNK_ROWS, instrument=instrument,
+                           allow_rewrite=args.allow_rewrite)
+    elif args.command == "route":
+        from csvtoxcl_updater.route import run_routes
+        run_routes(args.source, args.config, workers=args.workers, dedup=args.dedup, key=args.key,
+                   instrument=instrument, inline=args.inline_strings, allow_rewrite=args.allow_rewrite)
+    elif args.command == "store":
+        from csvtoxcl_updater.batch import run_store_batch
+        run_store_batch(args.source, args.excel, store_dir=args.store, workers=args.workers,
+                        replace=args.replace, export=args.export, instrument=instrument,
+                        allow_rewrite=args.allow_rewrite)
+    elif args.command == "db":
+        from csvtoxcl_updater.batch import run_db_batch
+        run_db_batch(args.source, args.excel, path=args.db, workers=args.workers, dedup=args.dedup,
+                     export=args.export, instrument=instrument, allow_rewrite=args.allow_rewrite)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
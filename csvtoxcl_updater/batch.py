@@ -0,0 +1,469 @@
+# Headless batch mode
+#
+# Drains a folder (or glob) of daily CSVs into the master with a single
+# workbook read and a single save. The CSVs are parsed in parallel (see
+# ingest.py), sorted by their first date, deduped against the master and
+# against each other (the earlier file wins), and all new rows are appended
+# in one streaming pass. In replace mode (see upsert.py) the dates the CSVs
+# cover are rewritten instead of skipped.
+
+import glob
+import itertools
+import os
+import time
+import traceback
+
+import numpy as np
+import pandas as pd
+
+from csvtoxcl_updater.common import say, report_headers, filter_new_dates, build_log_message, write_log
+from csvtoxcl_updater.dedup import resolve_key, get_row_hashes, filter_new_rows, record_hashes
+from csvtoxcl_updater.index import record_append
+from csvtoxcl_updater.ingest import ingest_many, to_frame
+from csvtoxcl_updater.instrument import Instrument
+from csvtoxcl_updater.journal import begin_journal
+from csvtoxcl_updater.lock import lock_or_queue, pending_batches, try_lock
+from csvtoxcl_updater.pipeline import index_and_parse
+from csvtoxcl_updater.schema import load_schema
+from csvtoxcl_updater.sheetpatch import inline_positions, patch_append, patch_replace, strings_log
+from csvtoxcl_updater.streaming import write_rewrite, save_rewrite
+from csvtoxcl_updater.upsert import latest_per_date, plan_replacements
+from csvtoxcl_updater.writer import bulk_rows
+
+
+# A directory means every *.csv in it, anything else is used as a glob pattern
+def find_csv_files(source):
+    if os.path.isdir(source):
+        pattern = os.path.join(source, "*.csv")
+    else:
+        pattern = source
+    return sorted(p for p in glob.glob(pattern) if p.lower().endswith(".csv"))
+
+
+def _frame_rows(frames):
+    return itertools.chain.from_iterable(bulk_rows(f) for f in frames)
+
+
+# Import every CSV found in source into excel_path with one load and one save
+# dedup="date"    skips dates already in the master
+# dedup="row"     skips rows whose key columns (key, default the whole row) are already in the master
+# dedup="replace" replaces the master rows of every date the CSVs cover
+# inline lists text columns written as inline strings (see sheetpatch.py)
+# Stage timings go to import_metrics.jsonl through instrument (see instrument.py)
+# While another updater holds the master, the files are queued for it (see lock.py).
+def run_batch(source, excel_path, workers=None, dedup="date", key=None, instrument=None, inline=None,
+              allow_rewrite=False):
+    if instrument is None:
+        instrument = Instrument("replace" if dedup == "replace" else "batch")
+    try:
+        added_rows = _run_batch(source, excel_path, workers, dedup, key, instrument, inline, allow_rewrite)
+    except BaseException:
+        instrument.finish("error", source=source, excel=excel_path, dedup=dedup)
+        raise
+    instrument.finish(source=source, excel=excel_path, dedup=dedup, added_rows=added_rows)
+    drain_queue(excel_path, workers, allow_rewrite)
+    return added_rows
+
+
+def _run_batch(source, excel_path, workers, dedup, key, instrument, inline, allow_rewrite):
+    start_time = time.time()    #Tracking process time
+
+    csv_paths = find_csv_files(source)
+    if not csv_paths:
+        say(f"❌ No CSV files found in: {source}", f"❌ Keine CSV-Dateien gefunden in: {source}")
+        return 0
+
+    lock = lock_or_queue(excel_path, csv_paths, dedup, key, inline)
+    if lock is None:
+        return 0
+    with lock:
+        return import_locked(csv_paths, excel_path, lock, workers, dedup, key, instrument, inline, start_time,
+                             allow_rewrite)
+
+
+# Import csv_paths, plus the queued batches with the same settings, into the
+# master whose lock is held, with one load and one save
+def import_locked(csv_paths, excel_path, lock, workers=None, dedup="date", key=None, instrument=None, inline=None,
+                  start_time=None, allow_rewrite=False):
+    instrument = instrument or Instrument("target", metrics_path=None)
+    start_time = start_time or time.time()
+    csv_paths = list(csv_paths) + lock.take_pending(dedup, key, inline)
+    schema = load_schema(excel_path)
+
+    def parse(header):
+        return ingest_many(csv_paths, header, workers=workers, schema=schema)
+
+    say(f"\U0001F4C2 Reading {len(csv_paths)} CSV files...",
+        f"\U0001F4C2 Lese {len(csv_paths)} CSV-Dateien...")
+    # The index is checked while the CSVs are parsed (see pipeline.py)
+    with instrument.stage("load", files=len(csv_paths)) as stage:
+        index, results = index_and_parse(excel_path, parse)
+        stage.update(index_rows=index["row_count"],
+                     rows=sum(len(r["arrays"][0]) if r["arrays"] else 0 for r in results))
+
+    added_rows = update_target(results, excel_path, index, dedup, key, instrument, start_time, inline, allow_rewrite)
+    lock.done()
+    return added_rows
+
+
+# Import the batches other updaters queued for excel_path that no run has
+# merged yet (queued while the lock holder was already saving, or with other
+# dedup settings). Left to the next holder when the master is locked again.
+# allow_rewrite is the --allow-rewrite of the run that drains the queue.
+def drain_queue(excel_path, workers=None, allow_rewrite=False):
+    while pending_batches(excel_path):
+        lock = try_lock(excel_path)
+        if lock is None:
+            return
+        instrument = Instrument("queued")
+        try:
+            with lock:
+                batches = pending_batches(excel_path)
+                if not batches:
+                    instrument.finish(excel=excel_path, added_rows=0)
+                    return
+                batch = batches[0][1]
+                added_rows = import_locked([], excel_path, lock, workers, batch["dedup"], batch["key"], instrument,
+                                           batch["inline"], allow_rewrite=allow_rewrite)
+        except Exception:
+            instrument.finish("error", excel=excel_path)
+            traceback.print_exc()
+            say("❌ Importing the queued CSV files failed, they stay in the queue.",
+                "❌ Import der CSV-Dateien aus der Warteschlange fehlgeschlagen, sie bleiben in der Warteschlange.\n")
+            return
+        instrument.finish(excel=excel_path, dedup=batch["dedup"], added_rows=added_rows)
+
+
+# Dedup already parsed CSV results (see ingest.py) against one target sheet and
+# append the new rows (patched in place, or in one streaming pass when that is
+# not possible or dates are replaced), then update its index and the log.
+# The rewrite drops styles, widths and charts and only runs with allow_rewrite
+# on workbooks that have them (see streaming.check_rewrite).
+def update_target(results, excel_path, index, dedup="date", key=None, instrument=None, start_time=None, inline=None,
+                  allow_rewrite=False):
+    instrument = instrument or Instrument("target", metrics_path=None)
+    start_time = start_time or time.time()
+    sheet_name = index.get("sheet")
+
+    if dedup == "row":
+        with instrument.stage("hashes") as stage:
+            key_columns = resolve_key(key, index["header"])
+            master_hashes = get_row_hashes(excel_path, index, key_columns)
+            known_hashes = master_hashes
+            stage["rows"] = len(master_hashes)
+
+    with instrument.stage("dedup") as stage:
+        # Replacing compares against nothing, every parsed row is kept
+        known_dates = set() if dedup == "replace" else set(index["dates"])
+        frames, header_logs, skipped, file_lines = [], [], [], []
+        skipped_rows = 0
+        for result in results:
+            csv_path = result["path"]
+            print("\n\U0001F4C4 " + os.path.basename(csv_path))
+            header_log = report_headers(result["header_match"], result["csv_headers"], index["header"])
+            if dedup == "row":
+                new_data, duplicates, new_dates, new_hashes = filter_new_rows(to_frame(result), known_hashes, key_columns)
+                known_hashes = np.concatenate([known_hashes, new_hashes])
+                skipped_rows += duplicates
+            elif dedup == "replace":
+                new_data, _, new_dates = filter_new_dates(to_frame(result), set())
+            else:
+                new_data, skipped_dates_list, new_dates = filter_new_dates(to_frame(result), known_dates)
+                skipped.extend(skipped_dates_list)
+            known_dates |= new_dates
+            if header_log not in header_logs:
+                header_logs.append(header_log)
+            file_lines.append(f"   \U0001F4C4 {os.path.basename(csv_path)}: {len(new_data)}\n")
+            if len(new_data):
+                frames.append(new_data)
+        stage["rows"] = sum(len(f) for f in frames)
+
+    if dedup == "replace":
+        frames = latest_per_date(frames)
+
+    added_rows = sum(len(f) for f in frames)
+    if added_rows == 0:
+        if dedup == "row":
+            say("\U0001F501 All rows in the CSV files already exist in the Excel file.",
+                "\U0001F501 Alle Zeilen aus den CSV-Dateien sind bereits vorhanden.\n")
+        else:
+            say("\U0001F501 All dates in the CSV files already exist in the Excel file.",
+                "\U0001F501 Alle Datumswerte aus den CSV-Dateien sind bereits vorhanden.\n")
+        return 0
+
+    date_positions = {list(f.columns).index('Date') for f in frames}
+    if len(date_positions) != 1:
+        raise ValueError("❌ CSV files have different column layouts.\n❌ Die CSV-Dateien haben unterschiedliche Spaltenaufbauten.")
+    date_column = date_positions.pop()
+
+    replace_log = ""
+    if dedup == "replace":
+        replace_ranges, to_append, replaced_dates, removed_rows = plan_replacements(index, pd.concat(frames))
+        if replaced_dates:
+            replaced_str = ", ".join(str(d) for d in replaced_dates)
+            say(f"\n♻️ Replacing {removed_rows} rows of {len(replaced_dates)} dates already in Excel: {replaced_str}",
+                f"♻️ Ersetze {removed_rows} Zeilen von {len(replaced_dates)} vorhandenen Datumswerten: {replaced_str}")
+            replace_log = (
+                f"♻️ Replaced dates ({removed_rows} rows removed): {replaced_str}\n"
+                f"♻️ Ersetzte Datumswerte ({removed_rows} Zeilen entfernt): {replaced_str}\n"
+            )
+        appended = [to_append]
+    else:
+        replace_ranges = ()
+        appended = frames
+
+    say(f"\n\U0001F4E5 Writing {added_rows} new rows from {len(frames)} files to Excel...",
+        f"\U0001F4E5 Schreibe {added_rows} neue Zeilen aus {len(frames)} Dateien in Excel...\n")
+
+    column_count = max(len(f.columns) for f in frames)
+    inline_columns = inline_positions(inline, frames[0].columns)
+    # The rows go to the journal first, so a cut-off save can be replayed (see journal.py)
+    with instrument.stage("journal", rows=added_rows):
+        journal = begin_journal(excel_path, index, _frame_rows(appended), replace_ranges, dedup=dedup,
+                                column_count=column_count, date_column=date_column, inline_columns=inline_columns,
+                                allow_rewrite=allow_rewrite)
+
+    with journal:
+        # The sheet XML is patched in place (see sheetpatch.py), the rewrite is the fallback
+        with instrument.stage("patch") as stage:
+            if dedup == "replace":
+                layout = patch_replace(excel_path, index, replace_ranges, _frame_rows(appended), len(to_append),
+                                       column_count, sheet_name=sheet_name, date_column=date_column,
+                                       inline_columns=inline_columns, journal=journal)
+            else:
+                layout = patch_append(excel_path, index, _frame_rows(appended), added_rows, column_count,
+                                      sheet_name=sheet_name, date_column=date_column,
+                                      inline_columns=inline_columns, journal=journal)
+            if layout is not None:
+                stage.update(rows=layout["row_count"], added_rows=layout["added_rows"])
+
+        if layout is None:
+            with instrument.stage("write") as stage:
+                src, dst, layout = write_rewrite(excel_path, _frame_rows(appended), sheet_name=sheet_name,
+                                                 date_column=date_column, replace_ranges=replace_ranges,
+                                                 allow_lossy=allow_rewrite)
+                stage.update(rows=layout["row_count"], added_rows=layout["added_rows"],
+                             cells=layout["row_count"] * len(index["header"]))
+            with instrument.stage("save", rows=layout["row_count"]):
+                save_rewrite(excel_path, src, dst, journal)
+
+        with instrument.stage("record"):
+            if dedup == "row":
+                record_hashes(excel_path, index, master_hashes, known_hashes[len(master_hashes):])
+            elif dedup == "replace":
+                index.pop("hash_key", None)  # removed rows are still in the row hash set
+            record_append(excel_path, index, layout)
+
+    elapsed = time.time() - start_time
+    log_message = build_log_message(added_rows, excel_path, elapsed, "".join(header_logs), sorted(set(skipped)),
+                                    skipped_rows=skipped_rows)
+    log_message += replace_log
+    log_message += strings_log(layout)
+    log_message += "\U0001F4C2 Files / Dateien (new rows / neue Zeilen):\n" + "".join(file_lines)
+    write_log(log_message)
+
+    say("✅ Import complete.", "✅ Import abgeschlossen.\n")
+    print(log_message)
+    return added_rows
+
+
+# Import every CSV found in source into the Parquet store of excel_path (see store.py).
+# Dates already stored are skipped, or replaced with replace=True; with export=True
+# the Excel master is regenerated from the store afterwards.
+def run_store_batch(source, excel_path, store_dir=None, workers=None, replace=False, export=False, instrument=None,
+                    allow_rewrite=False):
+    from csvtoxcl_updater.store import store_path, lock_store
+
+    if instrument is None:
+        instrument = Instrument("store append")
+    store_dir = store_dir or store_path(excel_path)
+    try:
+        # One writer at a time, from reading the manifest to the export (see store.py)
+        with lock_store(store_dir):
+            added_rows = _run_store_batch(source, excel_path, store_dir, workers, replace, export, instrument,
+                                          allow_rewrite)
+    except BaseException:
+        instrument.finish("error", source=source, excel=excel_path, replace=replace)
+        raise
+    instrument.finish(source=source, excel=excel_path, replace=replace, added_rows=added_rows)
+    return added_rows
+
+
+def _run_store_batch(source, excel_path, store_dir, workers, replace, export, instrument, allow_rewrite):
+    from csvtoxcl_updater.store import get_store, store_dates, append_to_store, replace_in_store, export_excel
+
+    start_time = time.time()    #Tracking process time
+
+    csv_paths = find_csv_files(source)
+    if not csv_paths:
+        say(f"❌ No CSV files found in: {source}", f"❌ Keine CSV-Dateien gefunden in: {source}")
+        return 0
+
+    with instrument.stage("index") as stage:
+        manifest = get_store(store_dir)
+        stage["rows"] = manifest["row_count"]
+
+    say(f"\U0001F4C2 Reading {len(csv_paths)} CSV files...",
+        f"\U0001F4C2 Lese {len(csv_paths)} CSV-Dateien...")
+    with instrument.stage("ingest", files=len(csv_paths)) as stage:
+        results = ingest_many(csv_paths, manifest["header"], workers=workers, schema=load_schema(excel_path))
+        stage["rows"] = sum(len(r["arrays"][0]) if r["arrays"] else 0 for r in results)
+
+    with instrument.stage("dedup") as stage:
+        known_dates = set() if replace else store_dates(manifest)
+        frames, header_logs, skipped, file_lines = [], [], [], []
+        for result in results:
+            csv_path = result["path"]
+            print("\n\U0001F4C4 " + os.path.basename(csv_path))
+            header_log = report_headers(result["header_match"], result["csv_headers"], manifest["header"])
+            new_data, skipped_dates_list, new_dates = filter_new_dates(to_frame(result), known_dates)
+            skipped.extend(skipped_dates_list)
+            if not replace:
+                known_dates |= new_dates
+            if header_log not in header_logs:
+                header_logs.append(header_log)
+            file_lines.append(f"   \U0001F4C4 {os.path.basename(csv_path)}: {len(new_data)}\n")
+            if len(new_data):
+                frames.append(new_data)
+        if replace:
+            frames = latest_per_date(frames)
+        stage["rows"] = sum(len(f) for f in frames)
+
+    added_rows = sum(len(f) for f in frames)
+    replace_log = ""
+    if added_rows:
+        say(f"\n\U0001F4E5 Writing {added_rows} new rows from {len(frames)} files to the Parquet store...",
+            f"\U0001F4E5 Schreibe {added_rows} neue Zeilen aus {len(frames)} Dateien in den Parquet-Speicher...\n")
+        with instrument.stage("write", rows=added_rows):
+            new_data = pd.concat(frames, ignore_index=True)
+            if replace:
+                replaced_dates, removed_rows = replace_in_store(store_dir, manifest, new_data)
+                if replaced_dates:
+                    replaced_str = ", ".join(str(d) for d in replaced_dates)
+                    replace_log = (
+                        f"♻️ Replaced dates ({removed_rows} rows removed): {replaced_str}\n"
+                        f"♻️ Ersetzte Datumswerte ({removed_rows} Zeilen entfernt): {replaced_str}\n"
+                    )
+            else:
+                append_to_store(store_dir, manifest, new_data)
+    else:
+        say("\U0001F501 All dates in the CSV files already exist in the Parquet store.",
+            "\U0001F501 Alle Datumswerte aus den CSV-Dateien sind bereits im Parquet-Speicher vorhanden.\n")
+
+    if export:
+        say("\U0001F4C8 Regenerating the Excel file from the Parquet store...",
+            "\U0001F4C8 Erzeuge die Excel-Datei neu aus dem Parquet-Speicher...\n")
+        with instrument.stage("export", rows=manifest["row_count"]):
+            export_excel(store_dir, excel_path, manifest, allow_rewrite=allow_rewrite)
+
+    if added_rows == 0:
+        return 0
+
+    elapsed = time.time() - start_time
+    log_message = build_log_message(added_rows, store_dir, elapsed, "".join(header_logs), sorted(set(skipped)))
+    log_message += replace_log
+    log_message += "\U0001F4C2 Files / Dateien (new rows / neue Zeilen):\n" + "".join(file_lines)
+    write_log(log_message)
+
+    say("✅ Import complete.", "✅ Import abgeschlossen.\n")
+    print(log_message)
+    return added_rows
+
+
+# Import every CSV found in source into the SQLite database of excel_path (see db.py),
+# one load per file. dedup works as in run_batch; with export=True the Excel master
+# is regenerated from the database afterwards.
+def run_db_batch(source, excel_path, path=None, workers=None, dedup="date", export=False, instrument=None,
+                 allow_rewrite=False):
+    if instrument is None:
+        instrument = Instrument("db append")
+    try:
+        added_rows = _run_db_batch(source, excel_path, path, workers, dedup, export, instrument, allow_rewrite)
+    except BaseException:
+        instrument.finish("error", source=source, excel=excel_path, dedup=dedup)
+        raise
+    instrument.finish(source=source, excel=excel_path, dedup=dedup, added_rows=added_rows)
+    return added_rows
+
+
+def _run_db_batch(source, excel_path, path, workers, dedup, export, instrument, allow_rewrite):
+    from csvtoxcl_updater.db import db_path, open_db, existing_dates, existing_keys, load_rows, export_excel
+    from csvtoxcl_updater.dates import date_only
+    from csvtoxcl_updater.dedup import row_hashes
+
+    start_time = time.time()    #Tracking process time
+    path = path or db_path(excel_path)
+
+    csv_paths = find_csv_files(source)
+    if not csv_paths:
+        say(f"❌ No CSV files found in: {source}", f"❌ Keine CSV-Dateien gefunden in: {source}")
+        return 0
+
+    conn, header, key_columns = open_db(path)
+    try:
+        say(f"\U0001F4C2 Reading {len(csv_paths)} CSV files...",
+            f"\U0001F4C2 Lese {len(csv_paths)} CSV-Dateien...")
+        with instrument.stage("ingest", files=len(csv_paths)) as stage:
+            results = ingest_many(csv_paths, header, workers=workers, schema=load_schema(excel_path))
+            stage["rows"] = sum(len(r["arrays"][0]) if r["arrays"] else 0 for r in results)
+
+        added_rows = skipped_rows = removed_rows = 0
+        header_logs, skipped, file_lines, replaced_dates = [], [], [], set()
+        with instrument.stage("load") as stage:
+            for result in results:
+                csv_path = result["path"]
+                print("\n\U0001F4C4 " + os.path.basename(csv_path))
+                header_log = report_headers(result["header_match"], result["csv_headers"], header)
+                frame = to_frame(result)
+                if dedup == "row":
+                    known_keys = existing_keys(conn, row_hashes(frame, key_columns))
+                    new_data, duplicates, _, _ = filter_new_rows(frame, known_keys, key_columns)
+                    skipped_rows += duplicates
+                elif dedup == "replace":
+                    new_data, _, _ = filter_new_dates(frame, set())
+                else:
+                    known_dates = existing_dates(conn, set(date_only(frame['Date']).dropna()))
+                    new_data, skipped_dates_list, _ = filter_new_dates(frame, known_dates)
+                    skipped.extend(skipped_dates_list)
+
+                if len(new_data):
+                    rows, replaced, removed = load_rows(conn, new_data, header, key_columns,
+                                                        os.path.basename(csv_path), dedup)
+                    added_rows += rows
+                    removed_rows += removed
+                    replaced_dates.update(replaced)
+                if header_log not in header_logs:
+                    header_logs.append(header_log)
+                file_lines.append(f"   \U0001F4C4 {os.path.basename(csv_path)}: {len(new_data)}\n")
+            stage["rows"] = added_rows
+
+        if added_rows == 0:
+            say("\U0001F501 All rows in the CSV files already exist in the database.",
+                "\U0001F501 Alle Zeilen aus den CSV-Dateien sind bereits in der Datenbank vorhanden.\n")
+
+        if export:
+            say("\U0001F4C8 Regenerating the Excel file from the database...",
+                "\U0001F4C8 Erzeuge die Excel-Datei neu aus der Datenbank...\n")
+            with instrument.stage("export") as stage:
+                stage["rows"] = export_excel(conn, header, excel_path, allow_rewrite=allow_rewrite)["row_count"]
+    finally:
+        conn.close()
+
+    if added_rows == 0:
+        return 0
+
+    elapsed = time.time() - start_time
+    log_message = build_log_message(added_rows, path, elapsed, "".join(header_logs), sorted(set(skipped)),
+                                    skipped_rows=skipped_rows)
+    if replaced_dates:
+        replaced_str = ", ".join(str(d) for d in sorted(replaced_dates))
+        log_message += (
+            f"♻️ Replaced dates ({removed_rows} rows removed): {replaced_str}\n"
+            f"♻️ Ersetzte Datumswerte ({removed_rows} Zeilen entfernt): {replaced_str}\n"
+        )
+    log_message += "\U0001F4C2 Files / Dateien (new rows / neue Zeilen):\n" + "".join(file_lines)
+    write_log(log_message)
+
+    say("✅ Import complete.", "✅ Import abgeschlossen.\n")
+    print(log_message)
+    return added_rows
@@ -0,0 +1,193 @@
+# Chunked import for very large exports
+#
+# Month-end and year-end exports are several GB. pd.read_csv on the whole file
+# followed by iloc[1:-1].copy() and the dedup filters holds three or four
+# copies of it at once. Here the CSV is read in blocks of chunk_rows rows:
+# the repeated header row is dropped from the first block, and the trailing
+# totals row is dropped by always holding back one block until the next one
+# has been read, so the end of the file is known without buffering it. Every
+# block is filtered against the date index (or the row hash set) and its rows
+# go straight into the journal of the import (see journal.py). The sheet is
+# then patched in place (sheetpatch.py) with the rows read back from the
+# journal, or rewritten by the streaming writer when it can't be patched.
+# Peak memory is set by chunk_rows, not by the size of the export.
+
+import itertools
+import time
+
+import numpy as np
+import pandas as pd
+
+from csvtoxcl_updater.common import say, normalize_headers, report_headers, filter_new_dates, build_log_message, write_log
+from csvtoxcl_updater.csvscan import scan_csv, read_csv_range
+from csvtoxcl_updater.dedup import resolve_key, get_row_hashes, filter_new_rows, record_hashes
+from csvtoxcl_updater.index import get_index, record_append
+from csvtoxcl_updater.journal import begin_journal, recover_import
+from csvtoxcl_updater.lock import wait_lock
+from csvtoxcl_updater.pipeline import prefetch
+from csvtoxcl_updater.instrument import Instrument
+from csvtoxcl_updater.schema import load_schema, csv_read_options, finish_typed
+from csvtoxcl_updater.sheetpatch import patch_append, strings_log
+from csvtoxcl_updater.streaming import write_rewrite, save_rewrite
+from csvtoxcl_updater.writer import bulk_rows
+
+CHUNK_ROWS = 100000
+
+
+# Header check on the first line only, returns (csv_headers, header_match)
+def read_csv_header(csv_path, excel_headers):
+    csv_headers = list(pd.read_csv(csv_path, nrows=0).columns)
+    return csv_headers, normalize_headers(csv_headers) == normalize_headers(excel_headers)
+
+
+# Data blocks of the CSV without the repeated header row and the totals row.
+# With a repeated header row in the file pandas reads every column as text;
+# dtype=str keeps the blocks the same as the whole-file read. With a column
+# schema (see schema.py) the blocks are typed and the header row is skipped
+# by the parser. With the layout of the pre-scan (csvscan.py) the parser only
+# sees the data range and the blocks come out as they are.
+def iter_csv_chunks(csv_path, header_match, chunk_rows=CHUNK_ROWS, schema=None, csv_headers=None, layout=None):
+    if layout is not None:
+        if schema is not None:
+            options = csv_read_options(layout.headers, False, schema)
+        else:
+            options = {"dtype": str if layout.header_match else None}
+        for chunk in read_csv_range(csv_path, layout, chunksize=chunk_rows, **options):
+            yield _finish(chunk, schema)
+        return
+
+    if schema is not None:
+        options = csv_read_options(csv_headers or read_csv_header(csv_path, ())[0], header_match, schema)
+        skip_first = False
+    else:
+        options = {"dtype": str if header_match else None}
+        skip_first = header_match
+
+    reader = pd.read_csv(csv_path, chunksize=chunk_rows, **options)
+    with reader:
+        previous = next(reader, None)
+        if previous is None:
+            return
+        if skip_first:
+            previous = previous.iloc[1:]  # skip header line
+        for chunk in reader:
+            yield _finish(previous, schema)
+            previous = chunk
+        yield _finish(previous.iloc[:-1], schema)  # skip total line
+
+
+def _finish(chunk, schema):
+    return chunk if schema is None else finish_typed(chunk.copy(), schema)
+
+
+# Import one (large) CSV into the master, chunk_rows rows at a time
+# dedup="date" skips dates already in the master, dedup="row" rows already in it (see dedup.py)
+def run_chunked_import(csv_path, excel_path, dedup="date", key=None, chunk_rows=CHUNK_ROWS, instrument=None,
+                       allow_rewrite=False):
+    if instrument is None:
+        instrument = Instrument("stream")
+    try:
+        with wait_lock(excel_path):
+            added_rows = _run_chunked_import(csv_path, excel_path, dedup, key, chunk_rows, instrument, allow_rewrite)
+    except BaseException:
+        instrument.finish("error", source=csv_path, excel=excel_path, dedup=dedup, chunk_rows=chunk_rows)
+        raise
+    instrument.finish(source=csv_path, excel=excel_path, dedup=dedup, chunk_rows=chunk_rows, added_rows=added_rows)
+    return added_rows
+
+
+def _run_chunked_import(csv_path, excel_path, dedup, key, chunk_rows, instrument, allow_rewrite):
+    start_time = time.time()    #Tracking process time
+
+    with instrument.stage("index") as stage:
+        recover_import(excel_path)
+        index = get_index(excel_path)
+        stage["rows"] = index["row_count"]
+
+    schema = load_schema(excel_path)
+    layout = scan_csv(csv_path, index["header"])
+    if layout is not None:
+        csv_headers, header_match = layout.headers, layout.header_match
+    else:
+        csv_headers, header_match = read_csv_header(csv_path, index["header"])
+    header_log = report_headers(header_match, csv_headers, index["header"])
+    if 'Date' not in csv_headers:
+        raise ValueError(f"❌ 'Date' column not found in {csv_path}.\n❌ Spalte 'Date' fehlt in {csv_path}.")
+
+    if dedup == "row":
+        with instrument.stage("hashes") as stage:
+            key_columns = resolve_key(key, index["header"])
+            master_hashes = get_row_hashes(excel_path, index, key_columns)
+            stage["rows"] = len(master_hashes)
+
+    skipped_dates, new_hashes = set(), []
+    counts = {"read": 0, "skipped_rows": 0}
+
+    # Rows of each block that are not in the master yet (dedup is against the
+    # master only, as in the whole-file import)
+    def new_chunks():
+        for chunk in iter_csv_chunks(csv_path, header_match, chunk_rows, schema, csv_headers, layout):
+            counts["read"] += len(chunk)
+            if dedup == "row":
+                new_data, duplicates, _, hashes = filter_new_rows(chunk, master_hashes, key_columns)
+                counts["skipped_rows"] += duplicates
+                new_hashes.append(hashes)
+            else:
+                new_data, skipped_list, _ = filter_new_dates(chunk, index["dates"])
+                skipped_dates.update(skipped_list)
+            if len(new_data):
+                yield new_data
+
+    with instrument.stage("stream") as stage:
+        # The next chunk is read and deduped while this one is journaled (see pipeline.py)
+        chunks = prefetch(new_chunks(), depth=1)
+        first = next(chunks, None)
+        if first is None:
+            stage["rows"] = counts["read"]
+            if dedup == "row":
+                say("\U0001F501 All rows in the CSV already exist in the Excel file.",
+                    "\U0001F501 Alle Zeilen aus der CSV-Datei sind bereits vorhanden.\n")
+            else:
+                say("\U0001F501 All dates in the CSV already exist in the Excel file.",
+                    "\U0001F501 Alle Datumswerte aus der CSV-Datei sind bereits vorhanden.\n")
+            return 0
+
+        say(f"\U0001F4E5 Appending new rows to Excel, {chunk_rows} CSV rows at a time...",
+            f"\U0001F4E5 Füge neue Zeilen in Excel ein, je {chunk_rows} CSV-Zeilen...\n")
+        date_column = list(first.columns).index('Date')
+        column_count = len(first.columns)
+        rows = itertools.chain.from_iterable(bulk_rows(c) for c in itertools.chain([first], chunks))
+        journal = begin_journal(excel_path, index, rows, dedup=dedup, column_count=column_count,
+                                date_column=date_column, allow_rewrite=allow_rewrite)
+        stage.update(rows=counts["read"], added_rows=journal.row_count)
+
+    with journal:
+        with instrument.stage("patch") as stage:
+            layout = patch_append(excel_path, index, journal.rows(), journal.row_count, column_count,
+                                  date_column=date_column, journal=journal)
+            if layout is not None:
+                stage.update(rows=layout["row_count"], added_rows=layout["added_rows"])
+
+        if layout is None:
+            with instrument.stage("write") as stage:
+                src, dst, layout = write_rewrite(excel_path, journal.rows(), date_column=date_column,
+                                                 allow_lossy=allow_rewrite)
+                stage.update(rows=layout["row_count"], added_rows=layout["added_rows"])
+            with instrument.stage("save", rows=layout["row_count"]):
+                save_rewrite(excel_path, src, dst, journal)
+
+        with instrument.stage("record"):
+            if dedup == "row":
+                record_hashes(excel_path, index, master_hashes, np.concatenate(new_hashes))
+            record_append(excel_path, index, layout)
+
+    added_rows = layout["added_rows"]
+    elapsed = time.time() - start_time
+    log_message = build_log_message(added_rows, excel_path, elapsed, header_log, sorted(skipped_dates),
+                                    skipped_rows=counts["skipped_rows"])
+    log_message += strings_log(layout)
+    write_log(log_message)
+
+    say("✅ Import complete.", "✅ Import abgeschlossen.\n")
+    print(log_message)
+    return added_rows
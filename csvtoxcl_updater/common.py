@@ -0,0 +1,125 @@
+import os
+from datetime import datetime
+
+import pandas as pd
+
+from csvtoxcl_updater.dates import parse_dates, date_only
+
+# import_log.txt lives next to the scripts, the same place the v1.x scripts write it
+LOG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "import_log.txt")
+
+
+# Print one message in English and German
+def say(english, german):
+    print(english)
+    print(german)
+
+
+# Normalize both file headers to compare and make sure they match
+def normalize_headers(header_row):
+    return [str(h).strip().lower() for h in header_row]
+
+
+# Drop the header/total lines of the CSV export, returns the data and whether the headers matched
+def strip_csv(csv_df, excel_headers):
+    if normalize_headers(csv_df.columns) == normalize_headers(excel_headers):
+        return csv_df.iloc[1:-1].copy(), True  # skip header and total line
+    return csv_df[:-1].copy(), False  # skip total line only
+
+
+# Console output for the header check, returns the matching import_log.txt text
+def report_headers(header_match, csv_headers, excel_headers):
+    if header_match:
+        say("\U0001F9E0 Headers match. CSV header row will be skipped.",
+            "\U0001F9E0 Überschriften stimmen überein. Kopfzeile wird übersprungen.\n")
+        return "\U0001F9E0 Headers matched – CSV header row skipped.\n\U0001F9E0 Überschriften stimmen überein – CSV-Kopfzeile übersprungen.\n"
+
+    say("⚠️ Header mismatch detected. Proceeding anyway.",
+        "⚠️ Überschriften stimmen nicht überein. Fortfahren...\n")
+    print("CSV Headers:\n" + ", ".join(str(h) for h in csv_headers))
+    print("Excel Headers:\n" + ", ".join(str(h) for h in excel_headers) + "\n")
+    return "⚠️ Header mismatch – data appended anyway. Please review structure.\n⚠️ Überschriften stimmen nicht überein – Daten trotzdem angehängt. Bitte Struktur überprüfen.\n"
+
+
+# Load the CSV, compare its headers to the master and drop the header/total lines
+# (with the column schema of the master when there is one, see schema.py).
+# The header and the data range are found by the pre-scan (csvscan.py), so a
+# file without a Date column fails before it is parsed.
+def read_csv_checked(csv_path, excel_headers, schema=None):
+    from csvtoxcl_updater.csvscan import scan_csv, read_csv_range
+    layout = scan_csv(csv_path, excel_headers)
+    if layout is not None and 'Date' not in layout.headers:
+        raise ValueError(f"❌ 'Date' column not found in {csv_path}.\n❌ Spalte 'Date' fehlt in {csv_path}.")
+    if schema is not None:
+        from csvtoxcl_updater.schema import read_csv_typed
+        return read_csv_typed(csv_path, excel_headers, schema, layout)
+    if layout is None:
+        csv_df = pd.read_csv(csv_path)
+        csv_data, header_match = strip_csv(csv_df, excel_headers)
+        return csv_data, list(csv_df.columns), header_match
+    # With a repeated header row the whole-file read had every column as text
+    csv_data = read_csv_range(csv_path, layout, dtype=str if layout.header_match else None)
+    return csv_data, layout.headers, layout.header_match
+
+
+# Same as read_csv_checked, with the header check reported
+def prepare_csv(csv_path, excel_headers, schema=None):
+    csv_data, csv_headers, header_match = read_csv_checked(csv_path, excel_headers, schema)
+    header_log = report_headers(header_match, csv_headers, excel_headers)
+    return csv_data, header_log
+
+
+# Drop every CSV row whose date is already in the master
+# The Date column is parsed once here (unless an ingest worker already did)
+# and the kept rows carry the parsed datetime on to the writer.
+def filter_new_dates(csv_data, existing_dates):
+    csv_data = csv_data.copy()
+    csv_data['Date'] = parse_dates(csv_data['Date'])
+    csv_data['__date_only__'] = date_only(csv_data['Date'])
+    csv_data = csv_data[csv_data['__date_only__'].notnull()]
+
+    is_duplicate = csv_data['__date_only__'].isin(existing_dates)
+    skipped_dates = csv_data.loc[is_duplicate, '__date_only__'].unique()
+    new_dates = set(csv_data.loc[~is_duplicate, '__date_only__'])
+    new_data = csv_data.loc[~is_duplicate].drop(columns=['__date_only__'])
+
+    return new_data, [str(d) for d in sorted(skipped_dates)], new_dates
+
+
+# Bilingual summary line written to import_log.txt and the console
+# (planned=True for the dry run of the plan command: rows that would be added)
+def build_log_message(added_rows, excel_path, elapsed, header_log, skipped_dates_list, skipped_rows=0, planned=False):
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    name = os.path.basename(excel_path)
+    if planned:
+        added = (f"\U0001F4CB {added_rows} rows would be added to '{name}'.",
+                 f"\U0001F4CB {added_rows} Zeilen würden zu '{name}' hinzugefügt.")
+    else:
+        added = (f"✅ {added_rows} rows added to '{name}'.",
+                 f"✅ {added_rows} Zeilen zu '{name}' hinzugefügt.")
+    log_message = (
+        f"{timestamp} | {added[0]} ⏱️ Duration: {elapsed:.2f} seconds\n"
+        f"{timestamp} | {added[1]} ⏱️ Dauer: {elapsed:.2f} Sekunden\n"
+        f"{header_log}"
+    )
+
+    if skipped_dates_list:
+        skipped_str = ", ".join(skipped_dates_list)
+        log_message += (
+            f"❌ Skipped dates (already in Excel): {skipped_str}\n"
+            f"❌ Übersprungene Datumswerte (bereits vorhanden): {skipped_str}\n"
+        )
+
+    if skipped_rows:
+        log_message += (
+            f"❌ Skipped rows (already in Excel): {skipped_rows}\n"
+            f"❌ Übersprungene Zeilen (bereits vorhanden): {skipped_rows}\n"
+        )
+
+    return log_message
+
+
+# Logging what actions were taken
+def write_log(log_message, log_path=LOG_PATH):
+    with open(log_path, "a", encoding="utf-8") as log_file:
+        log_file.write(log_message)
@@ -0,0 +1,118 @@
+# Memory-mapped pre-scan of a CSV export
+#
+# The ERP exports start with the header line, repeat it as the first data
+# line (when it is the header of the master) and end with a totals line.
+# v1.4.7 parsed the whole file and sliced those rows off with iloc[1:-1] or
+# [:-1], a second copy of every row, and only found out that a file has no
+# Date column after parsing all of it.
+#
+# scan_csv maps the file and reads just the header line and the last line from
+# the raw bytes: the header is checked against the master with the rules of
+# normalize_headers before anything is parsed, and the result records the
+# byte range of the data rows (after the repeated header, before the totals
+# line). read_csv_range then hands the parser only that range, straight from
+# the mapping, so nothing has to be sliced off afterwards.
+#
+# Line breaks inside quoted fields of those edge lines can't be told apart
+# from the end of a line without parsing; scan_csv returns None then and the
+# caller reads the file the old way.
+
+import io
+import mmap
+import os
+from collections import namedtuple
+
+import pandas as pd
+
+from csvtoxcl_updater.common import normalize_headers
+
+BOM = b"\xef\xbb\xbf"
+
+CsvLayout = namedtuple("CsvLayout", "headers header_match start end totals")
+
+
+def _line_end(data, pos):
+    end = data.find(b"\n", pos)
+    return len(data) if end < 0 else end + 1
+
+
+def _is_blank(line):
+    return not line.strip(b"\r\n")
+
+
+# Start of the last non-blank line before end
+def _last_line_start(data, end):
+    while end > 0:
+        start = data.rfind(b"\n", 0, end - 1) + 1
+        if not _is_blank(data[start:end]):
+            return start
+        end = start
+    return 0
+
+
+# Header line, header check and data byte range of csv_path,
+# None when the file is empty or an edge line has a quoted line break
+def scan_csv(csv_path, excel_headers):
+    if os.path.getsize(csv_path) == 0:
+        return None
+    with open(csv_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        first = len(BOM) if data[:len(BOM)] == BOM else 0
+        header_end = _line_end(data, first)
+        header_line = data[first:header_end]
+        # Same column names (and renamed duplicates) as a whole-file read
+        headers = [str(h) for h in pd.read_csv(io.BytesIO(header_line), nrows=0).columns]
+        header_match = normalize_headers(headers) == normalize_headers(excel_headers)
+
+        start = header_end
+        while start < len(data) and _is_blank(data[start:_line_end(data, start)]):
+            start = _line_end(data, start)
+        edges = [header_line]
+        if header_match and start < len(data):
+            repeated_end = _line_end(data, start)
+            edges.append(data[start:repeated_end])
+            start = repeated_end
+
+        end = _last_line_start(data, len(data))
+        totals = data[end:] if end >= start else b""
+        edges.append(totals)
+        if any(line.count(b'"') % 2 for line in edges):
+            return None
+        return CsvLayout(headers, header_match, start, max(start, end), totals.rstrip(b"\r\n"))
+
+
+# File object over [start, end) of a memory-mapped file
+class _RangeReader(io.RawIOBase):
+    def __init__(self, data, start, end):
+        self.data = data
+        self.pos = start
+        self.end = end
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self.end - self.pos)
+        buffer[:size] = self.data[self.pos:self.pos + size]
+        self.pos += size
+        return size
+
+
+# Parse the data rows of a scanned CSV (pandas read_csv options apply);
+# with chunksize the chunks are yielded while the file is mapped
+def read_csv_range(csv_path, layout, chunksize=None, **options):
+    options = dict(options, header=None, names=layout.headers)
+    if layout.start == layout.end:
+        frame = pd.read_csv(io.StringIO(""), **options)
+        return iter([frame]) if chunksize else frame
+    if chunksize:
+        return _read_chunks(csv_path, layout, chunksize, options)
+    with open(csv_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        with io.BufferedReader(_RangeReader(data, layout.start, layout.end)) as reader:
+            return pd.read_csv(reader, **options)
+
+
+def _read_chunks(csv_path, layout, chunksize, options):
+    with open(csv_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        with io.BufferedReader(_RangeReader(data, layout.start, layout.end)) as reader:
+            with pd.read_csv(reader, chunksize=chunksize, **options) as chunks:
+                yield from chunks
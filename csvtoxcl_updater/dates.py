@@ -0,0 +1,117 @@
+# Date handling
+#
+# format='mixed' guesses the format of every single value, which is far slower
+# than parsing with one explicit format. Here a sample of the column decides
+# the dominant format (US, German, ISO or Excel serial), the whole column is
+# parsed vectorised with it, and only the rows that don't match fall back to
+# the slow mixed parser.
+
+import pandas as pd
+
+EXCEL_EPOCH = pd.Timestamp("1899-12-30")
+MAX_EXCEL_SERIAL = 2958465  # 9999-12-31
+
+SAMPLE_SIZE = 200
+
+# Candidate formats, most common in our exports first
+DATE_FORMATS = (
+    "%m/%d/%Y",           # US        04/30/2025
+    "%d.%m.%Y",           # German    30.04.2025
+    "%Y-%m-%d",           # ISO       2025-04-30
+    "%Y-%m-%d %H:%M:%S",  # ISO with time, also str() of a datetime
+    "%m/%d/%Y %H:%M",
+    "%d.%m.%Y %H:%M",
+)
+
+
+SERIAL = "serial"
+
+
+# Excel serial numbers (Date cells written with number format '0') as a float Series
+def _serials(values):
+    numeric = pd.to_numeric(values, errors='coerce')
+    return numeric.where(numeric.between(1, MAX_EXCEL_SERIAL))
+
+
+# Parse values with one known format (or as Excel serials)
+def _parse_with(values, fmt):
+    if fmt == SERIAL:
+        serials = _serials(values)
+        return EXCEL_EPOCH + pd.to_timedelta(serials, unit="D")
+    return pd.to_datetime(values, format=fmt, errors='coerce')
+
+
+# Pick the format that matches most of an evenly spread sample of the values
+def detect_format(values, sample_size=SAMPLE_SIZE):
+    values = pd.Series(values)
+    step = max(len(values) // sample_size, 1)
+    sample = values.iloc[::step].dropna()
+    if sample.empty:
+        return None
+
+    best_format, best_hits = None, 0
+    for fmt in (SERIAL,) + DATE_FORMATS:
+        hits = _parse_with(sample, fmt).notna().sum()
+        if hits > best_hits:
+            best_format, best_hits = fmt, hits
+            if hits == len(sample):
+                break
+    return best_format
+
+
+# Parse a whole Date column to datetime64, NaT where a value is not a date
+def parse_dates(values, fmt=None):
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    if pd.api.types.is_numeric_dtype(values):
+        fmt = SERIAL
+
+    fmt = fmt or detect_format(values)
+    if fmt:
+        result = _parse_with(values, fmt).astype("datetime64[ns]")
+    else:
+        result = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+
+    # Slow path only for the rows the dominant format didn't cover
+    missed = result.isna()
+    if missed.any():
+        missed &= values.notna()
+    if missed.any():
+        rest = values[missed]
+        fallback = _parse_with(rest, SERIAL).astype("datetime64[ns]")
+        still = fallback.isna()
+        if still.any():
+            fallback[still] = pd.to_datetime(rest[still].astype(str).str.strip(), format='mixed', errors='coerce').astype("datetime64[ns]")
+        result[missed] = fallback
+
+    return result
+
+
+# Date part only, for dedup (None where the value is not a date)
+def date_only(parsed):
+    return parsed.dt.date.where(parsed.notna(), None)
+
+
+# Parsed dates as Excel serial numbers
+def to_excel_serials(parsed):
+    return (parsed - EXCEL_EPOCH) / pd.Timedelta(days=1)
+
+
+# Group sheet rows into blocks of consecutive rows with the same date:
+# {date: [[first_row, last_row], ...]}
+def date_row_ranges(row_numbers, values):
+    frame = pd.DataFrame({
+        "row": pd.Series(row_numbers, dtype="int64"),
+        "date": date_only(parse_dates(pd.Series(list(values), dtype=object))),
+    }).dropna()
+    if frame.empty:
+        return {}
+
+    new_block = (frame["date"] != frame["date"].shift()) | (frame["row"] != frame["row"].shift() + 1)
+    blocks = frame.groupby(new_block.cumsum()).agg(date=("date", "first"), start=("row", "first"), end=("row", "last"))
+
+    ranges = {}
+    for day, start, end in blocks.itertuples(index=False):
+        ranges.setdefault(day, []).append([int(start), int(end)])
+    return ranges
@@ -0,0 +1,221 @@
+# Local SQLite database backend
+#
+# Instead of editing the workbook, the rows are loaded into a single-file
+# SQLite database next to the master ("<master>.xlsx.sqlite"). Every row
+# carries its date (_date) and the hash of its dedup key (_key), both indexed,
+# so date dedup, row dedup and replace-by-date are indexed lookups and deletes
+# rather than a scan of the whole master. Every run is recorded in the loads
+# table (when, from which file, how many rows, which dates), and each row
+# points to the load that brought it in.
+#
+# The master is imported once with init_db; export_excel writes the rows back
+# into the workbook on demand.
+
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from csvtoxcl_updater.dates import parse_dates, date_only
+from csvtoxcl_updater.dedup import resolve_key, row_hashes
+from csvtoxcl_updater.export import export_frames
+from csvtoxcl_updater.schema import load_schema
+from csvtoxcl_updater.streaming import iter_master_chunks
+
+DB_SUFFIX = ".sqlite"
+DB_VERSION = 1
+TABLE = "sales"
+LOOKUP_BATCH = 500
+FETCH_SIZE = 10000
+
+
+def db_path(excel_path):
+    return excel_path + DB_SUFFIX
+
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _get_meta(conn, name):
+    row = conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+    return None if row is None else json.loads(row[0])
+
+
+def _set_meta(conn, name, value):
+    conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, json.dumps(value)))
+
+
+# Open an existing database, returns (connection, header, key columns)
+def open_db(path):
+    if not os.path.exists(path):
+        raise ValueError(f"❌ No database at {path}, create it first: python -m csvtoxcl_updater db init <master.xlsx>\n"
+                         f"❌ Keine Datenbank unter {path}, bitte zuerst anlegen: python -m csvtoxcl_updater db init <master.xlsx>")
+    conn = sqlite3.connect(path)
+    if _get_meta(conn, "version") != DB_VERSION:
+        conn.close()
+        raise ValueError(f"❌ {path} was created by another version, recreate it with 'db init'.\n"
+                         f"❌ {path} stammt von einer anderen Version, bitte mit 'db init' neu anlegen.")
+    return conn, _get_meta(conn, "header"), _get_meta(conn, "key")
+
+
+def _create_schema(conn, header, key_columns):
+    columns = ", ".join(_quote(name) for name in header)
+    conn.executescript(f"""
+        CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE loads (
+            id INTEGER PRIMARY KEY, loaded_at TEXT, source TEXT, mode TEXT,
+            rows INTEGER, removed_rows INTEGER, first_date TEXT, last_date TEXT
+        );
+        CREATE TABLE {TABLE} (_id INTEGER PRIMARY KEY, _load INTEGER, _date TEXT, _key INTEGER, {columns});
+        CREATE INDEX {TABLE}_date ON {TABLE} (_date);
+        CREATE INDEX {TABLE}_key ON {TABLE} (_key);
+        CREATE INDEX {TABLE}_load ON {TABLE} (_load);
+    """)
+    _set_meta(conn, "version", DB_VERSION)
+    _set_meta(conn, "header", list(header))
+    _set_meta(conn, "key", list(key_columns))
+
+
+# Values SQLite can store: Date as ISO text, NaN as NULL, numpy scalars as python values
+def _db_values(df):
+    arrays = []
+    for name in df.columns:
+        column = df[name]
+        if name == 'Date':
+            parsed = parse_dates(column)
+            column = parsed.dt.strftime("%Y-%m-%d %H:%M:%S").where(parsed.notna(), column)
+        values = column.to_numpy(dtype=object, copy=True)
+        values[pd.isna(values)] = None
+        arrays.append([v.isoformat(" ") if isinstance(v, datetime) else v for v in values])
+    return arrays
+
+
+def _start_load(conn, source, mode):
+    cursor = conn.execute("INSERT INTO loads (loaded_at, source, mode, rows, removed_rows) VALUES (?, ?, ?, 0, 0)",
+                          (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), source, mode))
+    return cursor.lastrowid
+
+
+def _finish_load(conn, load_id, rows, removed_rows=0):
+    conn.execute(f"""UPDATE loads SET rows = ?, removed_rows = ?,
+                     first_date = (SELECT MIN(_date) FROM {TABLE} WHERE _load = ?),
+                     last_date = (SELECT MAX(_date) FROM {TABLE} WHERE _load = ?)
+                     WHERE id = ?""", (rows, removed_rows, load_id, load_id, load_id))
+
+
+# Insert the rows of df (columns in header order) under one load
+def _insert(conn, df, header, key_columns, load_id):
+    if list(df.columns) != list(header):
+        if len(df.columns) != len(header):
+            raise ValueError("❌ The CSV columns don't match the database.\n❌ Die CSV-Spalten passen nicht zur Datenbank.")
+        df = df.set_axis(list(header), axis=1)
+
+    days = date_only(parse_dates(df['Date']))
+    day_text = [None if d is None else d.isoformat() for d in days]
+    keys = row_hashes(df, key_columns).view(np.int64).tolist()
+    placeholders = ", ".join("?" for _ in range(len(header) + 3))
+    conn.executemany(
+        f"INSERT INTO {TABLE} (_load, _date, _key, {', '.join(_quote(n) for n in header)}) VALUES ({placeholders})",
+        zip([load_id] * len(df), day_text, keys, *_db_values(df)),
+    )
+    return len(df)
+
+
+# Import the master workbook into a new database
+def init_db(excel_path, path=None, key=None, sheet_name=None):
+    path = path or db_path(excel_path)
+    if os.path.exists(path):
+        raise ValueError(f"❌ Database already exists: {path}\n❌ Datenbank ist bereits vorhanden: {path}")
+
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        header = key_columns = None
+        rows = 0
+        for chunk in iter_master_chunks(excel_path, sheet_name=sheet_name, schema=load_schema(excel_path)):
+            if header is None:
+                header = [str(h) for h in chunk.columns]
+                if 'Date' not in header:
+                    raise ValueError("❌ 'Date' column not found in the Excel file.\n❌ Spalte 'Date' fehlt in der Excel-Datei.")
+                key_columns = resolve_key(key, header)
+                _create_schema(conn, header, key_columns)
+                load_id = _start_load(conn, os.path.basename(excel_path), "init")
+            rows += _insert(conn, chunk, header, key_columns, load_id)
+        if header is None:
+            raise ValueError("❌ The Excel file has no data rows.\n❌ Die Excel-Datei enthält keine Datenzeilen.")
+        _finish_load(conn, load_id, rows)
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+    return rows
+
+
+def _in_batches(values):
+    values = list(values)
+    for start in range(0, len(values), LOOKUP_BATCH):
+        yield values[start:start + LOOKUP_BATCH]
+
+
+# Which of these dates (date objects) are already in the database
+def existing_dates(conn, days):
+    found = set()
+    for batch in _in_batches(sorted(d.isoformat() for d in days)):
+        query = f"SELECT DISTINCT _date FROM {TABLE} WHERE _date IN ({', '.join('?' for _ in batch)})"
+        found.update(row[0] for row in conn.execute(query, batch))
+    return {d for d in days if d.isoformat() in found}
+
+
+# Which of these key hashes (uint64 array) are already in the database
+def existing_keys(conn, hashes):
+    found = set()
+    for batch in _in_batches(np.unique(hashes).view(np.int64).tolist()):
+        query = f"SELECT DISTINCT _key FROM {TABLE} WHERE _key IN ({', '.join('?' for _ in batch)})"
+        found.update(row[0] for row in conn.execute(query, batch))
+    return np.array(sorted(found), dtype=np.int64).view(np.uint64)
+
+
+# Store new rows as one load; mode "replace" first deletes the rows of every date in df.
+# Returns (added rows, replaced dates, removed rows)
+def load_rows(conn, df, header, key_columns, source, mode):
+    with conn:
+        load_id = _start_load(conn, source, mode)
+        replaced, removed_rows = [], 0
+        if mode == "replace":
+            replaced = sorted(existing_dates(conn, set(date_only(parse_dates(df['Date'])).dropna())))
+            for batch in _in_batches(d.isoformat() for d in replaced):
+                cursor = conn.execute(f"DELETE FROM {TABLE} WHERE _date IN ({', '.join('?' for _ in batch)})", batch)
+                removed_rows += cursor.rowcount
+        added_rows = _insert(conn, df, header, key_columns, load_id)
+        _finish_load(conn, load_id, added_rows, removed_rows)
+    return added_rows, replaced, removed_rows
+
+
+# The loads table, newest first
+def list_loads(conn, limit=20):
+    cursor = conn.execute("SELECT id, loaded_at, source, mode, rows, removed_rows, first_date, last_date "
+                          "FROM loads ORDER BY id DESC LIMIT ?", (limit,))
+    columns = [c[0] for c in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor]
+
+
+# Stored rows in date order, FETCH_SIZE rows per DataFrame (Date as ISO text)
+def iter_db_frames(conn, header):
+    cursor = conn.execute(f"SELECT {', '.join(_quote(n) for n in header)} FROM {TABLE} "
+                          f"ORDER BY _date IS NULL, _date, _id")
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            break
+        yield pd.DataFrame(rows, columns=header)
+
+
+# Regenerate the master sheet from the database; other sheets of the workbook are kept
+def export_excel(conn, header, excel_path, sheet_name=None, allow_rewrite=False):
+    return export_frames(excel_path, header, iter_db_frames(conn, header), sheet_name, allow_rewrite)
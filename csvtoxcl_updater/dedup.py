@@ -0,0 +1,118 @@
+# Row-level dedup by content hash
+#
+# Instead of skipping every CSV row whose date is already in the master, each
+# row is reduced to a 64-bit hash of its key columns (a composite key, or the
+# whole row). The hashes of all master rows are kept as a sorted numpy array in
+# "<master>.xlsx.hashes.npy" next to the date index, 8 bytes per row, so
+# re-importing an overlapping export only adds the rows that are actually new
+# and the check is a vectorised hash lookup, not a DataFrame merge.
+#
+# Values are normalised before hashing so the master and the CSV agree:
+# dates become ISO dates, numbers become floats, text is stripped.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from csvtoxcl_updater.common import say
+from csvtoxcl_updater.dates import parse_dates, date_only
+from csvtoxcl_updater.index import save_index
+from csvtoxcl_updater.schema import load_schema
+from csvtoxcl_updater.streaming import iter_master_chunks
+
+HASHES_SUFFIX = ".hashes.npy"
+
+
+def hashes_path(excel_path):
+    return excel_path + HASHES_SUFFIX
+
+
+# Key columns for a --key option: "Date,Customer,Product" or None for the whole row
+def resolve_key(key, header):
+    if not key:
+        return [str(h) for h in header if h is not None]
+    columns = [c.strip() for c in key.split(",") if c.strip()] if isinstance(key, str) else list(key)
+    missing = [c for c in columns if c not in header]
+    if missing:
+        raise ValueError(f"❌ Key columns not found in the Excel file: {', '.join(missing)}\n"
+                         f"❌ Schlüsselspalten fehlen in der Excel-Datei: {', '.join(missing)}")
+    return columns
+
+
+def _normalise(column, name):
+    if name == 'Date':
+        return date_only(parse_dates(column)).astype(str)
+    numeric = pd.to_numeric(column, errors='coerce')
+    text = column.astype(str).str.strip().where(column.notna(), "")
+    return numeric.astype(float).astype(str).where(numeric.notna(), text)
+
+
+# One uint64 hash per row of df over the key columns
+def row_hashes(df, key_columns):
+    normalised = pd.DataFrame({name: _normalise(df[name], name) for name in key_columns})
+    return pd.util.hash_pandas_object(normalised, index=False).to_numpy(dtype=np.uint64)
+
+
+# Hash every master row once and store the sorted hash set
+def build_hashes(excel_path, key_columns, sheet_name=None):
+    schema = load_schema(excel_path)
+    parts = [row_hashes(chunk, key_columns)
+             for chunk in iter_master_chunks(excel_path, key_columns, sheet_name=sheet_name, schema=schema)]
+    return np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.uint64)
+
+
+def save_hashes(excel_path, hashes):
+    tmp_path = hashes_path(excel_path) + ".tmp.npy"
+    np.save(tmp_path, hashes)
+    os.replace(tmp_path, hashes_path(excel_path))
+
+
+# Stored hash set of the master for these key columns, None when there is
+# none for them. It shares the fingerprint check of the date index, so a
+# valid index with the same key means the stored hashes still describe the master
+def load_row_hashes(excel_path, index, key_columns):
+    if index.get("hash_key") == key_columns and os.path.exists(hashes_path(excel_path)):
+        hashes = np.load(hashes_path(excel_path))
+        if len(hashes) == index.get("hash_count"):
+            return hashes
+    return None
+
+
+# Hash set of the master for these key columns, built (and saved) when the stored one can't be used
+def get_row_hashes(excel_path, index, key_columns):
+    hashes = load_row_hashes(excel_path, index, key_columns)
+    if hashes is not None:
+        return hashes
+
+    say("\U0001F50D Building row hash set of the Excel file...",
+        "\U0001F50D Erstelle Zeilen-Hashes der Excel-Datei...\n")
+    hashes = build_hashes(excel_path, key_columns, index.get("sheet"))
+    save_hashes(excel_path, hashes)
+    index["hash_key"] = key_columns
+    index["hash_count"] = len(hashes)
+    save_index(excel_path, index)
+    return hashes
+
+
+# Keep only the CSV rows whose key hash is not in known_hashes
+def filter_new_rows(csv_data, known_hashes, key_columns):
+    csv_data = csv_data.copy()
+    csv_data['Date'] = parse_dates(csv_data['Date'])
+    csv_data = csv_data[csv_data['Date'].notna()]
+
+    hashes = row_hashes(csv_data, key_columns)
+    is_duplicate = np.isin(hashes, known_hashes)
+    new_data = csv_data.loc[~is_duplicate]
+
+    new_dates = set(date_only(new_data['Date']))
+    return new_data, int(is_duplicate.sum()), new_dates, hashes[~is_duplicate]
+
+
+# Merge the hashes of the appended rows into the stored set
+# (call before record_append, which saves the index)
+def record_hashes(excel_path, index, hashes, new_hashes):
+    hashes = np.union1d(hashes, new_hashes)
+    save_hashes(excel_path, hashes)
+    index["hash_count"] = len(hashes)
+    return hashes
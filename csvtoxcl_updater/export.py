@@ -0,0 +1,45 @@
+# Regenerating the master sheet from another store
+#
+# The Parquet store and the SQLite database keep the rows outside the
+# workbook; the Excel master is rewritten from them on request. All data rows
+# of the target sheet are replaced, other sheets are copied unchanged, and the
+# date index is refreshed from the written layout so the next Excel run does
+# not have to rescan the sheet.
+
+import os
+
+from csvtoxcl_updater.index import INDEX_VERSION, record_append
+from csvtoxcl_updater.journal import recover_import
+from csvtoxcl_updater.lock import wait_lock
+from csvtoxcl_updater.streaming import write_rewrite, save_rewrite
+from csvtoxcl_updater.writer import bulk_rows
+
+MAX_SHEET_ROW = 1048576
+
+
+# Replace the data rows of the master sheet with the rows of frames (an iterable of DataFrames).
+# A master with styles, widths or charts is only rewritten with allow_rewrite (see streaming.check_rewrite).
+def export_frames(excel_path, header, frames, sheet_name=None, allow_rewrite=False):
+    with wait_lock(excel_path):
+        # Settle a cut-off import first, so its journal does not outlive the export
+        recover_import(excel_path)
+        return _export_frames(excel_path, header, frames, sheet_name, allow_rewrite)
+
+
+def _export_frames(excel_path, header, frames, sheet_name, allow_rewrite):
+    if not os.path.exists(excel_path):
+        from openpyxl import Workbook
+        wb = Workbook()
+        wb.active.title = sheet_name or "Sales_Cube"
+        wb.active.append(list(header))
+        wb.save(excel_path)
+
+    rows = (row for frame in frames for row in bulk_rows(frame))
+    date_column = list(header).index('Date')
+    src, dst, layout = write_rewrite(excel_path, rows, sheet_name=sheet_name, date_column=date_column,
+                                     replace_ranges=[(2, MAX_SHEET_ROW, [])], allow_lossy=allow_rewrite)
+    save_rewrite(excel_path, src, dst)
+
+    index = {"version": INDEX_VERSION, "sheet": sheet_name, "header": list(header)}
+    record_append(excel_path, index, layout)
+    return layout
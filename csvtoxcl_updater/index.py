@@ -0,0 +1,145 @@
+# Persistent date index sidecar
+#
+# Stored next to the master as "<master>.xlsx.index.json". It holds the header,
+# the dates already loaded with the sheet rows they occupy (date -> row ranges),
+# the row count, the last data row and a fingerprint of the workbook. Later runs dedup CSV dates against this index
+# instead of parsing every Date cell of the master again.
+#
+# The fingerprint is file size + modification time, backed by a SHA-1 of the
+# zip directory of the workbook: the name, CRC-32 and size of every part, read
+# from the end of the file, so taking it after every import costs a few KB of
+# reading instead of the whole workbook. A file that was touched or copied
+# without changing its content keeps its fingerprint. If the workbook was
+# changed outside the updater the fingerprint no longer matches and the index
+# is rebuilt from the master.
+
+import hashlib
+import json
+import os
+import zipfile
+from datetime import date
+
+from csvtoxcl_updater.common import say
+from csvtoxcl_updater.dates import date_row_ranges
+
+INDEX_VERSION = 3
+INDEX_SUFFIX = ".index.json"
+
+
+def index_path(excel_path):
+    return excel_path + INDEX_SUFFIX
+
+
+# SHA-1 of the parts of the workbook (name, CRC-32 and size from the zip
+# directory); a file that is not a zip is hashed whole, in 1 MB blocks
+def content_hash(path):
+    sha = hashlib.sha1()
+    try:
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                sha.update(f"{info.filename}\0{info.CRC:08x}\0{info.file_size}\n".encode("utf-8"))
+        return sha.hexdigest()
+    except zipfile.BadZipFile:
+        pass
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def file_fingerprint(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "parts_sha1": content_hash(path)}
+
+
+# Cheap check on size/mtime first, only hash the parts when the mtime changed
+def fingerprint_matches(path, fingerprint):
+    stat = os.stat(path)
+    if stat.st_size != fingerprint.get("size"):
+        return False
+    if stat.st_mtime_ns == fingerprint.get("mtime_ns"):
+        return True
+    return content_hash(path) == fingerprint.get("parts_sha1")
+
+
+# Scan the master once and build a fresh index
+def build_index(excel_path, sheet_name=None):
+    from csvtoxcl_updater.streaming import read_master_columns  # openpyxl is only needed for a rebuild
+
+    master = read_master_columns(excel_path, columns=("Date",), sheet_name=sheet_name)
+    date_rows = date_row_ranges(master.rows, master.columns["Date"])
+    return {
+        "version": INDEX_VERSION,
+        "sheet": sheet_name,
+        "header": [None if h is None else str(h) for h in master.header],
+        "dates": set(date_rows),
+        "date_rows": date_rows,
+        "row_count": len(master.rows),
+        "last_data_row": master.last_data_row,
+        "fingerprint": file_fingerprint(excel_path),
+    }
+
+
+# Read the sidecar, returns None when it is missing, unreadable or stale
+def load_index(excel_path, sheet_name=None):
+    try:
+        with open(index_path(excel_path), encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if index.get("version") != INDEX_VERSION or index.get("sheet") != sheet_name:
+        return None
+    if not fingerprint_matches(excel_path, index.get("fingerprint", {})):
+        return None
+
+    index["date_rows"] = {date.fromisoformat(d): ranges for d, ranges in index["date_rows"].items()}
+    index["dates"] = set(index["date_rows"])
+    return index
+
+
+# Header the sidecar recorded, even when the index is stale (the header of
+# the master rarely changes); None when there is no usable sidecar
+def cached_header(excel_path, sheet_name=None):
+    try:
+        with open(index_path(excel_path), encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if index.get("version") != INDEX_VERSION or index.get("sheet") != sheet_name:
+        return None
+    return index.get("header")
+
+
+def save_index(excel_path, index):
+    data = dict(index)
+    del data["dates"]
+    data["date_rows"] = {d.isoformat(): index["date_rows"][d] for d in sorted(index["date_rows"])}
+    tmp_path = index_path(excel_path) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, index_path(excel_path))
+
+
+# Load the index, rebuilding (and saving) it when it can't be trusted
+def get_index(excel_path, sheet_name=None):
+    index = load_index(excel_path, sheet_name)
+    if index is not None:
+        return index
+
+    say("\U0001F50D Building date index of the Excel file...",
+        "\U0001F50D Erstelle Datumsindex der Excel-Datei...\n")
+    index = build_index(excel_path, sheet_name)
+    save_index(excel_path, index)
+    return index
+
+
+# Update the index from the layout the streaming writer reported
+def record_append(excel_path, index, layout):
+    index["date_rows"] = layout["date_rows"]
+    index["dates"] = set(layout["date_rows"])
+    index["row_count"] = layout["row_count"]
+    index["last_data_row"] = layout["last_data_row"]
+    index["fingerprint"] = file_fingerprint(excel_path)
+    save_index(excel_path, index)
+    return index
@@ -0,0 +1,58 @@
+# Parallel CSV ingestion
+#
+# Reading, header normalisation and date parsing of each CSV run in a process
+# pool, one file per worker. Workers send back compact column arrays instead of
+# printing; the parent rebuilds the frames, reports the header checks and hands
+# everything to a single writer in date order.
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from csvtoxcl_updater.common import read_csv_checked
+from csvtoxcl_updater.dates import parse_dates
+
+
+# Worker: parse and normalise one CSV, return its columns as numpy arrays
+def ingest_csv(csv_path, excel_headers, schema=None):
+    csv_data, csv_headers, header_match = read_csv_checked(csv_path, excel_headers, schema)
+    if 'Date' not in csv_data.columns:
+        raise ValueError(f"❌ 'Date' column not found in {csv_path}.\n❌ Spalte 'Date' fehlt in {csv_path}.")
+
+    csv_data['Date'] = parse_dates(csv_data['Date'])
+    valid_dates = csv_data['Date'].dropna()
+
+    return {
+        "path": csv_path,
+        "csv_headers": csv_headers,
+        "header_match": header_match,
+        "first_date": valid_dates.min() if len(valid_dates) else None,
+        "columns": list(csv_data.columns),
+        "arrays": [csv_data[name].values for name in csv_data.columns],  # keeps categoricals
+    }
+
+
+# Rebuild the DataFrame from the arrays a worker sent back
+def to_frame(result):
+    return pd.DataFrame(dict(zip(result["columns"], result["arrays"])), columns=result["columns"])
+
+
+# Ingest many CSVs at once, results come back sorted by first date.
+# A long-running caller can pass its own (already started) process pool.
+def ingest_many(csv_paths, excel_headers, workers=None, schema=None, pool=None):
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, len(csv_paths))
+
+    if pool is not None and len(csv_paths) > 1:
+        results = list(pool.map(ingest_csv, csv_paths, [list(excel_headers)] * len(csv_paths),
+                                [schema] * len(csv_paths)))
+    elif workers <= 1 or pool is not None:
+        results = [ingest_csv(path, excel_headers, schema) for path in csv_paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(ingest_csv, csv_paths, [list(excel_headers)] * len(csv_paths),
+                                    [schema] * len(csv_paths)))
+
+    results.sort(key=lambda r: (r["first_date"] is None, r["first_date"] or 0, r["path"]))
+    return results
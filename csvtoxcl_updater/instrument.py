@@ -0,0 +1,100 @@
+# Per-stage timing and memory instrumentation
+#
+# Every import records how long each pipeline stage took, the peak memory
+# while it ran and how many rows/cells it handled, and appends it as one JSON
+# line to import_metrics.jsonl next to import_log.txt. When an import slows
+# down, the record shows which stage is to blame.
+#
+# With metrics_path=None the record is only returned (worker processes hand
+# their stages back to the parent run).
+#
+# Optional: a cProfile dump of the whole run (--profile FILE) and tracemalloc
+# peaks per stage plus the top allocations (--trace-memory FILE).
+
+import cProfile
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+from csvtoxcl_updater.common import LOG_PATH
+from csvtoxcl_updater.memory import peak_rss_mb, reset_peak_rss
+
+METRICS_PATH = os.path.join(os.path.dirname(LOG_PATH), "import_metrics.jsonl")
+TOP_ALLOCATIONS = 30
+
+
+class Instrument:
+    def __init__(self, command, metrics_path=METRICS_PATH, profile_path=None, trace_memory_path=None):
+        self.command = command
+        self.metrics_path = metrics_path
+        self.profile_path = profile_path
+        self.trace_memory_path = trace_memory_path
+        self.stages = []
+        self.started = time.perf_counter()
+        self.timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.finished = False
+
+        self.profiler = None
+        if profile_path:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        if trace_memory_path:
+            tracemalloc.start()
+
+    # Time one stage; the yielded dict takes counts such as rows=... or cells=...
+    @contextmanager
+    def stage(self, name, **counts):
+        record = {"stage": name}
+        record.update(counts)
+        reset_peak_rss()
+        if self.trace_memory_path:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = round(time.perf_counter() - start, 3)
+            peak = peak_rss_mb()
+            record["peak_rss_mb"] = None if peak is None else round(peak, 1)
+            if self.trace_memory_path:
+                record["peak_traced_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+            if record.get("rows") and record["seconds"] > 0:
+                record["rows_per_sec"] = round(record["rows"] / record["seconds"])
+            self.stages.append(record)
+
+    # Write the run record (and the optional profile/tracemalloc dumps)
+    def finish(self, status="ok", **summary):
+        if self.finished:
+            return
+        self.finished = True
+
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.profile_path)
+        if self.trace_memory_path:
+            self._dump_tracemalloc()
+
+        record = {
+            "timestamp": self.timestamp,
+            "command": self.command,
+            "status": status,
+            "total_seconds": round(time.perf_counter() - self.started, 3),
+            "stages": self.stages,
+        }
+        record.update(summary)
+        if self.metrics_path:
+            with open(self.metrics_path, "a", encoding="utf-8") as metrics_file:
+                metrics_file.write(json.dumps(record, default=str) + "\n")
+        return record
+
+    def _dump_tracemalloc(self):
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        with open(self.trace_memory_path, "w", encoding="utf-8") as dump:
+            dump.write(f"current {current / (1024 * 1024):.1f} MB, peak {peak / (1024 * 1024):.1f} MB\n\n")
+            for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+                dump.write(f"{stat}\n")
@@ -0,0 +1,280 @@
+# Write-ahead journal and crash-safe swap of the master
+#
+# Both write paths build the new workbook in "<master>.xlsx.tmp" and swap it
+# in with os.replace, so the name of the master never points at a half-written
+# file. That alone did not make an import crash-safe: without an fsync the
+# swapped-in file could still be empty after a power cut, and a process killed
+# between the swap and the index update left a master that looked "edited
+# outside the updater", with the rows of the import only in the CSVs.
+#
+# Before the master is touched, the rows about to be written are stored in
+# "<master>.xlsx.journal" (JSON lines: a header with the fingerprint of the
+# master and the write parameters, one line per row, an end line) and fsynced.
+# The new workbook is fsynced before the swap, and a commit line goes into the
+# journal right before it. The journal is removed once the index is updated.
+# The next run calls recover_import() on a journal that was left behind:
+#
+#   journal incomplete          the import never got to the master: the journal
+#                               and the temp file are dropped (roll back)
+#   master unchanged            the swap never happened: the rows are written
+#                               again from the journal (replay), far cheaper
+#                               than restoring a backup and re-importing
+#   master changed              the swap happened (or someone saved the master
+#                               since): the journal is dropped and the index is
+#                               rebuilt by get_index, as after any outside edit
+
+import itertools
+import json
+import os
+from datetime import date, datetime
+
+from csvtoxcl_updater.common import say, write_log
+from csvtoxcl_updater.index import get_index, fingerprint_matches, record_append
+
+JOURNAL_VERSION = 1
+JOURNAL_SUFFIX = ".journal"
+
+
+def journal_path(excel_path):
+    return excel_path + JOURNAL_SUFFIX
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"datetime": value.isoformat()}
+    if isinstance(value, date):
+        return {"date": value.isoformat()}
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        if "datetime" in value:
+            return datetime.fromisoformat(value["datetime"])
+        return date.fromisoformat(value["date"])
+    return value
+
+
+def _row_line(row):
+    return json.dumps([_encode(v) for v in row], separators=(",", ":")) + "\n"
+
+
+def _sync(path):
+    with open(path, "r+b") as f:
+        os.fsync(f.fileno())
+
+
+# Make the rename itself durable (folders can't be opened on Windows, where
+# the file system commits the rename on its own)
+def _sync_folder(path):
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+# Swap the finished temp file in place of the master: fsync, commit line, rename
+def commit_file(tmp_path, excel_path, journal=None):
+    _sync(tmp_path)
+    if journal is not None:
+        journal.commit(tmp_path)
+    os.replace(tmp_path, excel_path)
+    _sync_folder(excel_path)
+
+
+# Open journal of one import; use as a context manager around the write, save
+# and record steps. It is removed when they all succeed, and also on an error
+# before the commit (the master is untouched then and the import failed for
+# good). After the commit it stays for recover_import.
+class Journal:
+    def __init__(self, excel_path):
+        self.path = journal_path(excel_path)
+        self.committed = False
+
+    def commit(self, tmp_path):
+        stat = os.stat(tmp_path)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"commit": {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.committed = True
+
+    # The rows to append, read back from the journal file on every pass
+    def rows(self):
+        return _read_journal(self.path)[1]
+
+    def close(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None or not self.committed:
+            self.close()
+        return False
+
+
+# Write the journal of an import before the master is touched.
+# rows are the rows to append, replace_ranges the (first_row, last_row, rows)
+# blocks of a replace (see upsert.py); params are the write parameters
+# (column_count, date_column, inline_columns, dedup, allow_rewrite).
+def begin_journal(excel_path, index, rows, replace_ranges=(), **params):
+    path = journal_path(excel_path)
+    header = {
+        "version": JOURNAL_VERSION,
+        "fingerprint": index["fingerprint"],
+        "sheet": index.get("sheet"),
+        "ranges": [[first, last, len(block)] for first, last, block in replace_ranges],
+        **params,
+    }
+    row_count = 0
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(json.dumps(header) + "\n")
+        for _, _, block in replace_ranges:
+            f.writelines(_row_line(row) for row in block)
+        for row in rows:
+            f.write(_row_line(row))
+            row_count += 1
+        f.write(json.dumps({"end": row_count}) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+    _sync_folder(path)
+    journal = Journal(excel_path)
+    journal.row_count = row_count
+    return journal
+
+
+# Rows of a journal file, start..end of its row lines. They are decoded on
+# every pass instead of held in memory (a chunked import journals more rows
+# than fit in it).
+class _JournalRows:
+    def __init__(self, path, start, end):
+        self.path = path
+        self.start = start
+        self.end = end
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __iter__(self):
+        with open(self.path, encoding="utf-8") as f:
+            for line in itertools.islice(f, 1 + self.start, 1 + self.end):
+                yield tuple(_decode(v) for v in json.loads(line))
+
+
+# Header, rows to append, replace ranges and commit of a journal file,
+# None when it was cut off before the end line. Only the header and the
+# records ({...} lines) are parsed here; row lines are [...].
+def _read_journal(path):
+    end = commit = None
+    with open(path, encoding="utf-8") as f:
+        try:
+            header = json.loads(f.readline())
+            for number, line in enumerate(f):
+                if not line.startswith("{"):
+                    continue
+                record = json.loads(line)
+                if end is None and "end" in record:
+                    end = number
+                elif end is not None and commit is None and "commit" in record:
+                    commit = record["commit"]
+        except ValueError:
+            return None
+    if not isinstance(header, dict) or header.get("version") != JOURNAL_VERSION or end is None:
+        return None
+
+    # The rows of replaced blocks come first, few enough to keep
+    start = sum(count for _, _, count in header["ranges"])
+    blocks = list(_JournalRows(path, 0, start))
+    replace_ranges = []
+    for first, last, count in header["ranges"]:
+        replace_ranges.append((first, last, blocks[:count]))
+        blocks = blocks[count:]
+    return header, _JournalRows(path, start, end), replace_ranges, commit
+
+
+# Write the rows of the journal again (the master is still the one it was made for).
+# Returns "replayed", or "rolled back" when that would take a rewrite the
+# import was not allowed to do (see streaming.check_rewrite).
+def _replay(excel_path, header, rows, replace_ranges):
+    from csvtoxcl_updater.sheetpatch import patch_append, patch_replace
+    from csvtoxcl_updater.streaming import stream_rewrite, LossyRewrite
+
+    index = get_index(excel_path, header["sheet"])
+    added_rows = len(rows) + sum(len(block) for _, _, block in replace_ranges)
+    say(f"♻️ The last import into {os.path.basename(excel_path)} did not finish, writing its {added_rows} rows again...",
+        f"♻️ Der letzte Import in {os.path.basename(excel_path)} wurde nicht abgeschlossen, "
+        f"schreibe seine {added_rows} Zeilen erneut...\n")
+
+    with Journal(excel_path) as journal:
+        if replace_ranges:
+            layout = patch_replace(excel_path, index, replace_ranges, iter(rows), len(rows), header["column_count"],
+                                   sheet_name=header["sheet"], date_column=header["date_column"],
+                                   inline_columns=header.get("inline_columns", ()), journal=journal)
+        else:
+            layout = patch_append(excel_path, index, iter(rows), len(rows), header["column_count"],
+                                  sheet_name=header["sheet"], date_column=header["date_column"],
+                                  inline_columns=header.get("inline_columns", ()), journal=journal)
+        if layout is None:
+            try:
+                layout = stream_rewrite(excel_path, rows, sheet_name=header["sheet"], date_column=header["date_column"],
+                                        replace_ranges=replace_ranges, journal=journal,
+                                        allow_lossy=header.get("allow_rewrite", False))
+            except LossyRewrite as e:
+                print(e)
+                say("↩️ The unfinished import was rolled back. Import its CSV files again.",
+                    "↩️ Der unvollständige Import wurde zurückgesetzt. Bitte seine CSV-Dateien erneut importieren.\n")
+                return "rolled back"
+        if header.get("dedup") in ("row", "replace"):
+            index.pop("hash_key", None)  # the row hash set is rebuilt on the next row dedup
+        record_append(excel_path, index, layout)
+
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    write_log(f"{timestamp} | ♻️ Unfinished import replayed from the journal: {added_rows} rows "
+              f"written to '{os.path.basename(excel_path)}'.\n"
+              f"{timestamp} | ♻️ Unvollständiger Import aus dem Journal wiederholt: {added_rows} Zeilen "
+              f"in '{os.path.basename(excel_path)}' geschrieben.\n")
+    return "replayed"
+
+
+# Finish or roll back an import that was cut off, before the master is read.
+# Returns "replayed", "finished", "rolled back" or None when there was nothing to do.
+def recover_import(excel_path):
+    path = journal_path(excel_path)
+    for leftover in (excel_path + ".tmp", path + ".tmp"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+    if not os.path.exists(path):
+        return None
+
+    journal = _read_journal(path)
+    if journal is None:
+        os.remove(path)
+        say("↩️ An import was cut off before it wrote to the Excel file, it was rolled back.",
+            "↩️ Ein Import wurde abgebrochen, bevor er in die Excel-Datei schrieb, und wurde zurückgesetzt.\n")
+        return "rolled back"
+
+    header, rows, replace_ranges, commit = journal
+    if fingerprint_matches(excel_path, header["fingerprint"]):
+        return _replay(excel_path, header, rows, replace_ranges)
+
+    os.remove(path)
+    stat = os.stat(excel_path)
+    if commit is not None and (stat.st_size, stat.st_mtime_ns) == (commit["size"], commit["mtime_ns"]):
+        say("✅ The last import was saved before it was cut off, the date index is refreshed.",
+            "✅ Der letzte Import wurde vor dem Abbruch gespeichert, der Datumsindex wird aktualisiert.\n")
+        return "finished"
+    say("⚠️ The Excel file was changed after an unfinished import, its journal was dropped. "
+        "Import the CSV files again if rows are missing.",
+        "⚠️ Die Excel-Datei wurde nach einem unvollständigen Import geändert, das Journal wurde verworfen. "
+        "Fehlende Zeilen bitte erneut importieren.\n")
+    return "rolled back"
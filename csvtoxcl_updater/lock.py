@@ -0,0 +1,286 @@
+# Lock file and pending queue for several updaters sharing one master
+#
+# The master lives on a shared drive. Two colleagues importing at the same
+# moment used to load, append and save on their own, and the later save
+# silently dropped the rows of the earlier one. Now every import that writes
+# the workbook holds "<master>.xlsx.lock" while it reads the index, writes and
+# saves. The lock file is created atomically (O_CREAT | O_EXCL) and names its
+# holder (user, computer, process); the holder touches it every
+# HEARTBEAT_SECONDS.
+#
+# A lock is stale, and is broken, when its process is gone (same computer) or
+# it has not been touched for STALE_SECONDS (a crashed or disconnected
+# computer). A half-finished import of a broken lock is finished or rolled
+# back by the journal (see journal.py).
+#
+# A second append/batch/watch run does not wait for the lock: it copies its
+# CSV files into the pending queue "<master>.xlsx.pending/" and exits. The lock
+# holder merges queued batches with the same dedup settings into its own
+# import before its single save, and imports whatever is left in the queue
+# after it released the lock. stream, route and the store/db exports wait for
+# the lock instead. Writers of the Parquet store wait for "<store>.lock" the
+# same way (see store.py).
+#
+# Folders synced by OneDrive/SharePoint only see the lock once it was synced,
+# so the lock protects best on an SMB share that all updaters write to directly.
+
+import getpass
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from csvtoxcl_updater.common import say
+
+LOCK_SUFFIX = ".lock"
+PENDING_SUFFIX = ".pending"
+BATCH_FILE = "batch.json"
+HEARTBEAT_SECONDS = 15
+STALE_SECONDS = 120
+WAIT_SECONDS = 2.0
+
+
+def lock_path(excel_path):
+    return excel_path + LOCK_SUFFIX
+
+
+def pending_path(excel_path):
+    return excel_path + PENDING_SUFFIX
+
+
+def _owner():
+    try:
+        user = getpass.getuser()
+    except Exception:
+        user = "?"
+    return {"user": user, "host": socket.gethostname(), "pid": os.getpid(),
+            "since": datetime.now().strftime('%Y-%m-%d %H:%M:%S'), "token": uuid.uuid4().hex}
+
+
+def _describe(owner):
+    return f"{owner.get('user', '?')}@{owner.get('host', '?')} ({owner.get('since', '?')})"
+
+
+# Holder of the lock file, None when the master is not locked
+def lock_owner(excel_path):
+    return _read_owner(lock_path(excel_path))
+
+
+def _read_owner(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        return {}  # still being written, or unreadable
+
+
+# Both lock files name the same holder (token, or host and pid without one)
+def _same_owner(a, b):
+    if a.get("token") or b.get("token"):
+        return a.get("token") == b.get("token")
+    return (a.get("host"), a.get("pid")) == (b.get("host"), b.get("pid"))
+
+
+# Put a lock file that was moved aside by mistake back in place, unless a new
+# lock was taken meanwhile
+def _restore(moved_path, path):
+    try:
+        os.link(moved_path, path)
+    except FileExistsError:
+        pass
+    except OSError:
+        os.replace(moved_path, path)  # no hard links on this file system
+        return
+    os.remove(moved_path)
+
+
+def _process_alive(pid):
+    # os.kill(pid, 0) would terminate the process on Windows
+    if os.name == "nt":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def _is_stale(path, owner):
+    try:
+        age = time.time() - os.stat(path).st_mtime
+    except FileNotFoundError:
+        return False
+    if age > STALE_SECONDS:
+        return True
+    if owner and owner.get("host") == socket.gethostname() and owner.get("pid") != os.getpid():
+        return not _process_alive(owner.get("pid", 0))
+    return False
+
+
+# Held lock: keeps the lock file fresh until released
+class MasterLock:
+    def __init__(self, excel_path, owner):
+        self.excel_path = excel_path
+        self.path = lock_path(excel_path)
+        self.owner = owner
+        self.taken = []
+        self._stop = threading.Event()
+        self._heartbeat = threading.Thread(target=self._beat, daemon=True)
+        self._heartbeat.start()
+
+    def _beat(self):
+        while not self._stop.wait(HEARTBEAT_SECONDS):
+            try:
+                os.utime(self.path)
+            except OSError:
+                pass
+
+    # Queued batches with these dedup settings: [(folder, batch)]
+    def pending(self, dedup, key=None, inline=None):
+        return [(folder, batch) for folder, batch in pending_batches(self.excel_path)
+                if (batch["dedup"], batch["key"], batch["inline"]) == (dedup, key, inline)]
+
+    # CSV files of the queued batches with these dedup settings, to merge into
+    # the import (the batches are removed with done() after the save)
+    def take_pending(self, dedup, key=None, inline=None):
+        paths = []
+        for folder, batch in self.pending(dedup, key, inline):
+            if folder not in self.taken:
+                say(f"\U0001F4EC Merging {len(batch['files'])} CSV files queued by {_describe(batch)}.",
+                    f"\U0001F4EC Übernehme {len(batch['files'])} CSV-Dateien aus der Warteschlange von {_describe(batch)}.")
+                self.taken.append(folder)
+                paths.extend(os.path.join(folder, name) for name in batch["files"])
+        return paths
+
+    # The taken batches are in the master now
+    def done(self):
+        for folder in self.taken:
+            shutil.rmtree(folder, ignore_errors=True)
+        self.taken = []
+
+    def release(self):
+        self._stop.set()
+        self._heartbeat.join()
+        if (lock_owner(self.excel_path) or {}).get("token") == self.owner["token"]:
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+# Take the lock of the master, None when another updater holds it.
+# A stale lock is moved aside first. Several updaters can find the same stale
+# lock; when the file one of them moved is not that stale lock any more
+# (another one broke it first and took the lock), it is put back and the
+# updater backs off.
+def try_lock(excel_path):
+    path = lock_path(excel_path)
+    for _ in range(2):
+        owner = _owner()
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+        except FileExistsError:
+            holder = lock_owner(excel_path)
+            if not _is_stale(path, holder):
+                return None
+            stale_path = f"{path}.stale-{owner['token']}"
+            try:
+                os.replace(path, stale_path)
+            except OSError:
+                return None
+            moved = _read_owner(stale_path) or {}
+            if not _same_owner(moved, holder or {}) or not _is_stale(stale_path, moved):
+                _restore(stale_path, path)
+                return None
+            os.remove(stale_path)
+            say(f"\U0001F513 Removed a stale lock of {_describe(holder or {})}.",
+                f"\U0001F513 Verwaiste Sperre von {_describe(holder or {})} entfernt.")
+            continue
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(owner, f)
+        return MasterLock(excel_path, owner)
+    return None
+
+
+# Wait until the lock of the master is free and take it
+def wait_lock(excel_path):
+    lock = try_lock(excel_path)
+    if lock is None:
+        say(f"⏳ {os.path.basename(excel_path)} is being updated by {_describe(lock_owner(excel_path) or {})}, waiting...",
+            f"⏳ {os.path.basename(excel_path)} wird gerade von {_describe(lock_owner(excel_path) or {})} aktualisiert, warte...\n")
+    while lock is None:
+        time.sleep(WAIT_SECONDS)
+        lock = try_lock(excel_path)
+    return lock
+
+
+# Queued batches of the master, oldest first: [(folder, batch)]
+def pending_batches(excel_path):
+    queue = pending_path(excel_path)
+    if not os.path.isdir(queue):
+        return []
+    batches = []
+    for name in sorted(os.listdir(queue)):
+        if name.startswith("."):
+            continue  # still being copied in
+        folder = os.path.join(queue, name)
+        try:
+            with open(os.path.join(folder, BATCH_FILE), encoding="utf-8") as f:
+                batches.append((folder, json.load(f)))
+        except (OSError, ValueError):
+            continue
+    return batches
+
+
+# Copy csv_paths into the pending queue of the master (visible once complete)
+def queue_batch(excel_path, csv_paths, dedup="date", key=None, inline=None):
+    owner = _owner()
+    name = f"{time.time_ns()}-{owner['host']}-{owner['pid']}"
+    queue = pending_path(excel_path)
+    tmp_folder = os.path.join(queue, "." + name)
+    os.makedirs(tmp_folder)
+    files = []
+    for i, csv_path in enumerate(csv_paths):
+        # Numbered so two files with the same name don't collide
+        files.append(f"{i:04d}_{os.path.basename(csv_path)}")
+        shutil.copyfile(csv_path, os.path.join(tmp_folder, files[-1]))
+    batch = dict(owner, dedup=dedup, key=key, inline=inline, files=files)
+    with open(os.path.join(tmp_folder, BATCH_FILE), "w", encoding="utf-8") as f:
+        json.dump(batch, f)
+    folder = os.path.join(queue, name)
+    os.replace(tmp_folder, folder)
+    return folder
+
+
+# The lock of the master, or None after the CSV files were queued for the
+# updater that holds it
+def lock_or_queue(excel_path, csv_paths, dedup="date", key=None, inline=None):
+    lock = try_lock(excel_path)
+    if lock is not None:
+        return lock
+
+    folder = queue_batch(excel_path, csv_paths, dedup, key, inline)
+    # The holder may have finished in the meantime and not see the batch
+    lock = try_lock(excel_path)
+    if lock is not None:
+        shutil.rmtree(folder, ignore_errors=True)
+        return lock
+
+    holder = _describe(lock_owner(excel_path) or {})
+    say(f"\U0001F4EE {os.path.basename(excel_path)} is being updated by {holder}. "
+        f"The {len(csv_paths)} CSV files were queued and will be imported by that run.",
+        f"\U0001F4EE {os.path.basename(excel_path)} wird gerade von {holder} aktualisiert. "
+        f"Die {len(csv_paths)} CSV-Dateien wurden in die Warteschlange gestellt und dort importiert.\n")
+    return None
@@ -0,0 +1,66 @@
+# Peak memory (RSS) of the running process
+#
+# Linux: VmHWM from /proc/self/status, reset through /proc/self/clear_refs so
+# every stage gets its own peak. Windows: psutil's peak working set when psutil
+# is installed (it can't be reset). Elsewhere: ru_maxrss from the resource module.
+
+import os
+import sys
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def _proc_status_kb(field):
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+# Current resident set size in MB (None when it can't be measured)
+def current_rss_mb():
+    kb = _proc_status_kb("VmRSS")
+    if kb is not None:
+        return kb / 1024
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    return None
+
+
+# Peak resident set size in MB since start (or since the last reset_peak_rss)
+def peak_rss_mb():
+    kb = _proc_status_kb("VmHWM")
+    if kb is not None:
+        return kb / 1024
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        peak = getattr(info, "peak_wset", None)
+        if peak is not None:
+            return peak / (1024 * 1024)
+    if resource is not None:
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # bytes on macOS, kilobytes elsewhere
+        return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+    return None
+
+
+# Start a new peak measurement, returns False where the OS doesn't support it
+def reset_peak_rss():
+    try:
+        with open(f"/proc/{os.getpid()}/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
@@ -0,0 +1,105 @@
+# Overlapping the stages of an import
+#
+# v1.4.7 ran every step after the other: read the CSV, load the workbook,
+# dedup, write, save. The stages that are independent now run side by side:
+#
+#   - the date index is checked (or rebuilt from the master) in a thread while
+#     the CSVs are parsed, with the header the index had last time
+#     (index_and_parse; parsed again in the rare case the header changed)
+#   - the XML of the patched sheet is produced in a thread and handed to the
+#     deflate/write loop in blocks (sheetpatch.py); zlib and the file writes
+#     release the GIL, so compressing overlaps building the next rows
+#   - stream imports parse and dedup the next CSV chunk while the previous
+#     one is being written (chunked.py)
+#
+# Stages are connected by bounded queues (prefetch), so a fast producer runs
+# at most QUEUE_DEPTH items ahead and memory stays flat. Threads rather than
+# asyncio: every stage is blocking file I/O or C code, an event loop would
+# only hand the same work to the same threads.
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from csvtoxcl_updater.index import cached_header, get_index
+from csvtoxcl_updater.journal import recover_import
+
+QUEUE_DEPTH = 4
+
+_DONE = object()
+
+
+# Iterate items in a background thread, at most depth items ahead of the consumer.
+# Errors of the producer are raised in the consumer; closing the consumer early
+# stops the producer at its next item.
+def prefetch(items, depth=QUEUE_DEPTH):
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+            put((_DONE, None))
+        except BaseException as e:
+            put((_DONE, e))
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if error is not None:
+                raise error
+            if item is _DONE:
+                break
+            yield item
+    finally:
+        stop.set()
+        producer.join()
+
+
+# Join small byte chunks into blocks of about size bytes
+def joined(chunks, size):
+    block, length = [], 0
+    for chunk in chunks:
+        block.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield b"".join(block)
+            block, length = [], 0
+    if block:
+        yield b"".join(block)
+
+
+def _fresh_index(excel_path, sheet_name):
+    recover_import(excel_path)
+    return get_index(excel_path, sheet_name)
+
+
+# Settle and load the date index of the master while parse(header) runs,
+# returns (index, parsed). Without a sidecar the index comes first, since
+# parsing needs the header of the master.
+def index_and_parse(excel_path, parse, sheet_name=None):
+    header = cached_header(excel_path, sheet_name)
+    if header is None:
+        index = _fresh_index(excel_path, sheet_name)
+        return index, parse(index["header"])
+
+    with ThreadPoolExecutor(max_workers=1) as loader:
+        future = loader.submit(_fresh_index, excel_path, sheet_name)
+        parsed = parse(header)
+        index = future.result()
+    if index["header"] != header:
+        parsed = parse(index["header"])
+    return index, parsed
@@ -0,0 +1,138 @@
+# Dry run of an import (plan command)
+#
+# Shows what an append/batch/replace would do with the CSV files: the header
+# check, the new rows of every file, the dates or rows skipped and where the
+# rows would go. Only the CSVs and the sidecars of the master are read (date
+# index with header, date -> rows and last row; the row hashes for
+# --dedup row), so a plan takes about as long as parsing the CSVs, whatever
+# the size of the master. The workbook is neither loaded nor saved, an
+# unfinished import in the journal is not replayed and nothing goes to
+# import_log.txt. The sidecars are only read: when the index (or the row
+# hashes) no longer match the master, the plan stops and asks for an import,
+# which rebuilds them, instead of scanning the master itself.
+
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from csvtoxcl_updater.common import say, report_headers, filter_new_dates, build_log_message
+from csvtoxcl_updater.dedup import resolve_key, load_row_hashes, filter_new_rows
+from csvtoxcl_updater.index import load_index
+from csvtoxcl_updater.ingest import ingest_many, to_frame
+from csvtoxcl_updater.journal import journal_path
+from csvtoxcl_updater.lock import lock_owner, pending_batches
+from csvtoxcl_updater.schema import load_schema
+from csvtoxcl_updater.upsert import latest_per_date, plan_replacements
+
+
+# Notes on what the plan can't see: a running import, queued files, an unfinished save
+def _report_state(excel_path):
+    if lock_owner(excel_path) is not None:
+        say("\U0001F512 Another import is running on this Excel file, the plan may be out of date.",
+            "\U0001F512 Ein anderer Import läuft auf dieser Excel-Datei, der Plan ist eventuell nicht aktuell.\n")
+    if pending_batches(excel_path):
+        say("⏳ CSV files are queued for this Excel file and will be imported first.",
+            "⏳ Für diese Excel-Datei warten CSV-Dateien in der Warteschlange und werden zuerst importiert.\n")
+    if os.path.exists(journal_path(excel_path)):
+        say("⚠️ An unfinished import is in the journal. The next import completes it first; its rows are not in this plan.",
+            "⚠️ Im Journal steht ein unvollständiger Import. Der nächste Import schließt ihn zuerst ab; seine Zeilen fehlen in diesem Plan.\n")
+
+
+# Work out the import of csv_paths into excel_path without writing anything,
+# returns the number of rows it would add (dedup as in batch.update_target),
+# None when the sidecars are out of date
+def plan_import(csv_paths, excel_path, dedup="date", key=None, workers=None):
+    start_time = time.time()    #Tracking process time
+    say("\U0001F50E Dry run: the Excel file is not opened or changed.",
+        "\U0001F50E Probelauf: Die Excel-Datei wird weder geöffnet noch geändert.\n")
+    _report_state(excel_path)
+
+    index = load_index(excel_path)
+    if index is None:
+        say("⚠️ The date index of the Excel file is missing or stale, run an import to refresh it.",
+            "⚠️ Der Datumsindex der Excel-Datei fehlt oder ist veraltet, bitte einen Import ausführen, um ihn zu erneuern.\n")
+        return None
+    if dedup == "row":
+        key_columns = resolve_key(key, index["header"])
+        known_hashes = load_row_hashes(excel_path, index, key_columns)
+        if known_hashes is None:
+            say("⚠️ The row hashes of the Excel file are missing or stale for this key, run an import with --dedup row to refresh them.",
+                "⚠️ Die Zeilen-Hashes der Excel-Datei fehlen oder sind für diesen Schlüssel veraltet, bitte einen Import mit --dedup row ausführen.\n")
+            return None
+
+    results = ingest_many(csv_paths, index["header"], workers=workers, schema=load_schema(excel_path))
+
+    known_dates = set() if dedup == "replace" else set(index["dates"])
+    frames, header_logs, skipped, file_lines = [], [], [], []
+    skipped_rows = 0
+    for result in results:
+        csv_path = result["path"]
+        print("\n\U0001F4C4 " + os.path.basename(csv_path))
+        header_log = report_headers(result["header_match"], result["csv_headers"], index["header"])
+        if dedup == "row":
+            new_data, duplicates, new_dates, new_hashes = filter_new_rows(to_frame(result), known_hashes, key_columns)
+            known_hashes = np.concatenate([known_hashes, new_hashes])
+            skipped_rows += duplicates
+        elif dedup == "replace":
+            new_data, _, new_dates = filter_new_dates(to_frame(result), set())
+        else:
+            new_data, skipped_dates_list, new_dates = filter_new_dates(to_frame(result), known_dates)
+            skipped.extend(skipped_dates_list)
+        known_dates |= new_dates
+        if header_log not in header_logs:
+            header_logs.append(header_log)
+        file_lines.append(f"   \U0001F4C4 {os.path.basename(csv_path)}: {len(new_data)}\n")
+        if len(new_data):
+            frames.append(new_data)
+
+    if dedup == "replace":
+        frames = latest_per_date(frames)
+    added_rows = sum(len(f) for f in frames)
+    if added_rows == 0:
+        if dedup == "row":
+            say("\n\U0001F501 All rows in the CSV files already exist in the Excel file.",
+                "\U0001F501 Alle Zeilen aus den CSV-Dateien sind bereits vorhanden.\n")
+        else:
+            say("\n\U0001F501 All dates in the CSV files already exist in the Excel file.",
+                "\U0001F501 Alle Datumswerte aus den CSV-Dateien sind bereits vorhanden.\n")
+
+    plan_log = ""
+    if dedup == "replace" and frames:
+        _, _, replaced_dates, removed_rows = plan_replacements(index, pd.concat(frames))
+        if replaced_dates:
+            replaced_str = ", ".join(str(d) for d in replaced_dates)
+            plan_log += (
+                f"♻️ Dates that would be replaced ({removed_rows} rows removed): {replaced_str}\n"
+                f"♻️ Zu ersetzende Datumswerte ({removed_rows} Zeilen entfernt): {replaced_str}\n"
+            )
+    elif added_rows:
+        # Appends go below the last row with data (see sheetpatch.py / streaming.py)
+        first_row = index["last_data_row"] + 1
+        last_row = index["last_data_row"] + added_rows
+        plan_log += (
+            f"\U0001F4CD New rows would go to sheet rows {first_row}–{last_row} (now {index['row_count']} rows).\n"
+            f"\U0001F4CD Neue Zeilen kämen in die Tabellenzeilen {first_row}–{last_row} (jetzt {index['row_count']} Zeilen).\n"
+        )
+
+    elapsed = time.time() - start_time
+    log_message = build_log_message(added_rows, excel_path, elapsed, "".join(header_logs), sorted(set(skipped)),
+                                    skipped_rows=skipped_rows, planned=True)
+    log_message += plan_log
+    log_message += "\U0001F4C2 Files / Dateien (new rows / neue Zeilen):\n" + "".join(file_lines)
+
+    say("\n✅ Plan complete, nothing was written.", "✅ Plan erstellt, es wurde nichts geschrieben.\n")
+    print(log_message)
+    return added_rows
+
+
+# plan: dry run for a CSV file, folder or glob
+def run_plan(source, excel_path, dedup="date", key=None, workers=None):
+    from csvtoxcl_updater.batch import find_csv_files
+
+    csv_paths = find_csv_files(source)
+    if not csv_paths:
+        say(f"❌ No CSV files found in: {source}", f"❌ Keine CSV-Dateien gefunden in: {source}")
+        return 0
+    return plan_import(csv_paths, excel_path, dedup=dedup, key=key, workers=workers)
@@ -0,0 +1,163 @@
+# Fan-out of one feed to several target workbooks / sheets
+#
+# The same sales feed goes into the consolidated master and into per-region
+# workbooks. A routing config (JSON) lists the targets; each one takes the
+# rows matching its "where" filter (all rows when there is none):
+#
+#     {
+#       "targets": [
+#         {"excel": "Sales_Cube_BM_Master.xlsx"},
+#         {"excel": "Regions/North.xlsx", "where": {"Region": ["North", "Nord"]}},
+#         {"excel": "Product_Lines.xlsx", "sheet": "Devices", "where": {"Product Line": "Devices"}}
+#       ]
+#     }
+#
+# Relative paths are taken from the folder of the config file. The CSVs are
+# parsed once; every workbook is then updated in its own process, so the
+# targets are written concurrently. Several sheets of the same workbook are
+# written one after the other by that workbook's process; the date index is
+# kept per workbook, so those sheets rebuild it on every run and separate
+# workbooks are the faster layout.
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from csvtoxcl_updater.common import say
+from csvtoxcl_updater.index import cached_header, get_index
+from csvtoxcl_updater.instrument import Instrument
+from csvtoxcl_updater.schema import load_schema
+
+
+# Targets of a routing config, with absolute workbook paths
+def load_routes(config_path):
+    with open(config_path, encoding="utf-8") as f:
+        config = json.load(f)
+
+    targets = config.get("targets") if isinstance(config, dict) else None
+    if not targets:
+        raise ValueError(f"❌ No targets in the routing config: {config_path}\n"
+                         f"❌ Keine Ziele in der Routing-Konfiguration: {config_path}")
+
+    base = os.path.dirname(os.path.abspath(config_path))
+    routes = []
+    for target in targets:
+        if not target.get("excel"):
+            raise ValueError(f"❌ Every target needs an 'excel' entry: {config_path}\n"
+                             f"❌ Jedes Ziel braucht einen Eintrag 'excel': {config_path}")
+        where = {column: [str(v).strip() for v in (values if isinstance(values, list) else [values])]
+                 for column, values in (target.get("where") or {}).items()}
+        routes.append({
+            "excel": os.path.join(base, target["excel"]),
+            "sheet": target.get("sheet"),
+            "where": where,
+        })
+    return routes
+
+
+# Rows of one parsed CSV (see ingest.py) that match the where filter
+def route_result(result, where):
+    if not where:
+        return result
+    columns = result["columns"]
+    mask = np.ones(len(result["arrays"][0]) if result["arrays"] else 0, dtype=bool)
+    for column, values in where.items():
+        if column not in columns:
+            raise ValueError(f"❌ Routing column '{column}' not found in {os.path.basename(result['path'])}.\n"
+                             f"❌ Routing-Spalte '{column}' fehlt in {os.path.basename(result['path'])}.")
+        array = result["arrays"][columns.index(column)]
+        mask &= np.isin(np.array([str(v).strip() for v in array], dtype=object), values)
+    return dict(result, arrays=[array[mask] for array in result["arrays"]])
+
+
+# Worker: update every routed sheet of one workbook, one after the other
+def update_workbook(targets, dedup, key, inline=None, allow_rewrite=False):
+    from csvtoxcl_updater.batch import update_target
+    from csvtoxcl_updater.journal import recover_import
+    from csvtoxcl_updater.lock import wait_lock
+
+    summaries = []
+    with wait_lock(targets[0]["excel"]):
+        recover_import(targets[0]["excel"])
+        for target in targets:
+            instrument = Instrument("target", metrics_path=None)
+            with instrument.stage("index") as stage:
+                index = get_index(target["excel"], target["sheet"])
+                stage["rows"] = index["row_count"]
+            added_rows = update_target(target["results"], target["excel"], index, dedup, key, instrument, inline=inline,
+                                       allow_rewrite=allow_rewrite)
+            summaries.append({"excel": target["excel"], "sheet": target["sheet"],
+                              "added_rows": added_rows, "stages": instrument.stages})
+    return summaries
+
+
+# Header of a target, from its sidecar even when the index is stale; without
+# one the index is built under the lock of the workbook, as update_workbook does
+def _route_header(route):
+    header = cached_header(route["excel"], route["sheet"])
+    if header is not None:
+        return header
+
+    from csvtoxcl_updater.journal import recover_import
+    from csvtoxcl_updater.lock import wait_lock
+    with wait_lock(route["excel"]):
+        recover_import(route["excel"])
+        return get_index(route["excel"], route["sheet"])["header"]
+
+
+# Parse the CSVs of source once and update every target of the routing config
+def run_routes(source, config_path, workers=None, dedup="date", key=None, instrument=None, inline=None,
+               allow_rewrite=False):
+    if instrument is None:
+        instrument = Instrument("route")
+    try:
+        summaries = _run_routes(source, config_path, workers, dedup, key, instrument, inline, allow_rewrite)
+    except BaseException:
+        instrument.finish("error", source=source, config=config_path, dedup=dedup)
+        raise
+    instrument.finish(source=source, config=config_path, dedup=dedup, targets=summaries)
+    return summaries
+
+
+def _run_routes(source, config_path, workers, dedup, key, instrument, inline, allow_rewrite):
+    from csvtoxcl_updater.batch import find_csv_files
+    from csvtoxcl_updater.ingest import ingest_many
+
+    routes = load_routes(config_path)
+    csv_paths = find_csv_files(source)
+    if not csv_paths:
+        say(f"❌ No CSV files found in: {source}", f"❌ Keine CSV-Dateien gefunden in: {source}")
+        return []
+
+    # The first target decides how the CSV header row is recognised and its column schema applies
+    with instrument.stage("index") as stage:
+        header = _route_header(routes[0])
+
+    say(f"\U0001F4C2 Reading {len(csv_paths)} CSV files once for {len(routes)} targets...",
+        f"\U0001F4C2 Lese {len(csv_paths)} CSV-Dateien einmal für {len(routes)} Ziele...")
+    with instrument.stage("ingest", files=len(csv_paths)) as stage:
+        results = ingest_many(csv_paths, header, workers=workers, schema=load_schema(routes[0]["excel"]))
+        stage["rows"] = sum(len(r["arrays"][0]) if r["arrays"] else 0 for r in results)
+
+    workbooks = {}
+    for route in routes:
+        routed = [route_result(result, route["where"]) for result in results]
+        workbooks.setdefault(os.path.normcase(route["excel"]), []).append(dict(route, results=routed))
+
+    say(f"\U0001F4E5 Updating {len(workbooks)} workbooks...", f"\U0001F4E5 Aktualisiere {len(workbooks)} Arbeitsmappen...\n")
+    summaries = []
+    with instrument.stage("targets", workbooks=len(workbooks)) as stage:
+        with ProcessPoolExecutor(max_workers=len(workbooks)) as pool:
+            futures = [pool.submit(update_workbook, targets, dedup, key, inline, allow_rewrite)
+                       for targets in workbooks.values()]
+            for future in futures:
+                summaries.extend(future.result())
+        stage["rows"] = sum(s["added_rows"] for s in summaries)
+
+    for summary in summaries:
+        sheet = f" [{summary['sheet']}]" if summary["sheet"] else ""
+        say(f"✅ {os.path.basename(summary['excel'])}{sheet}: {summary['added_rows']} new rows",
+            f"✅ {os.path.basename(summary['excel'])}{sheet}: {summary['added_rows']} neue Zeilen")
+    return summaries
@@ -0,0 +1,192 @@
+# Column schema of a feed
+#
+# Without a schema every CSV column that shares a file with the repeated
+# header row comes out of pd.read_csv as object dtype, and so does every
+# column of a frame built from the master. Object columns take several times
+# the memory of typed ones and make every comparison slow.
+#
+# The schema is kept next to the master as "<master>.xlsx.schema.json" and
+# lists every column with one of these types:
+#
+#     date      parsed to datetime64 (the format is detected, see dates.py)
+#     int       nullable Int64
+#     float     float64
+#     category  pandas categorical (customer, product, region, ...)
+#     string    pandas string dtype
+#
+# Columns are matched on the header row as normalize_headers compares it.
+# When a schema exists the CSV is read with these dtypes: the repeated header
+# row is skipped while parsing (so numbers parse as numbers) and the totals row
+# is dropped afterwards. infer_schema creates the file from an existing master.
+
+import json
+import os
+
+import pandas as pd
+
+from csvtoxcl_updater.common import normalize_headers
+from csvtoxcl_updater.dates import parse_dates
+
+SCHEMA_VERSION = 1
+SCHEMA_SUFFIX = ".schema.json"
+TYPES = ("date", "int", "float", "category", "string")
+PANDAS_DTYPES = {"int": "Int64", "float": "float64", "category": "category", "string": "string"}
+
+# Text columns with at most this many distinct values (and mostly repeats) become categories
+CATEGORY_MAX = 5000
+CATEGORY_RATIO = 0.5
+
+
+def schema_path(excel_path):
+    return excel_path + SCHEMA_SUFFIX
+
+
+# The schema of the master, None when there is none
+def load_schema(excel_path, path=None):
+    path = path or schema_path(excel_path)
+    try:
+        with open(path, encoding="utf-8") as f:
+            schema = json.load(f)
+    except OSError:
+        return None
+    except ValueError:
+        raise ValueError(f"❌ The schema file is not valid JSON: {path}\n❌ Die Schema-Datei ist kein gültiges JSON: {path}") from None
+
+    unknown = [c["name"] for c in schema.get("columns", []) if c.get("type") not in TYPES]
+    if schema.get("version") != SCHEMA_VERSION or unknown:
+        raise ValueError(f"❌ Unknown column types in {path}: {', '.join(unknown) or '-'} (allowed: {', '.join(TYPES)})\n"
+                         f"❌ Unbekannte Spaltentypen in {path}: {', '.join(unknown) or '-'} (erlaubt: {', '.join(TYPES)})")
+    return schema
+
+
+def save_schema(path, schema):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(schema, f, indent=1, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+# {column name as it appears in header: type} for the columns the schema knows
+def column_types(schema, header):
+    types = {name: column["type"] for name, column in
+             zip(normalize_headers(c["name"] for c in schema["columns"]), schema["columns"])}
+    return {name: types[key] for name, key in zip(header, normalize_headers(header)) if key in types}
+
+
+# Numbers as float64, int columns as Int64 unless they hold fractions after all
+def _to_number(column, kind):
+    numeric = pd.to_numeric(column, errors='coerce').astype("float64")
+    if kind == "int" and (numeric.dropna() % 1 == 0).all():
+        return numeric.astype("Int64")
+    return numeric
+
+
+# Cast the columns of df to the schema (values that don't fit become empty)
+def apply_schema(df, schema):
+    for name, kind in column_types(schema, df.columns).items():
+        if kind == "date":
+            df[name] = parse_dates(df[name])
+        elif kind in ("int", "float"):
+            df[name] = _to_number(df[name], kind)
+        else:
+            df[name] = df[name].astype(PANDAS_DTYPES[kind])
+    return df
+
+
+# read_csv options for the schema: dtypes by CSV column, repeated header row skipped.
+# Dates stay text until parse_dates (format detection); numbers are read as
+# float first so empty cells can't break an int column.
+def csv_read_options(csv_headers, header_match, schema):
+    dtype = {}
+    for name, kind in column_types(schema, csv_headers).items():
+        if kind in ("int", "float"):
+            dtype[name] = "float64"
+        elif kind == "date":
+            dtype[name] = "string"
+        else:
+            dtype[name] = PANDAS_DTYPES[kind]
+    return {"dtype": dtype, "skiprows": [1] if header_match else None}
+
+
+def _schema_error(csv_path, error):
+    return ValueError(f"❌ {os.path.basename(csv_path)} doesn't match the column schema: {error}\n"
+                      f"❌ {os.path.basename(csv_path)} passt nicht zum Spaltenschema: {error}")
+
+
+# Whole CSV read with the schema, returns (csv_data, csv_headers, header_match)
+# like strip_csv: without the repeated header row and the totals row.
+# With the layout of the pre-scan (csvscan.py) only the data range is parsed.
+def read_csv_typed(csv_path, excel_headers, schema, layout=None):
+    if layout is None:
+        csv_headers = list(pd.read_csv(csv_path, nrows=0).columns)
+        header_match = normalize_headers(csv_headers) == normalize_headers(excel_headers)
+        options = csv_read_options(csv_headers, header_match, schema)
+    else:
+        csv_headers, header_match = layout.headers, layout.header_match
+        options = csv_read_options(csv_headers, False, schema)  # the range starts after the header rows
+    try:
+        if layout is None:
+            csv_data = pd.read_csv(csv_path, **options).iloc[:-1].copy()  # skip total line
+        else:
+            from csvtoxcl_updater.csvscan import read_csv_range
+            csv_data = read_csv_range(csv_path, layout, **options)
+    except ValueError as e:
+        raise _schema_error(csv_path, e) from None
+    return finish_typed(csv_data, schema), csv_headers, header_match
+
+
+# Finish a frame read with csv_read_options: dates parsed, int columns as Int64
+def finish_typed(csv_data, schema):
+    for name, kind in column_types(schema, csv_data.columns).items():
+        if kind == "date":
+            csv_data[name] = parse_dates(csv_data[name])
+        elif kind == "int":
+            csv_data[name] = _to_number(csv_data[name], kind)
+    return csv_data
+
+
+def _value_kind(values):
+    values = values.dropna()
+    if values.empty:
+        return None
+    if pd.api.types.is_datetime64_any_dtype(values) or values.map(lambda v: hasattr(v, "year")).all():
+        return "date"
+    numeric = pd.to_numeric(values, errors='coerce')
+    if numeric.notna().all() and not pd.api.types.is_bool_dtype(values):
+        return "int" if (numeric % 1 == 0).all() else "float"
+    return "text"
+
+
+# Schema from the values of an existing master
+def infer_schema(excel_path, sheet_name=None):
+    from csvtoxcl_updater.streaming import iter_master_chunks
+
+    kinds, distinct, counts, header = {}, {}, {}, None
+    for chunk in iter_master_chunks(excel_path, sheet_name=sheet_name):
+        header = header or [str(h) for h in chunk.columns]
+        for name, column in zip(header, (chunk[c] for c in chunk.columns)):
+            kind = _value_kind(column)
+            previous = kinds.get(name)
+            if kind is None or previous == "text":
+                pass
+            elif previous is None or previous == kind:
+                kinds[name] = kind
+            elif {previous, kind} == {"int", "float"}:
+                kinds[name] = "float"
+            else:
+                kinds[name] = "text"
+            values = distinct.setdefault(name, set())
+            if len(values) <= CATEGORY_MAX:
+                values.update(column.dropna().astype(str))
+            counts[name] = counts.get(name, 0) + int(column.notna().sum())
+
+    if header is None:
+        raise ValueError("❌ The Excel file has no data rows.\n❌ Die Excel-Datei enthält keine Datenzeilen.")
+
+    columns = []
+    for name in header:
+        kind = "date" if name == "Date" else kinds.get(name, "text")
+        if kind == "text":
+            repeats = len(distinct[name]) <= CATEGORY_RATIO * max(counts[name], 1)
+            kind = "category" if len(distinct[name]) <= CATEGORY_MAX and repeats else "string"
+        columns.append({"name": name, "type": kind})
+    return {"version": SCHEMA_VERSION, "columns": columns}
@@ -0,0 +1,759 @@
+# In-place append by patching the worksheet XML
+#
+# The streaming rewrite (see streaming.py) copies every sheet of the workbook
+# into a new one, so an append costs as much as the whole workbook, and
+# styles, widths and charts are lost on the way. An .xlsx file is a zip
+# archive with one XML part per sheet; appending rows only has to change the
+# part of the target sheet.
+#
+# patch_append streams that part once: everything up to the last data row is
+# copied as it is, the new <row> elements go in after it and the <dimension>
+# ref is widened. Every other member of the archive (other sheets, styles,
+# shared strings, charts, pivot caches) is copied byte for byte in its
+# compressed form, without inflating it. The cost of an append is then the
+# size of the one sheet, and everything else in the workbook is kept.
+#
+# patch_replace does replace-by-date the same way: the <row> elements of the
+# replaced date blocks are dropped, the corrected rows are written in their
+# place and the rows below are renumbered (row and cell refs) by the rows the
+# blocks gained or lost. Rows only move when no formula, merged cell, link,
+# rule or table refers to them by row number.
+#
+# Text cells go through the shared strings table of the workbook. The table is
+# loaded once into a string -> index map, so repeated customer and product
+# names reuse the entry they already have and only strings never seen before
+# are added at the end of the table (the only other part that is rewritten).
+# Columns with mostly unique text (order numbers, comments) can be written as
+# inline strings instead (inline_columns), so they don't grow the table that
+# every later load has to read in full. Workbooks without a shared strings
+# table (openpyxl writes inline strings) get a new one, xl/sharedStrings.xml,
+# registered in [Content_Types].xml and the workbook relationships. Date cells
+# take the style of the Date cell in the last data row (number format '0' in
+# masters written by the updater).
+#
+# When the sheet can't be patched safely (values in the rows the new data would
+# take, rows without a row number, references to rows that would move,
+# archives beyond the plain zip limits) the caller falls back to the streaming
+# rewrite, and says so.
+
+import copy
+import math
+import numbers
+import os
+import re
+import struct
+import time
+import zipfile
+import zlib
+from datetime import date, datetime
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+from csvtoxcl_updater.common import say
+from csvtoxcl_updater.dates import date_row_ranges
+from csvtoxcl_updater.journal import commit_file
+from csvtoxcl_updater.pipeline import joined, prefetch
+from csvtoxcl_updater.tail import sheet_member, shared_strings_member
+
+PATCH_BLOCK = 1 << 20
+COPY_BLOCK = 1 << 20
+ZIP_LIMIT = 0xFFFFFFFF
+ZIP_MAX_MEMBERS = 0xFFFF
+
+LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+CENTRAL_HEADER = struct.Struct("<4s4B4HL2L5H2L")
+END_RECORD = struct.Struct("<4s4H2LH")
+LOCAL_SIGNATURE = b"PK\x03\x04"
+CENTRAL_SIGNATURE = b"PK\x01\x02"
+END_SIGNATURE = b"PK\x05\x06"
+DESCRIPTOR_SIGNATURE = b"PK\x07\x08"
+UTF8_FLAG = 0x800
+DESCRIPTOR_FLAG = 0x08
+
+SHEET_DATA = re.compile(rb'<((?:\w+:)?)sheetData\b[^>]*?(/?)>')
+SHEET_DATA_END = re.compile(rb'</(?:\w+:)?sheetData>')
+DIMENSION = re.compile(rb'(<(?:\w+:)?dimension\b[^>]*?\bref=")([^"]*)(")')
+ROW_TAG = re.compile(rb'<(?:\w+:)?row\b[^>]*>')
+ROW_NUMBER = re.compile(rb'\br="(\d+)"')
+VALUE_TAG = re.compile(rb'<(?:\w+:)?(?:v|is|f)\b')
+STYLE = re.compile(rb'\bs="(\d+)"')
+FORMULA_TAG = re.compile(rb'<(?:\w+:)?f\b')
+CELL_ROW = re.compile(rb'(<(?:\w+:)?c\s[^>]*?\br="[A-Z]+)(\d+)(")')
+# Parts after sheetData that refer to cells by row, wrong once rows move
+MOVED_REFS = re.compile(rb'<(?:\w+:)?(?:mergeCell|conditionalFormatting|dataValidation|hyperlink|tablePart|rowBreaks)\b')
+CELL_REF = re.compile(r'([A-Z]+)(\d+)')
+# Control characters XML can't hold (the same set openpyxl refuses)
+ILLEGAL_CHARACTERS = re.compile(r'[\000-\010]|[\013-\014]|[\016-\037]')
+EXCEL_EPOCH = datetime(1899, 12, 30)
+SST = re.compile(rb'<((?:\w+:)?)sst\b[^>]*?(/?)>')
+SST_END = re.compile(rb'</(?:\w+:)?sst>')
+SST_COUNT = re.compile(rb'\b(count|uniqueCount)="(\d+)"')
+REL_ID = re.compile(rb'\bId="([^"]*)"')
+
+# A shared strings table is added to workbooks that have none (openpyxl writes inline strings)
+NEW_SST_MEMBER = "xl/sharedStrings.xml"
+EMPTY_SST = b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" count="0" uniqueCount="0"/>'
+SST_CONTENT_TYPE = b"application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"
+SST_REL_TYPE = b"http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings"
+CONTENT_TYPES = "[Content_Types].xml"
+WORKBOOK_RELS = "xl/_rels/workbook.xml.rels"
+
+
+class _NotPatchable(Exception):
+    pass
+
+
+# Pieces of the XML that end right before a "<", so no tag is ever split
+def _xml_pieces(stream):
+    carry = b""
+    while True:
+        block = stream.read(PATCH_BLOCK)
+        if not block:
+            if carry:
+                yield carry
+            return
+        data = carry + block
+        cut = data.rfind(b"<")
+        if cut < 0:
+            cut = len(data)
+        if cut:
+            yield data[:cut]
+        carry = data[cut:]
+
+
+# openpyxl is not imported here, so an append that doesn't fall back to the
+# rewrite never loads it (see __main__.py); these are the few helpers needed
+
+def _column_letter(number):
+    letters = ""
+    while number:
+        number, rest = divmod(number - 1, 26)
+        letters = chr(65 + rest) + letters
+    return letters
+
+
+def _column_number(letters):
+    number = 0
+    for letter in letters:
+        number = number * 26 + ord(letter) - 64
+    return number
+
+
+# (min_col, min_row, max_col, max_row) of a ref such as "A1:F3000" or "A1"
+def _ref_bounds(ref):
+    cells = [CELL_REF.fullmatch(part) for part in ref.replace("$", "").split(":")]
+    if not cells or len(cells) > 2 or None in cells:
+        raise _NotPatchable(f"dimension {ref}")
+    first, last = cells[0], cells[-1]
+    return _column_number(first.group(1)), int(first.group(2)), _column_number(last.group(1)), int(last.group(2))
+
+
+def _excel_serial(value):
+    if isinstance(value, datetime):
+        return (value.replace(tzinfo=None) - EXCEL_EPOCH).total_seconds() / 86400
+    return (value - EXCEL_EPOCH.date()).days
+
+
+def _number_text(value):
+    value = float(value) if not isinstance(value, numbers.Integral) else int(value)
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+# The shared strings table as a string -> index map, plus the strings added
+# by this run. Rich text entries keep their place but are never reused.
+# Without a member the table starts out empty and is created on save.
+class _SharedStrings:
+    def __init__(self, archive, member=None):
+        self.created = member is None
+        self.member = member or NEW_SST_MEMBER
+        self.indices = {}
+        self.size = 0
+        self.added = []
+        self.reused = 0
+        self.references = 0
+        if self.created:
+            return
+        with archive.open(member) as xml:
+            root = None
+            for event, element in ElementTree.iterparse(xml, events=("start", "end")):
+                if root is None:
+                    root = element
+                if event != "end" or _local_name(element.tag) != "si":
+                    continue
+                if len(element) == 1 and _local_name(element[0].tag) == "t":
+                    self.indices.setdefault(element[0].text or "", self.size)
+                self.size += 1
+                root.clear()
+
+    def index(self, text):
+        self.references += 1
+        index = self.indices.get(text)
+        if index is None:
+            index = self.indices[text] = self.size + len(self.added)
+            self.added.append(text)
+        elif index < self.size:
+            self.reused += 1
+        return index
+
+    # The table XML with the added strings at the end and the counts updated
+    def patched(self, pieces):
+        def counts(match):
+            extra = self.references if match.group(1) == b"count" else len(self.added)
+            return match.group(1) + b'="' + str(int(match.group(2)) + extra).encode("ascii") + b'"'
+
+        def entries(prefix):
+            p = prefix.decode("ascii")
+            for text in self.added:
+                space = ' xml:space="preserve"' if text != text.strip() else ""
+                yield f"<{p}si><{p}t{space}>{escape(text)}</{p}t></{p}si>".encode("utf-8")
+
+        state = "head"
+        for piece in pieces:
+            if state == "head":
+                match = SST.search(piece)
+                if match is None:
+                    yield piece
+                    continue
+                prefix = match.group(1)
+                tag = SST_COUNT.sub(counts, match.group(0))
+                if match.group(2):
+                    yield piece[:match.start()] + tag[:-2] + b">"
+                    yield from entries(prefix)
+                    yield b"</" + prefix + b"sst>" + piece[match.end():]
+                    state = "rest"
+                    continue
+                piece = piece[:match.start()] + tag + piece[match.end():]
+                state = "body"
+            if state == "body":
+                end = SST_END.search(piece)
+                if end is None:
+                    yield piece
+                    continue
+                yield piece[:end.start()]
+                yield from entries(prefix)
+                yield piece[end.start():]
+                state = "rest"
+                continue
+            yield piece
+        if state != "rest":
+            raise _NotPatchable("no shared strings table")
+
+    # [Content_Types].xml or the workbook relationships with the new table registered
+    def register(self, name, xml):
+        if name == CONTENT_TYPES:
+            entry = b'<Override PartName="/' + self.member.encode("utf-8") + b'" ContentType="' + SST_CONTENT_TYPE + b'"/>'
+        else:
+            ids = set(REL_ID.findall(xml))
+            number = len(ids) + 1
+            while b"rId%d" % number in ids:
+                number += 1
+            entry = (b'<Relationship Id="rId%d" Type="' % number + SST_REL_TYPE + b'" Target="/'
+                     + self.member.encode("utf-8") + b'"/>')
+        end = xml.rfind(b"</")
+        return xml[:end] + entry + xml[end:]
+
+    def stats(self):
+        return {"reused": self.reused, "added": len(self.added), "total": self.size + len(self.added)}
+
+
+def _cell_xml(prefix, ref, value, style, strings=None):
+    s = f' s="{style}"' if style else ""
+    if isinstance(value, bool):
+        return f'<{prefix}c r="{ref}"{s} t="b"><{prefix}v>{int(value)}</{prefix}v></{prefix}c>'
+    if isinstance(value, (datetime, date)):
+        value = _excel_serial(value)
+    if isinstance(value, numbers.Number):
+        if isinstance(value, numbers.Real) and not math.isfinite(value):
+            return ""
+        return f'<{prefix}c r="{ref}"{s}><{prefix}v>{_number_text(value)}</{prefix}v></{prefix}c>'
+    text = ILLEGAL_CHARACTERS.sub("", str(value))
+    if strings is not None:
+        return f'<{prefix}c r="{ref}"{s} t="s"><{prefix}v>{strings.index(text)}</{prefix}v></{prefix}c>'
+    space = ' xml:space="preserve"' if text != text.strip() else ""
+    return (f'<{prefix}c r="{ref}"{s} t="inlineStr"><{prefix}is><{prefix}t{space}>{escape(text)}'
+            f'</{prefix}t></{prefix}is></{prefix}c>')
+
+
+# <row> elements for the new rows, numbered from first_row. Keeps what the
+# index needs: data rows (column A filled) and their dates.
+class _NewRows:
+    def __init__(self, rows, first_row, date_column, strings=None, inline_columns=()):
+        self.rows = rows
+        self.first_row = first_row
+        self.date_column = date_column
+        self.strings = strings
+        self.inline_columns = set(inline_columns)
+        self.inline = 0
+        self.letters = []
+        self.data_rows = []
+        self.data_dates = []
+        self.written = 0
+
+    def xml(self, prefix, date_style):
+        prefix = prefix.decode("ascii")
+        row_number = self.first_row - 1
+        for row in self.rows:
+            row_number += 1
+            while len(self.letters) < len(row):
+                self.letters.append(_column_letter(len(self.letters) + 1))
+            cells = []
+            for col_idx, value in enumerate(row):
+                if value is None:
+                    continue
+                style = date_style if col_idx == self.date_column else None
+                strings = None if col_idx in self.inline_columns else self.strings
+                if strings is None and isinstance(value, str):
+                    self.inline += 1
+                cells.append(_cell_xml(prefix, f"{self.letters[col_idx]}{row_number}", value, style, strings))
+            yield f'<{prefix}row r="{row_number}">{"".join(cells)}</{prefix}row>'.encode("utf-8")
+
+            self.written += 1
+            if row and row[0] is not None and str(row[0]).strip() != "":
+                self.data_rows.append(row_number)
+                self.data_dates.append(row[self.date_column] if self.date_column is not None else None)
+
+
+# Rows from the first replaced block on, one <row> element at a time: the
+# rows of the replaced blocks are dropped and the new rows of each block are
+# written where it ended, the rows below get the row number they move to.
+# blocks are (first_row, last_row, _NewRows) in sheet order.
+class _RowEdits:
+    def __init__(self, blocks, date_column):
+        self.blocks = blocks
+        self.next = 0
+        self.shift = 0
+        self.drop = False
+        self.date_cell = None
+        if date_column is not None:
+            letter = _column_letter(date_column + 1).encode("ascii")
+            self.date_cell = re.compile(rb'<(?:\w+:)?c\s[^>]*?\br="' + letter + rb'\d+"[^>]*>')
+        self.date_style = None
+
+    # The new rows of the blocks that end before row number (all when None)
+    def flush(self, prefix, number=None):
+        while self.next < len(self.blocks) and (number is None or self.blocks[self.next][1] < number):
+            first, last, new_rows = self.blocks[self.next]
+            yield from new_rows.xml(prefix, self.date_style)
+            self.shift += len(new_rows.rows) - (last - first + 1)
+            self.next += 1
+
+    # Start tag of row number, renumbered, or nothing when the row is replaced
+    def row(self, tag, number):
+        self.drop = self.next < len(self.blocks) and self.blocks[self.next][0] <= number
+        if self.drop or not self.shift:
+            return b"" if self.drop else tag
+        return ROW_NUMBER.sub(lambda m: b'r="%d"' % (int(m.group(1)) + self.shift), tag, count=1)
+
+    # Cells (and end tag) of the current row
+    def cells(self, xml):
+        if self.date_cell is not None:
+            cell = self.date_cell.search(xml)
+            style = cell and STYLE.search(cell.group(0))
+            if style:
+                self.date_style = style.group(1).decode("ascii")
+        if self.drop or not self.shift:
+            return b"" if self.drop else xml
+        return CELL_ROW.sub(lambda m: m.group(1) + b"%d" % (int(m.group(2)) + self.shift) + m.group(3), xml)
+
+
+# The sheet XML with the new rows after last_data_row. Rows up to
+# last_row (the last row the new data takes) must not hold any values;
+# rows after it are kept where they are. With blocks, the rows of each
+# replaced block are swapped for its new rows first (see _RowEdits).
+def _patched_sheet(pieces, last_data_row, last_row, column_count, new_rows, blocks=()):
+    def dimension(match):
+        min_col, min_row, max_col, max_row = _ref_bounds(match.group(2).decode("ascii"))
+        ref = f"{_column_letter(min_col)}{min_row}:{_column_letter(max(max_col, column_count))}{max(max_row, last_row)}"
+        return match.group(1) + ref.encode("ascii") + match.group(3)
+
+    date_cell = None
+    if last_data_row > 1 and new_rows.date_column is not None:
+        ref = f"{_column_letter(new_rows.date_column + 1)}{last_data_row}".encode("ascii")
+        date_cell = re.compile(rb'<(?:\w+:)?c\s[^>]*?\br="' + ref + rb'"[^>]*>')
+    date_style = None
+    edits = _RowEdits(blocks, new_rows.date_column) if blocks else None
+    # Rows up to here are copied as they are
+    copied = blocks[0][0] - 1 if blocks else last_data_row
+    # Rows that move keep their cells, but not what refers to them
+    moving = any(len(rows.rows) != last - first + 1 and last < last_data_row for first, last, rows in blocks)
+    state = "head"
+
+    for piece in pieces:
+        pos = 0
+        if moving and b"<f" in piece and FORMULA_TAG.search(piece):
+            raise _NotPatchable("formulas in a sheet whose rows move")
+        if state == "head":
+            piece = DIMENSION.sub(dimension, piece, count=1)
+            match = SHEET_DATA.search(piece)
+            if match is None:
+                yield piece
+                continue
+            prefix = match.group(1)
+            if match.group(2):
+                # <sheetData/>: an empty sheet
+                yield piece[:match.start()] + b"<" + prefix + b"sheetData>"
+                yield from new_rows.xml(prefix, None)
+                yield b"</" + prefix + b"sheetData>" + piece[match.end():]
+                state = "rest"
+                continue
+            yield piece[:match.end()]
+            pos = match.end()
+            state = "rows"
+
+        if state == "rows":
+            end = SHEET_DATA_END.search(piece, pos)
+            limit = end.start() if end else len(piece)
+            for row in ROW_TAG.finditer(piece, pos, limit):
+                number = ROW_NUMBER.search(row.group(0))
+                if number is None:
+                    raise _NotPatchable("row without a row number")
+                if int(number.group(1)) > copied:
+                    limit = row.start()
+                    break
+            if date_cell is not None and date_style is None:
+                cell = date_cell.search(piece, pos, limit)
+                if cell is not None and STYLE.search(cell.group(0)):
+                    date_style = STYLE.search(cell.group(0)).group(1).decode("ascii")
+            yield piece[pos:limit]
+            if limit == len(piece):
+                continue
+            pos = limit
+            state = "edit" if edits is not None else "gap"
+
+        if state == "edit":
+            end = SHEET_DATA_END.search(piece, pos)
+            limit = end.start() if end else len(piece)
+            for row in ROW_TAG.finditer(piece, pos, limit):
+                yield edits.cells(piece[pos:row.start()])
+                number = ROW_NUMBER.search(row.group(0))
+                if number is None:
+                    raise _NotPatchable("row without a row number")
+                number = int(number.group(1))
+                if number > last_data_row:
+                    limit = row.start()
+                    break
+                yield from edits.flush(prefix, number)
+                yield edits.row(row.group(0), number)
+                pos = row.end()
+            else:
+                yield edits.cells(piece[pos:limit])
+                if limit == len(piece):
+                    continue
+            yield from edits.flush(prefix)
+            date_style = edits.date_style or date_style
+            pos = limit
+            state = "gap"
+
+        if state == "gap":
+            # Rows the new data takes: formatting only, they are dropped
+            end = SHEET_DATA_END.search(piece, pos)
+            limit = end.start() if end else len(piece)
+            for row in ROW_TAG.finditer(piece, pos, limit):
+                number = ROW_NUMBER.search(row.group(0))
+                if number is None:
+                    raise _NotPatchable("row without a row number")
+                if int(number.group(1)) > last_row:
+                    limit = row.start()
+                    break
+            if VALUE_TAG.search(piece, pos, limit):
+                raise _NotPatchable("values after the last data row")
+            if limit == len(piece):
+                continue
+            yield from new_rows.xml(prefix, date_style)
+            piece = piece[limit:]
+            state = "rest"
+
+        if state == "rest":
+            if moving and MOVED_REFS.search(piece):
+                raise _NotPatchable("merged cells, links or rules on rows that move")
+            yield piece
+
+    if state != "rest":
+        raise _NotPatchable("no sheetData")
+
+
+def _name_bytes(info):
+    return info.orig_filename.encode("utf-8" if info.flag_bits & UTF8_FLAG else "cp437")
+
+
+def _dos_time(date_time):
+    year, month, day, hour, minute, second = date_time[:6]
+    return (hour << 11) | (minute << 5) | (second // 2), ((max(year, 1980) - 1980) << 9) | (month << 5) | day
+
+
+def _copy_bytes(src, out, length):
+    while length > 0:
+        block = src.read(min(COPY_BLOCK, length))
+        if not block:
+            raise _NotPatchable("truncated zip member")
+        out.write(block)
+        length -= len(block)
+
+
+# Copy a member (local header, compressed data, data descriptor) as it is
+def _copy_raw(src, info, out):
+    src.seek(info.header_offset)
+    fields = LOCAL_HEADER.unpack(src.read(LOCAL_HEADER.size))
+    if fields[0] != LOCAL_SIGNATURE:
+        raise _NotPatchable("bad local header")
+    length = LOCAL_HEADER.size + fields[10] + fields[11] + info.compress_size
+    if info.flag_bits & DESCRIPTOR_FLAG:
+        src.seek(info.header_offset + length)
+        length += 16 if src.read(4) == DESCRIPTOR_SIGNATURE else 12
+    src.seek(info.header_offset)
+    _copy_bytes(src, out, length)
+
+
+# Deflate the chunks into a new member at the current position of out,
+# returns the ZipInfo for its central directory record
+def _write_deflated(out, info, chunks):
+    info = copy.copy(info)
+    info.date_time = time.localtime()[:6]
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.flag_bits &= UTF8_FLAG
+    info.extract_version = max(info.extract_version, 20)
+    info.create_version = max(info.create_version, 20)
+    info.extra = b""
+
+    offset = out.tell()
+    name = _name_bytes(info)
+    dostime, dosdate = _dos_time(info.date_time)
+    out.write(LOCAL_HEADER.pack(LOCAL_SIGNATURE, info.extract_version, 0, info.flag_bits, info.compress_type,
+                                dostime, dosdate, 0, 0, 0, len(name), 0) + name)
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    crc = file_size = compress_size = 0
+    for chunk in chunks:
+        crc = zlib.crc32(chunk, crc)
+        file_size += len(chunk)
+        data = compressor.compress(chunk)
+        compress_size += len(data)
+        out.write(data)
+    data = compressor.flush()
+    compress_size += len(data)
+    out.write(data)
+    if file_size >= ZIP_LIMIT or compress_size >= ZIP_LIMIT:
+        raise _NotPatchable("sheet too large for a plain zip")
+
+    # Sizes and CRC go into the local header afterwards (offset 14)
+    end = out.tell()
+    out.seek(offset + 14)
+    out.write(struct.pack("<3L", crc, compress_size, file_size))
+    out.seek(end)
+
+    info.CRC, info.compress_size, info.file_size = crc, compress_size, file_size
+    return info
+
+
+def _central_record(info, offset):
+    name = _name_bytes(info)
+    dostime, dosdate = _dos_time(info.date_time)
+    return CENTRAL_HEADER.pack(
+        CENTRAL_SIGNATURE, info.create_version, info.create_system, info.extract_version, info.reserved,
+        info.flag_bits, info.compress_type, dostime, dosdate, info.CRC, info.compress_size, info.file_size,
+        len(name), len(info.extra), len(info.comment), 0, info.internal_attr, info.external_attr, offset,
+    ) + name + info.extra + info.comment
+
+
+# Date row ranges of the index with the new ranges added, a block that
+# continues the last block of the same date is merged into it
+def _merge_date_rows(date_rows, new_ranges):
+    merged = {day: [list(r) for r in ranges] for day, ranges in date_rows.items()}
+    for day, ranges in new_ranges.items():
+        existing = merged.setdefault(day, [])
+        for start, end in ranges:
+            if existing and existing[-1][1] + 1 == start:
+                existing[-1][1] = end
+            else:
+                existing.append([start, end])
+    return merged
+
+
+# Date row ranges after a replace: the ranges of the replaced blocks are
+# dropped, the others move with the rows above them and the ranges of the
+# new rows are added, blocks of a date that touch are merged
+def _replaced_date_rows(date_rows, blocks, new_rows):
+    def moved(row):
+        return row + sum(len(rows.rows) - (last - first + 1) for first, last, rows in blocks if last < row)
+
+    merged = {}
+    for day, ranges in date_rows.items():
+        for start, end in ranges:
+            if not any(first <= start and end <= last for first, last, _ in blocks):
+                merged.setdefault(day, []).append([moved(start), moved(end)])
+    for rows in [rows for _, _, rows in blocks] + [new_rows]:
+        for day, ranges in date_row_ranges(rows.data_rows, rows.data_dates).items():
+            merged.setdefault(day, []).extend(ranges)
+    for day, ranges in merged.items():
+        ranges.sort()
+        joined = [ranges[0]]
+        for start, end in ranges[1:]:
+            if joined[-1][1] + 1 == start:
+                joined[-1][1] = end
+            else:
+                joined.append([start, end])
+        merged[day] = joined
+    return merged
+
+
+# Positions of the inline string columns ("Order No,Comment" or a list) among columns
+def inline_positions(inline, columns):
+    if not inline:
+        return []
+    names = [c.strip() for c in inline.split(",") if c.strip()] if isinstance(inline, str) else list(inline)
+    columns = [str(c) for c in columns]
+    missing = [c for c in names if c not in columns]
+    if missing:
+        raise ValueError(f"❌ Inline string columns not found in the CSV: {', '.join(missing)}\n"
+                         f"❌ Spalten für Inline-Zeichenfolgen fehlen in der CSV: {', '.join(missing)}")
+    return [columns.index(c) for c in names]
+
+
+# Append rows (an iterable of value tuples, row_count of them, at most
+# column_count wide) to the target sheet by patching its XML in place.
+# inline_columns are the positions of columns written as inline strings.
+# Returns the layout of the sheet like write_rewrite does (plus the shared
+# strings counts), or None when the sheet can't be patched. rows may have been
+# read by then (the zip size limit only shows once they are written), so
+# callers give the fallback a fresh iterable of the same rows. The patched
+# file is swapped in through the journal of the import when there is one
+# (see journal.py).
+def patch_append(excel_path, index, rows, row_count, column_count, sheet_name=None, date_column=None,
+                 inline_columns=(), journal=None):
+    return _patch(excel_path, index, rows, row_count, column_count, sheet_name, date_column, inline_columns,
+                  journal, ())
+
+
+# Replace-by-date on the sheet XML: the rows of every (first_row, last_row,
+# new_rows) in replace_ranges (see upsert.plan_replacements) are swapped for
+# its new rows and the rows below are renumbered, then rows is appended as in
+# patch_append. Returns the layout, or None when the sheet can't be patched;
+# rows may have been read by then, the fallback gets a fresh iterable.
+def patch_replace(excel_path, index, replace_ranges, rows, row_count, column_count, sheet_name=None,
+                  date_column=None, inline_columns=(), journal=None):
+    return _patch(excel_path, index, rows, row_count, column_count, sheet_name, date_column, inline_columns,
+                  journal, sorted(replace_ranges, key=lambda r: r[0]))
+
+
+def _patch(excel_path, index, rows, row_count, column_count, sheet_name, date_column, inline_columns, journal,
+           replace_ranges):
+    last_data_row = index["last_data_row"]
+    # Rows the replaced blocks add (or remove, when negative)
+    shift = sum(len(block) - (last - first + 1) for first, last, block in replace_ranges)
+    new_rows = None
+    blocks = []
+    tmp_path = excel_path + ".tmp"
+
+    try:
+        with zipfile.ZipFile(excel_path) as archive, open(excel_path, "rb") as src, open(tmp_path, "wb") as out:
+            member = sheet_member(archive, sheet_name)
+            infos = archive.infolist()
+            if len(infos) >= ZIP_MAX_MEMBERS or any(
+                    max(i.header_offset, i.compress_size, i.file_size) >= ZIP_LIMIT for i in infos):
+                raise _NotPatchable("zip64 archive")
+
+            strings_member = shared_strings_member(archive)
+            strings = None
+            if strings_member or NEW_SST_MEMBER not in archive.namelist():
+                strings = _SharedStrings(archive, strings_member)
+            moved = 0
+            for first, last, block in replace_ranges:
+                blocks.append((first, last, _NewRows(block, first + moved, date_column, strings, inline_columns)))
+                moved += len(block) - (last - first + 1)
+            new_rows = _NewRows(rows, last_data_row + shift + 1, date_column, strings, inline_columns)
+
+            # The shared strings table (and where a new one is registered) goes
+            # last, once the sheet has added to it
+            deferred = set()
+            if strings is not None:
+                deferred = {strings.member, CONTENT_TYPES, WORKBOOK_RELS} if strings.created else {strings.member}
+            records = []
+            for info in sorted(infos, key=lambda i: i.filename in deferred):
+                offset = out.tell()
+                if info.filename == member:
+                    with archive.open(info) as sheet_xml:
+                        pieces = _patched_sheet(_xml_pieces(sheet_xml), last_data_row,
+                                                last_data_row + shift + row_count, column_count, new_rows, blocks)
+                        # The XML is built in a thread while this one deflates and writes (see pipeline.py)
+                        info = _write_deflated(out, info, prefetch(joined(pieces, PATCH_BLOCK)))
+                elif strings is not None and strings.added and info.filename == strings.member:
+                    with archive.open(info) as strings_xml:
+                        info = _write_deflated(out, info, strings.patched(_xml_pieces(strings_xml)))
+                elif strings is not None and strings.added and strings.created and info.filename in deferred:
+                    info = _write_deflated(out, info, [strings.register(info.filename, archive.read(info))])
+                else:
+                    _copy_raw(src, info, out)
+                if out.tell() >= ZIP_LIMIT:
+                    raise _NotPatchable("workbook too large for a plain zip")
+                records.append(_central_record(info, offset))
+
+            if strings is not None and strings.added and strings.created:
+                offset = out.tell()
+                info = zipfile.ZipInfo(strings.member, time.localtime()[:6])
+                info.external_attr = 0o600 << 16
+                info = _write_deflated(out, info, strings.patched([EMPTY_SST]))
+                records.append(_central_record(info, offset))
+
+            start = out.tell()
+            out.write(b"".join(records))
+            out.write(END_RECORD.pack(END_SIGNATURE, 0, 0, len(records), len(records), out.tell() - start, start,
+                                      len(archive.comment)) + archive.comment)
+    except _NotPatchable as e:
+        os.remove(tmp_path)
+        say(f"ℹ️ The sheet can't be patched in place ({e}), the workbook is rewritten instead.",
+            f"ℹ️ Das Arbeitsblatt kann nicht direkt ergänzt werden ({e}), die Arbeitsmappe wird neu geschrieben.")
+        return None
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    commit_file(tmp_path, excel_path, journal)
+
+    strings = dict(strings.stats() if strings else {"reused": 0, "added": 0, "total": 0},
+                   inline=new_rows.inline + sum(rows.inline for _, _, rows in blocks))
+    if not blocks:
+        return {
+            "row_count": index["row_count"] + len(new_rows.data_rows),
+            "last_data_row": new_rows.data_rows[-1] if new_rows.data_rows else last_data_row,
+            "date_rows": _merge_date_rows(index["date_rows"],
+                                          date_row_ranges(new_rows.data_rows, new_rows.data_dates)),
+            "added_rows": new_rows.written,
+            "removed_rows": 0,
+            "strings": strings,
+        }
+
+    removed_rows = sum(last - first + 1 for first, last, _ in blocks)
+    date_rows = _replaced_date_rows(index["date_rows"], blocks, new_rows)
+    last_rows = [rows.data_rows[-1] for _, _, rows in blocks + [(0, 0, new_rows)] if rows.data_rows]
+    if not any(first <= last_data_row <= last for first, last, _ in blocks):
+        last_rows.append(last_data_row + shift)
+    last_rows.extend(ranges[-1][1] for ranges in date_rows.values())
+    return {
+        "row_count": index["row_count"] - removed_rows + len(new_rows.data_rows)
+                     + sum(len(rows.data_rows) for _, _, rows in blocks),
+        "last_data_row": max(last_rows, default=1),
+        "date_rows": date_rows,
+        "added_rows": new_rows.written + sum(rows.written for _, _, rows in blocks),
+        "removed_rows": removed_rows,
+        "strings": strings,
+    }
+
+
+# Run log lines on the shared strings table, empty when the rows were not patched in
+def strings_log(layout):
+    strings = layout.get("strings")
+    if not strings:
+        return ""
+    return (
+        f"\U0001F524 Shared strings: {strings['reused']} reused, {strings['added']} added "
+        f"(table now {strings['total']}), {strings['inline']} inline\n"
+        f"\U0001F524 Gemeinsame Zeichenfolgen: {strings['reused']} wiederverwendet, {strings['added']} neu "
+        f"(Tabelle jetzt {strings['total']}), {strings['inline']} inline\n"
+    )
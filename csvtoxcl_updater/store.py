@@ -0,0 +1,301 @@
+# Parquet shadow store
+#
+# The .xlsx master is the slowest format to append to: every run rewrites the
+# whole zip container. The store keeps the same rows as Parquet files
+# partitioned by month, next to the master by default:
+#
+#     Sales_Cube_BM_Master.xlsx.parquet/month=2024-05/part-20240601-071500-000000.parquet
+#
+# Power BI can read the folder directly. An append writes one small file per
+# month it touches, so it costs about the size of the CSV, not the size of the
+# master. The Excel workbook becomes a derived view, regenerated on request
+# with export_excel.
+#
+# _store.json in the folder is the source of truth: header, column types, the
+# part files of every month and the rows per date. Date dedup reads only this
+# file. Power BI reads every part file in the folder though, so new parts are
+# written under names starting with "_" (skipped by Parquet readers and
+# Power BI) and only renamed into place once _store.json lists them; the parts
+# a replace superseded are removed then. A write that was cut off is finished
+# the same way by the next one: staged parts _store.json lists are renamed,
+# every other part file is removed. Writers hold "<store>.lock" next to the
+# folder (see lock.py) from reading _store.json to the last rename.
+#
+# Parquet needs one type per column, so every column is fixed as date, number
+# or text when the store is created from the master.
+#
+# Needs pyarrow (pip install pyarrow).
+
+import json
+import os
+from datetime import date, datetime
+
+import pandas as pd
+
+from csvtoxcl_updater.dates import parse_dates, date_only
+from csvtoxcl_updater.export import export_frames
+from csvtoxcl_updater.lock import wait_lock
+from csvtoxcl_updater.streaming import iter_master_chunks
+
+STORE_VERSION = 1
+STORE_SUFFIX = ".parquet"
+MANIFEST_NAME = "_store.json"
+UNDATED = "undated"
+
+
+def store_path(excel_path):
+    return excel_path + STORE_SUFFIX
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError("❌ The Parquet store needs pyarrow: pip install pyarrow\n"
+                          "❌ Der Parquet-Speicher benötigt pyarrow: pip install pyarrow") from None
+
+
+def load_store(store_dir):
+    try:
+        with open(os.path.join(store_dir, MANIFEST_NAME), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != STORE_VERSION:
+        return None
+    return manifest
+
+
+def save_store(store_dir, manifest):
+    manifest_path = os.path.join(store_dir, MANIFEST_NAME)
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+
+# Make the part files in the folder match the manifest: staged parts it
+# lists are renamed into place, every other part file is removed
+def _publish(store_dir, manifest):
+    listed = {name for names in manifest["parts"].values() for name in names}
+    for folder in sorted(os.listdir(store_dir)):
+        path = os.path.join(store_dir, folder)
+        if not folder.startswith("month=") or not os.path.isdir(path):
+            continue
+        for file in sorted(os.listdir(path)):
+            if not file.lstrip("_").startswith("part-"):
+                continue
+            if file.startswith("_") and f"{folder}/{file[1:]}" in listed:
+                os.replace(os.path.join(path, file), os.path.join(path, file[1:]))
+            elif f"{folder}/{file}" not in listed:
+                os.remove(os.path.join(path, file))
+
+
+# Commit the manifest, then publish the parts it lists
+def _commit(store_dir, manifest):
+    save_store(store_dir, manifest)
+    _publish(store_dir, manifest)
+
+
+# Wait for the lock of the store and finish a write that was cut off
+def lock_store(store_dir):
+    lock = wait_lock(os.path.normpath(store_dir))
+    try:
+        manifest = load_store(store_dir)
+        if manifest is not None:
+            _publish(store_dir, manifest)
+    except BaseException:
+        lock.release()
+        raise
+    return lock
+
+
+# Load the store or explain how to create it
+def get_store(store_dir):
+    manifest = load_store(store_dir)
+    if manifest is None:
+        raise ValueError(f"❌ No Parquet store in {store_dir}, create it first: python -m csvtoxcl_updater store init <master.xlsx>\n"
+                         f"❌ Kein Parquet-Speicher in {store_dir}, bitte zuerst anlegen: python -m csvtoxcl_updater store init <master.xlsx>")
+    return manifest
+
+
+def store_dates(manifest):
+    return {date.fromisoformat(d) for d in manifest["dates"]}
+
+
+# "date", "number" or "text" for one column of master values
+def _column_type(column):
+    values = column.dropna()
+    if pd.api.types.is_datetime64_any_dtype(column) or (len(values) and values.map(lambda v: isinstance(v, (datetime, date))).all()):
+        return "date"
+    if pd.api.types.is_bool_dtype(column):
+        return "text"
+    if pd.api.types.is_numeric_dtype(column) or pd.to_numeric(values, errors='coerce').notna().all():
+        return "number"
+    return "text"
+
+
+# Column types over all chunks: a column is only a number (or date) column if it is one in every chunk
+def _merge_types(types, chunk_types):
+    if types is None:
+        return chunk_types
+    return {name: kind if kind == chunk_types[name] else "text" for name, kind in types.items()}
+
+
+def _type_error(name, kind):
+    return ValueError(f"❌ Column '{name}' has values that are not a {kind} as in the Parquet store. Recreate it with 'store init'.\n"
+                      f"❌ Spalte '{name}' enthält Werte, die nicht dem Typ '{kind}' im Parquet-Speicher entsprechen. Bitte mit 'store init' neu anlegen.")
+
+
+# Bring a frame to the store header and column types
+def _conform(df, manifest):
+    header, types = manifest["header"], manifest["types"]
+    if list(df.columns) != header:
+        if len(df.columns) != len(header):
+            raise ValueError("❌ The CSV columns don't match the Parquet store.\n❌ Die CSV-Spalten passen nicht zum Parquet-Speicher.")
+        df = df.set_axis(header, axis=1)
+
+    columns = {}
+    for name in header:
+        column = df[name]
+        present = column.notna() & (column.astype(str).str.strip() != "")
+        if types[name] == "date":
+            converted = parse_dates(column)
+        elif types[name] == "number":
+            converted = pd.to_numeric(column.where(present), errors='coerce').astype(float)
+        else:
+            converted = column.astype(object).where(present, None).map(lambda v: v if v is None else str(v))
+        if types[name] != "text" and (converted.isna() & present).any():
+            raise _type_error(name, types[name])
+        columns[name] = converted
+    return pd.DataFrame(columns, index=df.index)
+
+
+def _month_keys(df):
+    months = df['Date'].dt.strftime("%Y-%m")
+    return months.where(df['Date'].notna(), UNDATED)
+
+
+def _part_name(tag):
+    return f"part-{tag}.parquet"
+
+
+# Write one staged part file per month of df (published by _commit),
+# returns {month: file name relative to the store}
+def _write_parts(store_dir, df, tag):
+    parts = {}
+    for month, group in df.groupby(_month_keys(df), sort=True):
+        folder = os.path.join(store_dir, f"month={month}")
+        os.makedirs(folder, exist_ok=True)
+        group.to_parquet(os.path.join(folder, "_" + _part_name(tag)), index=False, engine="pyarrow")
+        parts[month] = f"month={month}/{_part_name(tag)}"
+    return parts
+
+
+def _count_dates(df, counts):
+    days = date_only(df['Date'])
+    for day, rows in days.value_counts().items():
+        counts[day.isoformat()] = counts.get(day.isoformat(), 0) + int(rows)
+    return len(df) - int(days.notna().sum())
+
+
+def _new_tag():
+    return datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+
+
+# Create the store from the master workbook (one pass to fix the column types, one to copy the rows)
+def init_store(excel_path, store_dir=None, sheet_name=None, chunk_size=50000):
+    _require_pyarrow()
+    store_dir = store_dir or store_path(excel_path)
+    if load_store(store_dir) is not None:
+        raise ValueError(f"❌ Parquet store already exists: {store_dir}\n❌ Parquet-Speicher ist bereits vorhanden: {store_dir}")
+
+    types = None
+    header = None
+    for chunk in iter_master_chunks(excel_path, sheet_name=sheet_name, chunk_size=chunk_size):
+        header = [str(h) for h in chunk.columns]
+        types = _merge_types(types, {str(name): _column_type(chunk[name]) for name in chunk.columns})
+    if header is None:
+        raise ValueError("❌ The Excel file has no data rows.\n❌ Die Excel-Datei enthält keine Datenzeilen.")
+    if "Date" not in header:
+        raise ValueError("❌ 'Date' column not found in the Excel file.\n❌ Spalte 'Date' fehlt in der Excel-Datei.")
+    types["Date"] = "date"
+
+    os.makedirs(store_dir, exist_ok=True)
+    manifest = {"version": STORE_VERSION, "header": header, "types": types,
+                "parts": {}, "dates": {}, "undated_rows": 0, "row_count": 0}
+    for number, chunk in enumerate(iter_master_chunks(excel_path, sheet_name=sheet_name, chunk_size=chunk_size)):
+        frame = _conform(chunk, manifest)
+        for month, name in _write_parts(store_dir, frame, f"init-{number:05d}").items():
+            manifest["parts"].setdefault(month, []).append(name)
+        manifest["undated_rows"] += _count_dates(frame, manifest["dates"])
+        manifest["row_count"] += len(frame)
+
+    _commit(store_dir, manifest)
+    return manifest
+
+
+# Add rows as new part files, one per month they cover
+def append_to_store(store_dir, manifest, df):
+    _require_pyarrow()
+    frame = _conform(df, manifest)
+    for month, name in _write_parts(store_dir, frame, _new_tag()).items():
+        manifest["parts"].setdefault(month, []).append(name)
+    manifest["undated_rows"] += _count_dates(frame, manifest["dates"])
+    manifest["row_count"] += len(frame)
+    _commit(store_dir, manifest)
+    return len(frame)
+
+
+def read_month(store_dir, manifest, month):
+    frames = [pd.read_parquet(os.path.join(store_dir, name), engine="pyarrow") for name in manifest["parts"].get(month, [])]
+    return pd.concat(frames, ignore_index=True) if frames else None
+
+
+# Replace the stored rows of every date in df; only the months holding those dates are rewritten
+# Returns (replaced dates, removed rows)
+def replace_in_store(store_dir, manifest, df):
+    _require_pyarrow()
+    frame = _conform(df, manifest)
+    days = date_only(frame['Date'])
+    replaced = sorted(d for d in set(days.dropna()) if d.isoformat() in manifest["dates"])
+    touched = sorted({d.strftime("%Y-%m") for d in replaced})
+
+    tag = _new_tag()
+    removed_rows = 0
+    new_months = _month_keys(frame)
+    for month in touched:
+        stored = read_month(store_dir, manifest, month)
+        keep = ~date_only(stored['Date']).isin(replaced)
+        removed_rows += int((~keep).sum())
+        merged = pd.concat([stored.loc[keep], frame.loc[new_months == month]], ignore_index=True)
+        manifest["parts"][month] = [_write_parts(store_dir, merged, tag)[month]]
+
+    rest = frame.loc[~new_months.isin(touched)]
+    if len(rest):
+        for month, name in _write_parts(store_dir, rest, tag).items():
+            manifest["parts"].setdefault(month, []).append(name)
+
+    for day in replaced:
+        del manifest["dates"][day.isoformat()]
+    manifest["undated_rows"] += _count_dates(frame, manifest["dates"])
+    manifest["row_count"] += len(frame) - removed_rows
+    # The superseded parts of the touched months go once the manifest no longer lists them
+    _commit(store_dir, manifest)
+    return replaced, removed_rows
+
+
+# Stored rows month by month (undated rows last), one part file at a time
+def iter_store_frames(store_dir, manifest):
+    months = sorted(m for m in manifest["parts"] if m != UNDATED)
+    if UNDATED in manifest["parts"]:
+        months.append(UNDATED)
+    for month in months:
+        for name in manifest["parts"][month]:
+            yield pd.read_parquet(os.path.join(store_dir, name), engine="pyarrow")
+
+
+# Regenerate the master sheet from the store; other sheets of the workbook are kept
+def export_excel(store_dir, excel_path, manifest, sheet_name=None, allow_rewrite=False):
+    _require_pyarrow()
+    return export_frames(excel_path, manifest["header"], iter_store_frames(store_dir, manifest), sheet_name,
+                         allow_rewrite)
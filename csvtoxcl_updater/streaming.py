@@ -0,0 +1,422 @@
+# Streaming append engine
+#
+# The master is never loaded as a full openpyxl object model. Pass one reads
+# only the columns needed for dedup in read-only mode, pass two copies every
+# sheet row by row into a write-only workbook, adds the new rows at the end of
+# the target sheet and swaps the result in place of the master.
+# Memory stays flat no matter how many rows the master holds.
+#
+# The same pass can drop blocks of rows and write replacement rows in their
+# place (replace-by-date), and it reports the resulting row layout of the
+# target sheet so the date index can be updated without another scan.
+#
+# Write-only workbooks carry cell values only: column widths, cell styles,
+# freeze panes, charts, pivot tables and defined names of the master are not
+# copied over. So the rewrite first checks the archive for such parts
+# (rewrite_losses) and refuses to run on a workbook that has any, unless it
+# was allowed explicitly (--allow-rewrite); it then says what is dropped.
+
+import os
+import re
+import zipfile
+from collections import namedtuple
+from xml.etree import ElementTree
+
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+
+from csvtoxcl_updater.common import say
+from csvtoxcl_updater.dates import date_row_ranges
+from csvtoxcl_updater.journal import commit_file
+from csvtoxcl_updater.schema import apply_schema
+from csvtoxcl_updater.tail import probe_last_data_row
+
+MasterColumns = namedtuple("MasterColumns", ["header", "columns", "rows", "last_data_row"])
+
+SCAN_BLOCK = 1 << 20
+# Parts of the archive a rewrite does not carry over: (member prefix, English, German)
+LOST_MEMBERS = (
+    ("xl/charts/", "charts", "Diagramme"),
+    ("xl/drawings/", "drawings and images", "Zeichnungen und Bilder"),
+    ("xl/pivotTables/", "pivot tables", "Pivot-Tabellen"),
+    ("xl/tables/", "Excel tables", "Excel-Tabellen"),
+    ("xl/comments", "comments", "Kommentare"),
+    ("xl/externalLinks/", "external links", "externe Verknüpfungen"),
+    ("xl/vbaProject.bin", "macros", "Makros"),
+)
+# Elements of the sheet (outside <sheetData>) and workbook XML a rewrite does not carry over
+LOST_SHEET_XML = (
+    (rb"<(?:\w+:)?col[\s/>]", "column widths", "Spaltenbreiten"),
+    (rb"<(?:\w+:)?pane[\s/>]", "freeze panes", "fixierte Bereiche"),
+    (rb"<(?:\w+:)?mergeCell[\s/>]", "merged cells", "verbundene Zellen"),
+    (rb"<(?:\w+:)?conditionalFormatting[\s/>]", "conditional formatting", "bedingte Formatierung"),
+    (rb"<(?:\w+:)?dataValidation[\s/>]", "data validation", "Datenüberprüfung"),
+    (rb"<(?:\w+:)?autoFilter[\s/>]", "filters", "Filter"),
+    (rb"<(?:\w+:)?hyperlink[\s/>]", "hyperlinks", "Hyperlinks"),
+    (rb"<(?:\w+:)?sheetProtection[\s/>]", "sheet protection", "Blattschutz"),
+    (rb"<(?:\w+:)?pageSetup[\s/>]", "print settings", "Druckeinstellungen"),
+)
+LOST_WORKBOOK_XML = (
+    (rb"<(?:\w+:)?definedName[\s/>]", "defined names", "definierte Namen"),
+    (rb"\bstate=\"(?:very)?[hH]idden\"", "hidden sheets", "ausgeblendete Blätter"),
+)
+ROW_HEIGHT = re.compile(rb'\bcustomHeight="(?:1|true)"')
+SHEET_DATA = re.compile(rb'<(?:\w+:)?sheetData\b[^>]*?(/?)>')
+# Number formats the rewrite writes itself: General, '0' and the openpyxl date format
+KEPT_FORMATS = {"0": "General", "1": "0"}
+KEPT_FORMAT_CODES = {"General", "0", "yyyy-mm-dd h:mm:ss"}
+STYLES_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+
+
+def _is_blank(value):
+    return value is None or str(value).strip() == ""
+
+
+def _target_sheet(wb, sheet_name):
+    return wb[sheet_name] if sheet_name else wb.active
+
+
+# Read the header and the requested columns of the master in read-only mode,
+# up to the last row with a value in column A (see tail.py)
+def read_master_columns(excel_path, columns=("Date",), sheet_name=None):
+    max_row = probe_last_data_row(excel_path, sheet_name)
+    wb = load_workbook(excel_path, read_only=True)
+    try:
+        ws = _target_sheet(wb, sheet_name)
+        header = next(ws.iter_rows(min_row=1, max_row=1, values_only=True), ())
+        header = tuple(header)
+
+        positions = {}
+        for name in columns:
+            if name not in header:
+                raise ValueError(f"❌ '{name}' column not found in the Excel file.\n❌ Spalte '{name}' fehlt in der Excel-Datei.")
+            positions[name] = header.index(name)
+
+        # Whole rows are read (the parser reads every cell of a row anyway),
+        # column A decides where the data ends
+        values = {name: [] for name in columns}
+        rows = []
+        last_data_row = 1
+
+        for row_number, row in enumerate(ws.iter_rows(min_row=2, max_row=max_row, values_only=True), start=2):
+            if not row or _is_blank(row[0]):
+                continue
+            last_data_row = row_number
+            rows.append(row_number)
+            for name, pos in positions.items():
+                values[name].append(row[pos] if pos < len(row) else None)
+
+        return MasterColumns(header, values, rows, last_data_row)
+    finally:
+        wb.close()
+
+
+# Yield the data rows of the master as DataFrames of chunk_size rows,
+# limited to the given columns (all columns when None), typed by the column
+# schema when one is given (see schema.py)
+def iter_master_chunks(excel_path, columns=None, sheet_name=None, chunk_size=50000, schema=None):
+    max_row = probe_last_data_row(excel_path, sheet_name)
+    wb = load_workbook(excel_path, read_only=True)
+    try:
+        ws = _target_sheet(wb, sheet_name)
+        header = tuple(next(ws.iter_rows(min_row=1, max_row=1, values_only=True), ()))
+        columns = list(columns) if columns is not None else [h for h in header if h is not None]
+        for name in columns:
+            if name not in header:
+                raise ValueError(f"❌ '{name}' column not found in the Excel file.\n❌ Spalte '{name}' fehlt in der Excel-Datei.")
+        positions = [header.index(name) for name in columns]
+        max_col = max(positions + [0]) + 1
+
+        chunk = []
+        for row in ws.iter_rows(min_row=2, max_row=max_row, max_col=max_col, values_only=True):
+            if not row or _is_blank(row[0]):
+                continue
+            chunk.append([row[pos] if pos < len(row) else None for pos in positions])
+            if len(chunk) >= chunk_size:
+                yield _master_frame(chunk, columns, schema)
+                chunk = []
+        if chunk:
+            yield _master_frame(chunk, columns, schema)
+    finally:
+        wb.close()
+
+
+def _master_frame(rows, columns, schema):
+    frame = pd.DataFrame(rows, columns=columns)
+    return frame if schema is None else apply_schema(frame, schema)
+
+
+# Copy one read-only sheet into a write-only sheet, dropping trailing blank rows
+def _copy_rows(src_ws, dst_ws):
+    pending_blank = 0
+    for row in src_ws.iter_rows(values_only=True):
+        if all(_is_blank(v) for v in row):
+            pending_blank += 1
+            continue
+        for _ in range(pending_blank):
+            dst_ws.append([])
+        pending_blank = 0
+        dst_ws.append(row)
+
+
+# Writes rows into the target sheet and keeps track of the resulting layout
+class _TargetWriter:
+    def __init__(self, dst_ws, date_column):
+        self.dst_ws = dst_ws
+        self.date_column = date_column
+        self.master_date_pos = None
+        self.row_number = 0
+        self.pending_blank = 0
+        self.data_rows = []
+        self.data_dates = []
+
+    def header(self, row):
+        self.master_date_pos = row.index('Date') if 'Date' in row else None
+        self.existing(row)
+
+    # Rows copied from the master, blank rows are held back until more data follows
+    def existing(self, row):
+        if all(_is_blank(v) for v in row):
+            self.pending_blank += 1
+            return
+        self._flush_blank()
+        self._write(row, self.master_date_pos)
+
+    # Rows coming from the CSV, Date cells get number format '0' like v1.4.7
+    def new(self, row):
+        self._flush_blank()
+        if self.date_column is not None and isinstance(row[self.date_column], float):
+            row = list(row)
+            raw_date = row[self.date_column]
+            cell = WriteOnlyCell(self.dst_ws, value=raw_date)
+            cell.number_format = '0'
+            row[self.date_column] = cell
+            self._write(row, None, raw_date)
+        else:
+            self._write(row, self.date_column)
+
+    def _flush_blank(self):
+        for _ in range(self.pending_blank):
+            self.dst_ws.append([])
+            self.row_number += 1
+        self.pending_blank = 0
+
+    def _write(self, row, date_pos, raw_date=None):
+        self.dst_ws.append(row)
+        self.row_number += 1
+        if self.row_number > 1 and bool(row) and not _is_blank(row[0]):
+            self.data_rows.append(self.row_number)
+            if date_pos is not None and date_pos < len(row):
+                raw_date = row[date_pos]
+            self.data_dates.append(raw_date)
+
+    def layout(self):
+        return {
+            "row_count": len(self.data_rows),
+            "last_data_row": self.data_rows[-1] if self.data_rows else 1,
+            "date_rows": date_row_ranges(self.data_rows, self.data_dates),
+        }
+
+
+def _rewrite_target(src_ws, writer, new_rows, replace_ranges):
+    ranges = sorted(replace_ranges, key=lambda r: r[0])
+    done = [False] * len(ranges)
+    current = 0
+    removed_rows = added_rows = 0
+
+    for row_number, row in enumerate(src_ws.iter_rows(values_only=True), start=1):
+        if row_number == 1:
+            writer.header(row)
+            continue
+
+        while current < len(ranges) and row_number > ranges[current][1]:
+            current += 1
+        if current < len(ranges) and row_number >= ranges[current][0]:
+            if not done[current]:
+                for new_row in ranges[current][2]:
+                    writer.new(new_row)
+                    added_rows += 1
+                done[current] = True
+            removed_rows += 1
+            continue
+
+        writer.existing(row)
+
+    # Blank rows after the last data row are dropped, appended rows follow the data directly
+    writer.pending_blank = 0
+
+    # Replacement rows whose block was never reached go to the end
+    for (_, _, rows), written in zip(ranges, done):
+        if not written:
+            for new_row in rows:
+                writer.new(new_row)
+                added_rows += 1
+
+    for new_row in new_rows:
+        writer.new(new_row)
+        added_rows += 1
+
+    return added_rows, removed_rows
+
+
+def _found(patterns, xml):
+    return {pattern for pattern in patterns if re.search(pattern[0], xml)}
+
+
+# Which of LOST_SHEET_XML occur in a sheet, plus whether its rows have custom
+# heights. The rows make up nearly all of the XML and are only searched for
+# the height attribute; the parts before and after them are matched in full.
+def _scan_sheet(archive, name):
+    outside = carry = b""
+    heights = False
+    state = "head"
+    with archive.open(name) as xml:
+        for block in iter(lambda: xml.read(SCAN_BLOCK), b""):
+            if state == "head":
+                outside += block
+                match = SHEET_DATA.search(outside)
+                if match is None:
+                    continue
+                block = outside[match.end():]
+                outside = outside[:match.start()]
+                state = "tail" if match.group(1) else "rows"
+            if state == "rows":
+                data = carry + block
+                if not heights and b"customHeight" in data:
+                    heights = ROW_HEIGHT.search(data) is not None
+                end = data.find(b"sheetData>")
+                if end < 0:
+                    carry = data[-64:]
+                    continue
+                block = data[end:]
+                state = "tail"
+            outside += block
+    return _found(LOST_SHEET_XML, outside), heights
+
+
+def _lost_styles(archive):
+    try:
+        root = ElementTree.fromstring(archive.read("xl/styles.xml"))
+    except KeyError:
+        return []
+    codes = {f.get("numFmtId"): f.get("formatCode") for f in root.iter(STYLES_NS + "numFmt")}
+    cell_xfs = root.find(STYLES_NS + "cellXfs")
+    xfs = list(cell_xfs) if cell_xfs is not None else []
+    losses = []
+    if any(len(xf) or any(xf.get(name, "0") != "0" for name in ("fontId", "fillId", "borderId")) for xf in xfs):
+        losses.append(("cell styles", "Zellformate"))
+    formats = {xf.get("numFmtId", "0") for xf in xfs}
+    if any(KEPT_FORMATS.get(f, codes.get(f)) not in KEPT_FORMAT_CODES for f in formats):
+        losses.append(("number formats", "Zahlenformate"))
+    return losses
+
+
+# What a rewrite of the workbook would drop: [(English, German)], empty when
+# the workbook only holds what write_rewrite writes itself
+def rewrite_losses(excel_path):
+    if not os.path.exists(excel_path):
+        return []
+    with zipfile.ZipFile(excel_path) as archive:
+        names = archive.namelist()
+        losses = [(english, german) for prefix, english, german in LOST_MEMBERS
+                  if any(name.startswith(prefix) for name in names)]
+        found, heights = set(), False
+        for name in names:
+            if name.startswith("xl/worksheets/") and name.endswith(".xml"):
+                sheet_found, sheet_heights = _scan_sheet(archive, name)
+                found |= sheet_found
+                heights = heights or sheet_heights
+            elif name == "xl/workbook.xml":
+                found |= _found(LOST_WORKBOOK_XML, archive.read(name))
+        losses += [(english, german) for pattern, english, german in LOST_SHEET_XML + LOST_WORKBOOK_XML
+                   if (pattern, english, german) in found]
+        if heights:
+            losses.append(("row heights", "Zeilenhöhen"))
+        return losses + _lost_styles(archive)
+
+
+class LossyRewrite(ValueError):
+    pass
+
+
+# Refuse to rewrite a workbook that would lose parts on the way, unless
+# allow_lossy (--allow-rewrite); then the lost parts are announced
+def check_rewrite(excel_path, allow_lossy=False):
+    losses = rewrite_losses(excel_path)
+    if not losses:
+        return
+    name = os.path.basename(excel_path)
+    english = ", ".join(e for e, _ in losses)
+    german = ", ".join(g for _, g in losses)
+    if not allow_lossy:
+        raise LossyRewrite(
+            f"❌ {name} would have to be rewritten, which drops its {english}. Nothing was changed; "
+            f"run again with --allow-rewrite to rewrite it anyway.\n"
+            f"❌ {name} müsste neu geschrieben werden, dabei gingen verloren: {german}. Es wurde nichts geändert; "
+            f"mit --allow-rewrite trotzdem neu schreiben.")
+    say(f"⚠️ {name} is rewritten (--allow-rewrite), its {english} are dropped.",
+        f"⚠️ {name} wird neu geschrieben (--allow-rewrite), dabei gehen verloren: {german}.")
+
+
+# Write phase: copy the existing workbook into a write-only workbook, with
+# new_rows added at the end of the target sheet. replace_ranges is a list of
+# (first_row, last_row, rows): those master rows are dropped and rows are
+# written in their place. Returns the still open (src, dst) workbooks and the
+# layout of the target sheet afterwards; pass them to save_rewrite.
+# Raises LossyRewrite when the workbook has parts the rewrite would drop and
+# allow_lossy is not set (see check_rewrite).
+def write_rewrite(excel_path, new_rows=(), sheet_name=None, date_column=None, replace_ranges=(), allow_lossy=False):
+    check_rewrite(excel_path, allow_lossy)
+    src = load_workbook(excel_path, read_only=True)
+    dst = Workbook(write_only=True)
+
+    try:
+        target = _target_sheet(src, sheet_name)
+        for src_ws in src.worksheets:
+            dst_ws = dst.create_sheet(src_ws.title)
+            if src_ws.title != target.title:
+                _copy_rows(src_ws, dst_ws)
+                continue
+
+            writer = _TargetWriter(dst_ws, date_column)
+            added_rows, removed_rows = _rewrite_target(src_ws, writer, new_rows, replace_ranges)
+            layout = writer.layout()
+            layout.update(added_rows=added_rows, removed_rows=removed_rows)
+
+        dst.active = src.worksheets.index(target)
+    except BaseException:
+        src.close()
+        raise
+
+    return src, dst, layout
+
+
+# Save phase: zip the written workbook to a temp file and swap it in place of
+# the master (through the journal of the import when there is one, see journal.py)
+def save_rewrite(excel_path, src, dst, journal=None):
+    tmp_path = excel_path + ".tmp"
+    try:
+        dst.save(tmp_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        src.close()
+
+    commit_file(tmp_path, excel_path, journal)
+
+
+# Write the existing workbook back out in one streaming pass (write + save phase)
+def stream_rewrite(excel_path, new_rows=(), sheet_name=None, date_column=None, replace_ranges=(), journal=None,
+                   allow_lossy=False):
+    src, dst, layout = write_rewrite(excel_path, new_rows, sheet_name, date_column, replace_ranges, allow_lossy)
+    save_rewrite(excel_path, src, dst, journal)
+    return layout
+
+
+# Write the existing workbook plus the new rows back out in one streaming pass
+def stream_append(excel_path, new_rows, sheet_name=None, date_column=None, allow_lossy=False):
+    return stream_rewrite(excel_path, new_rows, sheet_name=sheet_name, date_column=date_column,
+                          allow_lossy=allow_lossy)
@@ -0,0 +1,106 @@
+# Finding the last data row of the master without walking the sheet
+#
+# v1.4.7 loops from sheet.max_row down to the last filled cell in column A.
+# When formatting runs far past the data, max_row is close to 1,048,576 and
+# the loop touches (and creates) a million cells before writing anything.
+#
+# The date index keeps the last data row, so an import with a current index
+# knows the append point without looking at the sheet. When the index has to
+# be rebuilt, the tail probe streams the raw worksheet XML out of the .xlsx
+# and finds the last column A cell that has a value, without building any
+# cells; the rebuild (see streaming.read_master_columns) then stops at that
+# row instead of reading on through the formatting-only rows up to max_row.
+#
+# The probe relies on every cell carrying its reference (r="A12"), as Excel
+# and openpyxl write them. For sheets where that does not hold it gives up,
+# and the rebuild reads every row.
+
+import posixpath
+import re
+import zipfile
+from xml.etree import ElementTree
+
+PROBE_BLOCK = 1 << 20
+
+NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+NS_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+COLUMN_A_REF = b' r="A'
+CELL_WITH_REF = b'<c r="'
+ROW_DIGITS = re.compile(rb'(\d+)"')
+# Cells with a namespace prefix (<x:c ...>) are not counted, the probe gives up on them
+PREFIXED_CELL = (b":c ", b":c>")
+
+
+# Zip member name of a worksheet ("xl/worksheets/sheet1.xml"), the active one when sheet_name is None
+def sheet_member(archive, sheet_name=None):
+    workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+    rels = ElementTree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    targets = {rel.get("Id"): rel.get("Target") for rel in rels.iter(NS_PKG_REL + "Relationship")}
+
+    sheets = list(workbook.iter(NS_MAIN + "sheet"))
+    if sheet_name is None:
+        view = next(workbook.iter(NS_MAIN + "workbookView"), None)
+        active = int(view.get("activeTab", 0)) if view is not None else 0
+        sheet = sheets[active]
+    else:
+        sheet = next((s for s in sheets if s.get("name") == sheet_name), None)
+        if sheet is None:
+            raise ValueError(f"❌ Sheet '{sheet_name}' not found in the Excel file.\n❌ Arbeitsblatt '{sheet_name}' fehlt in der Excel-Datei.")
+
+    return _part_name(targets[sheet.get(NS_REL + "id")])
+
+
+# Zip member name of the shared strings table, None when the workbook has none
+def shared_strings_member(archive):
+    rels = ElementTree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    for rel in rels.iter(NS_PKG_REL + "Relationship"):
+        if rel.get("Type", "").endswith("/sharedStrings"):
+            member = _part_name(rel.get("Target"))
+            return member if member in archive.namelist() else None
+    return None
+
+
+# Part name of a relationship target of xl/workbook.xml
+def _part_name(target):
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join("xl", target))
+
+
+# Read-only tail probe: last row with a value in column A, streamed from the
+# raw XML; None when not every cell has a reference (see above)
+def probe_last_data_row(excel_path, sheet_name=None):
+    last_row = 1
+    with zipfile.ZipFile(excel_path) as archive:
+        with archive.open(sheet_member(archive, sheet_name)) as sheet_xml:
+            carry = b""
+            while True:
+                block = sheet_xml.read(PROBE_BLOCK)
+                data = carry + block
+                # Keep the unfinished tag at the end for the next block
+                cut = data.rfind(b"<") if block else len(data)
+                if cut < 0:
+                    cut = len(data)
+                data, carry = data[:cut], data[cut:]
+                cells = data.count(b"<c ") + data.count(b"<c>")
+                if cells != data.count(CELL_WITH_REF) or any(tag in data for tag in PREFIXED_CELL):
+                    return None
+                last_row = max(last_row, _last_column_a_row(data))
+                if not block:
+                    return last_row
+
+
+# Row of the last column A cell with content (not a self-closing,
+# formatting-only <c .../>) in a piece of sheet XML, 0 when there is none
+def _last_column_a_row(data):
+    pos = len(data)
+    while True:
+        pos = data.rfind(COLUMN_A_REF, 0, pos)
+        if pos < 0:
+            return 0
+        end = data.find(b">", pos)
+        match = ROW_DIGITS.match(data, pos + len(COLUMN_A_REF))
+        if match is not None and end > 0 and data[end - 1:end] != b"/":
+            return int(match.group(1))
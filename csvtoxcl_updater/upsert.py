@@ -0,0 +1,48 @@
+# Replace-by-date for corrected exports
+#
+# The ERP delivers corrections as a new CSV covering the same dates. Instead of
+# skipping those dates, the master rows of every date in the CSV are replaced.
+# The date index knows which sheet rows each date occupies (date -> row
+# ranges), so the sheet patch (sheetpatch.patch_replace, or the streaming
+# writer as its fallback) only has to drop those blocks and write the
+# corrected rows in their place; the rest of the sheet is copied unchanged and
+# nothing is reloaded through pandas.
+
+import pandas as pd
+
+from csvtoxcl_updater.dates import date_only
+from csvtoxcl_updater.writer import bulk_rows
+
+
+# When several CSVs cover the same date, the later one in the list wins
+def latest_per_date(frames):
+    claimed = set()
+    kept = []
+    for frame in reversed(frames):
+        days = date_only(frame['Date'])
+        kept.append(frame.loc[~days.isin(claimed)])
+        claimed |= set(days.dropna())
+    return [f for f in reversed(kept) if len(f)]
+
+
+# Split the new rows into replacements for dates already in the master and
+# rows to append. Returns (replace_ranges, rows_to_append, replaced_dates, removed_rows)
+def plan_replacements(index, new_data):
+    days = date_only(new_data['Date'])
+    replace_ranges, replaced_dates, appended = [], [], []
+    removed_rows = 0
+
+    for day, group in new_data.groupby(days, sort=True):
+        ranges = sorted(index["date_rows"].get(day, []))
+        if not ranges:
+            appended.append(group)
+            continue
+
+        replaced_dates.append(day)
+        removed_rows += sum(end - start + 1 for start, end in ranges)
+        first, rest = ranges[0], ranges[1:]
+        replace_ranges.append((first[0], first[1], list(bulk_rows(group))))
+        replace_ranges.extend((start, end, []) for start, end in rest)
+
+    to_append = pd.concat(appended) if appended else new_data.iloc[0:0]
+    return replace_ranges, to_append, replaced_dates, removed_rows
@@ -0,0 +1,194 @@
+# Watch-folder daemon
+#
+# Every import used to be a fresh interpreter: imports, banner, two dialogs,
+# a full read of the date index. In watch mode one long-running process polls
+# the drop folder (e.g. "03_Daily Files") and keeps what it knows about the
+# master in memory between files: the header, the date index with the append
+# position (see index.py), the column schema and a started worker pool. A new
+# CSV is imported a few seconds after it lands.
+#
+# A file counts as arrived once its size and modification time have not
+# changed for settle seconds, so half-copied files are left alone (and a slow
+# copy does not hold back the files that are complete). Files that settled by
+# the same poll, e.g. those that landed while a write was running, are
+# imported as one batch (one patch/save of the master), like the batch command.
+#
+# The cached index is checked against the workbook before every batch (size
+# and mtime, see fingerprint_matches) and reloaded when the master was edited
+# in the meantime. An unfinished import in the journal is only settled, and
+# the index only rebuilt, under the lock of the master: at startup the watch
+# just reads the sidecars, another updater may be writing the master. Stop
+# with Ctrl+C.
+
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from csvtoxcl_updater.batch import find_csv_files, update_target, drain_queue
+from csvtoxcl_updater.common import say
+from csvtoxcl_updater.index import get_index, load_index, fingerprint_matches
+from csvtoxcl_updater.ingest import ingest_many
+from csvtoxcl_updater.instrument import Instrument
+from csvtoxcl_updater.journal import recover_import
+from csvtoxcl_updater.lock import lock_or_queue
+from csvtoxcl_updater.schema import load_schema
+
+POLL_SECONDS = 2.0
+SETTLE_SECONDS = 3.0
+
+
+def _signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+# CSV files of the folder with their (size, mtime)
+def _snapshot(folder):
+    files = {}
+    for path in find_csv_files(folder):
+        signature = _signature(path)
+        if signature is not None:
+            files[path] = signature
+    return files
+
+
+# Tracks new and changed files until they have settled
+class _Arrivals:
+    def __init__(self, settle):
+        self.settle = settle
+        self.done = {}
+        self.pending = {}
+
+    def skip_existing(self, files):
+        self.done.update(files)
+
+    def update(self, files, now):
+        for path, signature in files.items():
+            if self.done.get(path) == signature:
+                continue
+            seen = self.pending.get(path)
+            if seen is None or seen[0] != signature:
+                self.pending[path] = (signature, now)
+        for path in list(self.pending):
+            if path not in files:
+                del self.pending[path]
+
+    # Pending files that have not changed for settle seconds; files still
+    # being copied stay pending and don't hold the others back
+    def ready(self, now):
+        return sorted(path for path, (_, since) in self.pending.items() if now - since >= self.settle)
+
+    def finish(self, paths):
+        for path in paths:
+            self.done[path] = self.pending.pop(path)[0]
+
+    def retry(self, paths, now):
+        for path in paths:
+            self.pending[path] = (self.pending[path][0], now)
+
+
+class _HotMaster:
+    def __init__(self, excel_path):
+        self.excel_path = excel_path
+        self.index = None
+        self.schema = None
+
+    # The index and schema from the sidecars, without the lock: nothing is
+    # recovered or rebuilt here, the first batch does that
+    def preload(self):
+        self.index = load_index(self.excel_path)
+        self.schema = load_schema(self.excel_path)
+
+    # The cached index, reloaded when the workbook changed outside this process
+    # or a journal was settled; call it with the lock held
+    def get(self):
+        recovered = recover_import(self.excel_path)
+        if recovered or self.index is None or not fingerprint_matches(self.excel_path, self.index["fingerprint"]):
+            self.index = get_index(self.excel_path)
+            self.schema = load_schema(self.excel_path)
+        return self.index
+
+
+# Import paths under the lock of the master (queued for the holder when
+# another updater has it, see lock.py)
+def _import_batch(paths, master, pool, dedup, key, inline, allow_rewrite):
+    start_time = time.time()    #Tracking process time
+    lock = lock_or_queue(master.excel_path, paths, dedup, key, inline)
+    if lock is None:
+        return 0
+    instrument = Instrument("watch")
+    try:
+        with lock:
+            with instrument.stage("index") as stage:
+                index = master.get()
+                stage["rows"] = index["row_count"]
+            paths = list(paths) + lock.take_pending(dedup, key, inline)
+            with instrument.stage("ingest", files=len(paths)) as stage:
+                results = ingest_many(paths, index["header"], schema=master.schema, pool=pool)
+                stage["rows"] = sum(len(r["arrays"][0]) if r["arrays"] else 0 for r in results)
+            added_rows = update_target(results, master.excel_path, index, dedup, key, instrument, start_time, inline,
+                                       allow_rewrite)
+            lock.done()
+    except BaseException:
+        # The cached index may be half updated, read it again next time
+        master.index = None
+        instrument.finish("error", source=paths, excel=master.excel_path, dedup=dedup)
+        raise
+    instrument.finish(source=paths, excel=master.excel_path, dedup=dedup, added_rows=added_rows)
+    drain_queue(master.excel_path, allow_rewrite=allow_rewrite)
+    return added_rows
+
+
+# Watch folder and import every CSV that arrives into excel_path until interrupted.
+# Files already in the folder are only imported with catch_up=True; once=True
+# stops after the first poll that finds nothing to do (for scheduled runs).
+def run_watch(folder, excel_path, dedup="date", key=None, workers=None, inline=None,
+              poll=POLL_SECONDS, settle=SETTLE_SECONDS, catch_up=False, once=False, allow_rewrite=False):
+    if not os.path.isdir(folder):
+        raise ValueError(f"❌ Folder not found: {folder}\n❌ Ordner nicht gefunden: {folder}")
+
+    master = _HotMaster(excel_path)
+    master.preload()
+    arrivals = _Arrivals(settle)
+    if not catch_up:
+        arrivals.skip_existing(_snapshot(folder))
+
+    say(f"\U0001F440 Watching {folder} for new CSV files (Ctrl+C to stop)...",
+        f"\U0001F440 Überwache {folder} auf neue CSV-Dateien (Strg+C zum Beenden)...\n")
+    imported = 0
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        try:
+            while True:
+                now = time.monotonic()
+                arrivals.update(_snapshot(folder), now)
+                paths = arrivals.ready(now)
+                if not paths:
+                    if once and not arrivals.pending:
+                        break
+                    time.sleep(poll)
+                    continue
+
+                say(f"\n\U0001F4E8 {len(paths)} new CSV files: {', '.join(os.path.basename(p) for p in paths)}",
+                    f"\U0001F4E8 {len(paths)} neue CSV-Dateien: {', '.join(os.path.basename(p) for p in paths)}")
+                try:
+                    imported += _import_batch(paths, master, pool, dedup, key, inline, allow_rewrite)
+                except OSError:
+                    # Typically the master is open in Excel: keep the files and try again
+                    traceback.print_exc()
+                    say("⚠️ The Excel file could not be written, trying again shortly.",
+                        "⚠️ Die Excel-Datei konnte nicht geschrieben werden, neuer Versuch in Kürze.\n")
+                    arrivals.retry(paths, time.monotonic())
+                    time.sleep(poll)
+                    continue
+                except Exception:
+                    traceback.print_exc()
+                    say("❌ Import failed, the files are skipped until they change.",
+                        "❌ Import fehlgeschlagen, die Dateien werden übersprungen, bis sie sich ändern.\n")
+                arrivals.finish(paths)
+        except KeyboardInterrupt:
+            say("\n\U0001F6D1 Watch stopped.", "\U0001F6D1 Überwachung beendet.")
+    return imported
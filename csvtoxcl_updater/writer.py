@@ -0,0 +1,64 @@
+# Vectorised bulk row writer
+#
+# Replaces the per-cell iterrows() loop of v1.4.7. The Date column is turned
+# into Excel serials in one step, rows are built straight from the column
+# arrays of the DataFrame and handed to the sheet in batches.
+
+import pandas as pd
+
+from csvtoxcl_updater.dates import parse_dates, to_excel_serials
+
+BATCH_SIZE = 10000
+
+
+# Convert a whole Date column to Excel serial numbers in one vectorised step
+# (already parsed datetime columns are used as they are, values that don't
+# parse as a date are kept unchanged)
+def excel_serials(values):
+    values = pd.Series(values)
+    parsed = parse_dates(values)
+    return to_excel_serials(parsed).astype(object).where(parsed.notna(), values.astype(object))
+
+
+# Column arrays as plain python objects, with NaN/NaT turned into empty cells
+def _column_arrays(df, date_column):
+    arrays = []
+    for name in df.columns:
+        column = df[name]
+        if name == date_column:
+            column = excel_serials(column)
+        values = column.to_numpy(dtype=object, copy=True)
+        values[pd.isna(values)] = None
+        arrays.append(values)
+    return arrays
+
+
+# Yield the rows of the DataFrame as lists of value tuples, batch_size rows at a time
+def iter_row_batches(df, date_column='Date', batch_size=BATCH_SIZE):
+    if date_column not in df.columns:
+        date_column = None
+    for start in range(0, len(df), batch_size):
+        arrays = _column_arrays(df.iloc[start:start + batch_size], date_column)
+        yield list(zip(*arrays))
+
+
+# Same rows as iter_row_batches, one tuple at a time
+def bulk_rows(df, date_column='Date', batch_size=BATCH_SIZE):
+    for batch in iter_row_batches(df, date_column, batch_size):
+        yield from batch
+
+
+# Write the DataFrame into a normal (not read-only) openpyxl sheet starting at start_row
+def append_dataframe(sheet, df, start_row, date_column='Date', batch_size=BATCH_SIZE):
+    date_pos = list(df.columns).index(date_column) if date_column in df.columns else None
+    row_number = start_row
+    for batch in iter_row_batches(df, date_column, batch_size):
+        for row in batch:
+            for col_idx, value in enumerate(row):
+                if value is None:
+                    continue
+                cell = sheet.cell(row=row_number, column=col_idx + 1, value=value)
+                if col_idx == date_pos and isinstance(value, float):
+                    cell.number_format = '0'
+            row_number += 1
+    return row_number - start_row
@@ -0,0 +1,76 @@
+# Shared fixtures: a small styled master (bold header, wide column B, a
+# second sheet), the rows of a daily import and CSV exports of them
+
+import csv
+import os
+import sys
+from datetime import datetime
+
+import pytest
+from openpyxl import Workbook, load_workbook
+from openpyxl.styles import Font
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+HEADER = ["Date", "Customer", "Amount"]
+
+
+def make_master(path, days=4, rows_per_day=5, below=None):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Data"
+    ws.append(HEADER)
+    for cell in ws[1]:
+        cell.font = Font(bold=True)
+    ws.column_dimensions["B"].width = 40
+    for day in range(days):
+        for i in range(rows_per_day):
+            ws.append([datetime(2025, 1, 1 + day), f"cust{i}", day * 10 + i])
+    if below is not None:
+        ws.cell(row=ws.max_row + 3, column=3, value=below)
+    wb.create_sheet("Notes").append(["hello"])
+    wb.save(path)
+    return str(path)
+
+
+# Values of the data sheet, without the trailing empty rows
+def sheet_values(path, sheet="Data"):
+    wb = load_workbook(path, read_only=True)
+    try:
+        rows = [tuple(row) for row in wb[sheet].iter_rows(values_only=True)]
+    finally:
+        wb.close()
+    while rows and all(v is None for v in rows[-1]):
+        rows.pop()
+    return rows
+
+
+def new_rows(day=10, count=3):
+    return [(datetime(2025, 1, day), f"new{i}", 100 + i) for i in range(count)]
+
+
+# CSV export of rows as the ERP writes it: header, repeated header, rows, totals line
+def write_csv(path, rows, date_format="%m/%d/%Y"):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        writer.writerow(HEADER)
+        for row in rows:
+            writer.writerow([row[0].strftime(date_format)] + list(row[1:]))
+        writer.writerow(["Total", "", sum(row[2] for row in rows)])
+    return str(path)
+
+
+# import_log.txt and import_metrics.jsonl go to the test folder instead of the package
+@pytest.fixture(autouse=True)
+def logs(tmp_path, monkeypatch):
+    from csvtoxcl_updater import common, instrument
+    monkeypatch.setattr(common.write_log, "__defaults__", (str(tmp_path / "import_log.txt"),))
+    monkeypatch.setattr(instrument.Instrument.__init__, "__defaults__",
+                        (str(tmp_path / "import_metrics.jsonl"), None, None))
+    return tmp_path
+
+
+@pytest.fixture
+def master(tmp_path):
+    return make_master(tmp_path / "master.xlsx")
@@ -0,0 +1,88 @@
+import pandas as pd
+import pytest
+
+from conftest import HEADER
+from csvtoxcl_updater.common import read_csv_checked
+from csvtoxcl_updater.csvscan import read_csv_range, scan_csv
+
+
+def write(tmp_path, text, name="daily.csv"):
+    path = tmp_path / name
+    path.write_bytes(text.encode("utf-8"))
+    return str(path)
+
+
+EXPORT = ("Date,Customer,Amount\n"
+          "Date,Customer,Amount\n"
+          "01/10/2025,cust0,1\n"
+          "01/10/2025,cust1,2\n"
+          "Total,,3\n")
+
+
+def test_repeated_header_and_totals_are_left_out(tmp_path):
+    path = write(tmp_path, EXPORT)
+    layout = scan_csv(path, HEADER)
+    assert layout.headers == HEADER
+    assert layout.header_match
+    assert layout.totals == b"Total,,3"
+    data = read_csv_range(path, layout, dtype=str)
+    assert data.values.tolist() == [["01/10/2025", "cust0", "1"], ["01/10/2025", "cust1", "2"]]
+
+
+# BOM, Windows line ends and blank lines around the rows
+def test_bom_crlf_and_blank_lines(tmp_path):
+    path = write(tmp_path, "\ufeff" + EXPORT.replace("\n", "\r\n").replace("Total", "\r\nTotal") + "\r\n\r\n")
+    layout = scan_csv(path, HEADER)
+    assert layout.headers == HEADER
+    assert layout.totals == b"Total,,3"
+    assert len(read_csv_range(path, layout, dtype=str).dropna(how="all")) == 2
+
+
+# Another header than the master's: the first line is data, not a repeated header
+def test_header_mismatch_keeps_the_first_row(tmp_path):
+    path = write(tmp_path, "Date,Kunde,Betrag\n01/10/2025,cust0,1\nTotal,,1\n")
+    csv_data, headers, header_match = read_csv_checked(path, HEADER)
+    assert not header_match
+    assert headers == ["Date", "Kunde", "Betrag"]
+    assert csv_data["Kunde"].tolist() == ["cust0"]
+
+
+# A quoted line break in the totals line can't be found without parsing: the
+# file is read the old way, with the same result
+def test_quoted_line_break_in_the_totals_line(tmp_path):
+    path = write(tmp_path, EXPORT.replace("Total,,3", '"Total\nall",,3'))
+    assert scan_csv(path, HEADER) is None
+    csv_data, _, header_match = read_csv_checked(path, HEADER)
+    assert header_match
+    assert csv_data["Customer"].tolist() == ["cust0", "cust1"]
+
+
+# Inside the data rows a quoted line break is fine
+def test_quoted_line_break_in_a_row(tmp_path):
+    path = write(tmp_path, EXPORT.replace("cust1", '"cust\n1"'))
+    layout = scan_csv(path, HEADER)
+    assert layout is not None
+    assert read_csv_range(path, layout, dtype=str)["Customer"].tolist() == ["cust0", "cust\n1"]
+
+
+def test_file_without_date_column_fails_before_parsing(tmp_path):
+    path = write(tmp_path, "Day,Customer,Amount\n01/10/2025,cust0,1\nTotal,,1\n")
+    with pytest.raises(ValueError, match="'Date'"):
+        read_csv_checked(path, HEADER)
+
+
+def test_empty_file_and_header_only(tmp_path):
+    assert scan_csv(write(tmp_path, "", "empty.csv"), HEADER) is None
+    path = write(tmp_path, "Date,Customer,Amount\n", "header.csv")
+    layout = scan_csv(path, HEADER)
+    assert layout.start == layout.end
+    assert read_csv_range(path, layout).empty
+
+
+def test_chunks(tmp_path):
+    rows = "".join(f"01/10/2025,cust{i},{i}\n" for i in range(10))
+    path = write(tmp_path, "Date,Customer,Amount\nDate,Customer,Amount\n" + rows + "Total,,45\n")
+    layout = scan_csv(path, HEADER)
+    chunks = list(read_csv_range(path, layout, chunksize=4, dtype=str))
+    assert [len(c) for c in chunks] == [4, 4, 2]
+    assert pd.concat(chunks)["Customer"].tolist() == [f"cust{i}" for i in range(10)]
@@ -0,0 +1,52 @@
+from datetime import date, datetime
+
+import pandas as pd
+import pytest
+
+from conftest import HEADER, write_csv
+from csvtoxcl_updater.common import filter_new_dates, read_csv_checked
+from csvtoxcl_updater.dates import SERIAL, date_only, date_row_ranges, detect_format, parse_dates
+
+
+@pytest.mark.parametrize("values, fmt", [
+    (["04/30/2025", "05/01/2025"], "%m/%d/%Y"),
+    (["30.04.2025", "01.05.2025"], "%d.%m.%Y"),
+    (["2025-04-30", "2025-05-01"], "%Y-%m-%d"),
+    (["2025-04-30 00:00:00", "2025-05-01 00:00:00"], "%Y-%m-%d %H:%M:%S"),
+    (["45777", "45778"], SERIAL),
+])
+def test_detect_format(values, fmt):
+    assert detect_format(values) == fmt
+    assert list(date_only(parse_dates(values))) == [date(2025, 4, 30), date(2025, 5, 1)]
+
+
+# The dominant format parses the column, the odd value goes through the slow path
+def test_rows_in_another_format_fall_back():
+    values = ["04/30/2025"] * 10 + ["2025-05-01", 45779, "Total", None]
+    parsed = date_only(parse_dates(pd.Series(values, dtype=object)))
+    assert list(parsed[:10]) == [date(2025, 4, 30)] * 10
+    assert list(parsed[10:]) == [date(2025, 5, 1), date(2025, 5, 2), None, None]
+
+
+def test_numbers_are_excel_serials():
+    assert list(date_only(parse_dates(pd.Series([45777.0, 45777.75])))) == [date(2025, 4, 30)] * 2
+
+
+def test_date_row_ranges_split_by_date_and_gap():
+    rows = [2, 3, 4, 5, 7, 8]
+    values = ["04/30/2025", "04/30/2025", "05/01/2025", "04/30/2025", "04/30/2025", None]
+    assert date_row_ranges(rows, values) == {date(2025, 4, 30): [[2, 3], [5, 5], [7, 7]],
+                                             date(2025, 5, 1): [[4, 4]]}
+
+
+# German dates in the CSV dedup against the master dates like the US ones
+def test_german_csv_against_the_master_dates(tmp_path):
+    rows = [(datetime(2025, 1, day), "cust", 1) for day in (3, 4, 5)]
+    csv_path = write_csv(tmp_path / "daily.csv", rows, date_format="%d.%m.%Y")
+    csv_data, _, header_match = read_csv_checked(csv_path, HEADER)
+    assert header_match
+
+    new_data, skipped, new_dates = filter_new_dates(csv_data, {date(2025, 1, d) for d in range(1, 5)})
+    assert skipped == ["2025-01-03", "2025-01-04"]
+    assert new_dates == {date(2025, 1, 5)}
+    assert list(new_data["Date"]) == [pd.Timestamp(2025, 1, 5)]
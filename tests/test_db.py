@@ -0,0 +1,66 @@
+import os
+from datetime import datetime
+
+import pytest
+
+from conftest import HEADER, new_rows, sheet_values, write_csv
+from csvtoxcl_updater.batch import run_db_batch
+from csvtoxcl_updater.db import db_path, export_excel, init_db, list_loads, open_db
+
+
+@pytest.fixture
+def db(master):
+    init_db(master, key="Date,Customer")
+    conn, _, _ = open_db(db_path(master))
+    yield conn
+    conn.close()
+
+
+def stored(conn, where="1 = 1"):
+    return [row for row in conn.execute(f"SELECT Date, Customer, Amount FROM sales WHERE {where} ORDER BY _id")]
+
+
+def test_init_from_the_master(master, db):
+    _, header, key_columns = open_db(db_path(master))
+    assert header == HEADER
+    assert key_columns == ["Date", "Customer"]
+    assert len(stored(db)) == 20
+    assert stored(db)[0] == ("2025-01-01 00:00:00", "cust0", 0)
+    with pytest.raises(ValueError, match="already exists"):
+        init_db(master)
+
+
+def test_open_without_database(tmp_path):
+    with pytest.raises(ValueError, match="db init"):
+        open_db(str(tmp_path / "missing.sqlite"))
+
+
+@pytest.mark.parametrize("dedup, added, total", [("date", 3, 23), ("row", 4, 24)])
+def test_dedup(tmp_path, master, db, dedup, added, total):
+    rows = [(datetime(2025, 1, 1), "cust0", 0), (datetime(2025, 1, 1), "cust9", 9)] + new_rows(day=10)
+    csv_path = write_csv(tmp_path / "daily.csv", rows)
+
+    assert run_db_batch(csv_path, master, workers=1, dedup=dedup) == added
+    assert len(stored(db)) == total
+    assert run_db_batch(csv_path, master, workers=1, dedup=dedup) == 0
+
+
+def test_replace_and_loads(tmp_path, master, db):
+    rows = [(datetime(2025, 1, 2), "fixed", 1)]
+    assert run_db_batch(write_csv(tmp_path / "fixed.csv", rows), master, workers=1, dedup="replace") == 1
+    assert [row[:2] for row in stored(db, "_date = '2025-01-02'")] == [("2025-01-02 00:00:00", "fixed")]
+    assert len(stored(db)) == 16
+
+    latest, first = list_loads(db)
+    assert (latest["source"], latest["mode"], latest["rows"], latest["removed_rows"]) == ("fixed.csv", "replace", 1, 5)
+    assert (latest["first_date"], latest["last_date"]) == ("2025-01-02", "2025-01-02")
+    assert (first["source"], first["mode"], first["rows"]) == (os.path.basename(master), "init", 20)
+
+
+def test_export_regenerates_the_master(tmp_path, master, db):
+    run_db_batch(write_csv(tmp_path / "daily.csv", new_rows()), master, workers=1)
+    export_excel(db, HEADER, master, allow_rewrite=True)
+    values = sheet_values(master)
+    assert len(values) == 1 + 23
+    assert values[1] == (45658, "cust0", 0)  # dates as serials with number format '0', like v1.4.7
+    assert [row[1] for row in values[-3:]] == ["new0", "new1", "new2"]
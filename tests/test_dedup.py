@@ -0,0 +1,45 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import HEADER, new_rows, sheet_values, write_csv
+from csvtoxcl_updater.batch import run_batch
+from csvtoxcl_updater.dedup import build_hashes, hashes_path, load_row_hashes, resolve_key, row_hashes
+from csvtoxcl_updater.index import build_index, load_index
+
+
+# The master has dates and numbers, the CSV text: normalised they hash the same
+def test_master_and_csv_values_hash_the_same():
+    master = pd.DataFrame({"Date": [datetime(2025, 1, 1)], "Customer": ["cust0"], "Amount": [5]})
+    csv = pd.DataFrame({"Date": ["01/01/2025"], "Customer": [" cust0 "], "Amount": ["5.0"]})
+    assert (row_hashes(master, HEADER) == row_hashes(csv, HEADER)).all()
+    assert row_hashes(csv, ["Date", "Customer"]) != row_hashes(csv.assign(Customer="cust1"), ["Date", "Customer"])
+
+
+def test_resolve_key():
+    assert resolve_key(None, HEADER + [None]) == HEADER
+    assert resolve_key("Date, Customer", HEADER) == ["Date", "Customer"]
+    with pytest.raises(ValueError, match="Product"):
+        resolve_key("Date,Product", HEADER)
+
+
+# Only rows that are not in the master yet are added, also on dates it already has
+def test_batch_adds_new_rows_only(tmp_path, master):
+    rows = [(datetime(2025, 1, 1), "cust0", 0), (datetime(2025, 1, 1), "cust9", 9)] + new_rows(day=10, count=2)
+    csv_path = write_csv(tmp_path / "daily.csv", rows)
+
+    assert run_batch(csv_path, master, workers=1, dedup="row", key="Date,Customer") == 3
+    assert [(row[0], row[1]) for row in sheet_values(master)[-3:]] == [(r[0], r[1]) for r in rows[1:]]
+
+    index = load_index(master)
+    assert index["hash_key"] == ["Date", "Customer"]
+    assert index["row_count"] == build_index(master)["row_count"] == 23
+    hashes = load_row_hashes(master, index, ["Date", "Customer"])
+    assert np.array_equal(hashes, build_hashes(master, ["Date", "Customer"]))
+    assert load_row_hashes(master, index, HEADER) is None  # stored for another key
+
+    assert run_batch(csv_path, master, workers=1, dedup="row", key="Date,Customer") == 0
+    assert len(np.load(hashes_path(master))) == 23
+
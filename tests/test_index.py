@@ -0,0 +1,40 @@
+import os
+from datetime import date
+
+from openpyxl import load_workbook
+
+from conftest import HEADER
+from csvtoxcl_updater.index import content_hash, file_fingerprint, fingerprint_matches, get_index, load_index
+
+
+def test_index_of_the_master(master):
+    index = get_index(master)
+    assert index["header"] == HEADER
+    assert index["date_rows"][date(2025, 1, 1)] == [[2, 6]]
+    assert index["row_count"] == 20
+    assert index["last_data_row"] == 21
+    assert load_index(master)["date_rows"] == index["date_rows"]
+
+
+# A copy or sync that only touches the file keeps the index
+def test_touched_master_keeps_its_index(master):
+    get_index(master)
+    stat = os.stat(master)
+    os.utime(master, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert load_index(master) is not None
+
+
+def test_edited_master_drops_its_index(master):
+    get_index(master)
+    wb = load_workbook(master)
+    wb["Data"]["B2"] = "edited"
+    wb.save(master)
+    assert load_index(master) is None
+
+
+def test_content_hash_of_a_file_that_is_not_a_zip(tmp_path):
+    first, second = tmp_path / "a.xlsx", tmp_path / "b.xlsx"
+    first.write_bytes(b"not a workbook")
+    second.write_bytes(b"not a workbook either")
+    assert content_hash(str(first)) != content_hash(str(second))
+    assert fingerprint_matches(str(first), dict(file_fingerprint(str(first)), mtime_ns=0))
@@ -0,0 +1,112 @@
+import os
+import shutil
+
+import pytest
+
+from conftest import HEADER, make_master, new_rows, sheet_values
+from csvtoxcl_updater import journal as journal_module
+from csvtoxcl_updater.index import build_index, get_index, load_index, record_append
+from csvtoxcl_updater.journal import begin_journal, journal_path, recover_import
+from csvtoxcl_updater.sheetpatch import patch_append
+
+
+class Interrupted(Exception):
+    pass
+
+
+@pytest.fixture(autouse=True)
+def log(monkeypatch):
+    lines = []
+    monkeypatch.setattr(journal_module, "write_log", lines.append)
+    return lines
+
+
+def start_import(excel_path, rows, allow_rewrite=False):
+    index = get_index(excel_path)
+    journal = begin_journal(excel_path, index, rows, dedup="date", column_count=len(HEADER), date_column=0,
+                            inline_columns=[], allow_rewrite=allow_rewrite)
+    return index, journal
+
+
+# The import as __main__._run_import does it, cut off at the swap of the temp file
+def interrupted_import(monkeypatch, excel_path, rows):
+    index, journal = start_import(excel_path, rows)
+    replace = os.replace
+
+    def cut_off(src, dst):
+        if src.endswith(".xlsx.tmp"):
+            raise Interrupted
+        return replace(src, dst)
+
+    with monkeypatch.context() as patched:
+        patched.setattr(os, "replace", cut_off)
+        with pytest.raises(Interrupted):
+            with journal:
+                patch_append(excel_path, index, iter(rows), len(rows), len(HEADER), date_column=0, journal=journal)
+
+
+def test_replay_after_interrupted_commit(tmp_path, monkeypatch, log):
+    master = make_master(tmp_path / "master.xlsx")
+    reference = str(tmp_path / "reference.xlsx")
+    shutil.copy(master, reference)
+    rows = new_rows()
+    index = get_index(reference)
+    record_append(reference, index, patch_append(reference, index, iter(rows), len(rows), len(HEADER),
+                                                 date_column=0))
+
+    interrupted_import(monkeypatch, master, rows)
+    assert os.path.exists(journal_path(master))
+    assert os.path.exists(master + ".tmp")
+
+    assert recover_import(master) == "replayed"
+    assert not os.path.exists(journal_path(master))
+    assert not os.path.exists(master + ".tmp")
+    assert sheet_values(master) == sheet_values(reference)
+    assert load_index(master)["date_rows"] == build_index(master)["date_rows"]
+    assert len(log) == 1
+
+
+# The swap went through but the index was not updated
+def test_finished_after_commit(tmp_path):
+    master = make_master(tmp_path / "master.xlsx")
+    rows = new_rows()
+    index, journal = start_import(master, rows)
+    with pytest.raises(Interrupted):
+        with journal:
+            patch_append(master, index, iter(rows), len(rows), len(HEADER), date_column=0, journal=journal)
+            raise Interrupted
+
+    assert recover_import(master) == "finished"
+    assert not os.path.exists(journal_path(master))
+    assert sheet_values(master)[-3:] == rows
+
+
+def test_rollback_of_cut_off_journal(tmp_path):
+    master = make_master(tmp_path / "master.xlsx")
+    before = open(master, "rb").read()
+    start_import(master, new_rows())
+    path = journal_path(master)
+    with open(path, encoding="utf-8") as f:
+        lines = f.readlines()
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(lines[:-1])  # no end line
+
+    assert recover_import(master) == "rolled back"
+    assert not os.path.exists(path)
+    assert open(master, "rb").read() == before
+
+
+# The replay would have to rewrite a styled master the import was not allowed to rewrite
+@pytest.mark.parametrize("allow_rewrite, result", [(False, "rolled back"), (True, "replayed")])
+def test_replay_that_needs_a_rewrite(tmp_path, allow_rewrite, result):
+    master = make_master(tmp_path / "master.xlsx", below="checked")
+    before = open(master, "rb").read()
+    rows = new_rows()
+    start_import(master, rows, allow_rewrite=allow_rewrite)
+
+    assert recover_import(master) == result
+    assert not os.path.exists(journal_path(master))
+    if allow_rewrite:
+        assert sheet_values(master)[-3:] == rows
+    else:
+        assert open(master, "rb").read() == before
@@ -0,0 +1,69 @@
+import json
+import os
+import time
+
+from csvtoxcl_updater import lock as lock_module
+from csvtoxcl_updater.lock import STALE_SECONDS, lock_owner, lock_path, try_lock
+
+
+def stale_lock(excel_path):
+    path = lock_path(excel_path)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"user": "x", "host": "elsewhere", "pid": 1, "since": "then", "token": "old"}, f)
+    old = time.time() - STALE_SECONDS - 5
+    os.utime(path, (old, old))
+
+
+def leftovers(tmp_path):
+    return [name for name in os.listdir(tmp_path) if ".stale-" in name]
+
+
+def test_live_lock_is_kept(tmp_path):
+    excel_path = str(tmp_path / "master.xlsx")
+    lock = try_lock(excel_path)
+    try:
+        assert try_lock(excel_path) is None
+        assert lock_owner(excel_path)["token"] == lock.owner["token"]
+    finally:
+        lock.release()
+    assert lock_owner(excel_path) is None
+
+
+def test_stale_lock_is_broken(tmp_path):
+    excel_path = str(tmp_path / "master.xlsx")
+    stale_lock(excel_path)
+    lock = try_lock(excel_path)
+    try:
+        assert lock is not None
+        assert lock_owner(excel_path)["token"] == lock.owner["token"]
+        assert leftovers(tmp_path) == []
+    finally:
+        lock.release()
+
+
+# Two updaters find the same stale lock: the other one breaks it and takes the
+# lock while this one is moving it aside. Only one of them may hold the lock.
+def test_stale_lock_broken_by_two_updaters(tmp_path, monkeypatch):
+    excel_path = str(tmp_path / "master.xlsx")
+    stale_lock(excel_path)
+    replace = os.replace
+    other = []
+
+    def interleaved(src, dst):
+        if ".stale-" in dst and not other:
+            other.append(None)
+            other[0] = try_lock(excel_path)
+        return replace(src, dst)
+
+    monkeypatch.setattr(lock_module.os, "replace", interleaved)
+    this = try_lock(excel_path)
+    monkeypatch.undo()
+
+    try:
+        assert other[0] is not None
+        assert this is None
+        assert lock_owner(excel_path)["token"] == other[0].owner["token"]
+        assert leftovers(tmp_path) == []
+    finally:
+        other[0].release()
+    assert lock_owner(excel_path) is None
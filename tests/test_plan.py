@@ -0,0 +1,64 @@
+import os
+from datetime import datetime
+
+from openpyxl import load_workbook
+
+from conftest import new_rows, write_csv
+from csvtoxcl_updater.batch import run_batch
+from csvtoxcl_updater.index import get_index, index_path
+from csvtoxcl_updater.plan import run_plan
+
+
+def sidecars(tmp_path):
+    return sorted(name for name in os.listdir(tmp_path) if name.startswith("master.xlsx"))
+
+
+def test_plan_writes_nothing(tmp_path, master, capsys):
+    get_index(master)
+    before = open(master, "rb").read(), open(index_path(master), "rb").read()
+    rows = [(datetime(2025, 1, 1), "cust0", 0)] + new_rows(day=10)
+    csv_path = write_csv(tmp_path / "daily.csv", rows)
+
+    assert run_plan(csv_path, master) == 3
+    out = capsys.readouterr().out
+    assert "2025-01-01" in out  # skipped date
+    assert "rows 22–24" in out
+    assert (open(master, "rb").read(), open(index_path(master), "rb").read()) == before
+    assert not os.path.exists(tmp_path / "import_log.txt")
+
+
+def test_plan_of_a_replace(tmp_path, master, capsys):
+    get_index(master)
+    rows = [(datetime(2025, 1, 2), "fixed", 1)] + new_rows(day=10)
+    assert run_plan(write_csv(tmp_path / "daily.csv", rows), master, dedup="replace") == 4
+    assert "(5 rows removed): 2025-01-02" in capsys.readouterr().out
+
+
+# Without a usable index the plan asks for an import and creates no sidecars
+def test_plan_without_index(tmp_path, master, capsys):
+    csv_path = write_csv(tmp_path / "daily.csv", new_rows())
+    assert run_plan(csv_path, master) is None
+    assert "run an import" in capsys.readouterr().out
+    assert sidecars(tmp_path) == ["master.xlsx"]
+
+
+def test_plan_with_stale_index(tmp_path, master):
+    get_index(master)
+    before = open(index_path(master), "rb").read()
+    wb = load_workbook(master)
+    wb["Data"].append([datetime(2025, 1, 5), "edited", 1])
+    wb.save(master)
+
+    assert run_plan(write_csv(tmp_path / "daily.csv", new_rows()), master) is None
+    assert open(index_path(master), "rb").read() == before
+
+
+def test_plan_row_dedup_needs_the_hashes(tmp_path, master):
+    get_index(master)
+    rows = [(datetime(2025, 1, 1), "cust0", 0), (datetime(2025, 1, 1), "cust9", 9)]
+    csv_path = write_csv(tmp_path / "daily.csv", rows)
+    assert run_plan(csv_path, master, dedup="row") is None
+    assert sidecars(tmp_path) == ["master.xlsx", "master.xlsx.index.json"]
+
+    run_batch(write_csv(tmp_path / "other.csv", new_rows()), master, workers=1, dedup="row")
+    assert run_plan(csv_path, master, dedup="row") == 1
@@ -0,0 +1,55 @@
+import json
+import os
+from datetime import datetime
+
+import pytest
+from openpyxl import load_workbook
+
+from conftest import HEADER, make_master, new_rows, sheet_values, write_csv
+from csvtoxcl_updater.index import get_index, index_path
+from csvtoxcl_updater.lock import try_lock
+from csvtoxcl_updater.route import _route_header, load_routes, run_routes
+
+
+def test_routes_filter_rows_per_workbook(tmp_path):
+    make_master(tmp_path / "master.xlsx")
+    (tmp_path / "regions").mkdir()
+    make_master(tmp_path / "regions" / "north.xlsx")
+    config = tmp_path / "routes.json"
+    config.write_text(json.dumps({"targets": [
+        {"excel": "master.xlsx"},
+        {"excel": "regions/north.xlsx", "where": {"Customer": ["new1", "new2"]}},
+    ]}))
+    csv_path = write_csv(tmp_path / "daily.csv", new_rows(day=10))
+
+    summaries = run_routes(csv_path, str(config), workers=1)
+    assert [s["added_rows"] for s in summaries] == [3, 2]
+    assert [row[1] for row in sheet_values(str(tmp_path / "master.xlsx"))[-3:]] == ["new0", "new1", "new2"]
+    north = sheet_values(str(tmp_path / "regions" / "north.xlsx"))
+    assert len(north) == 1 + 20 + 2
+    assert [row[1] for row in north[-2:]] == ["new1", "new2"]
+
+
+def test_targets_need_a_workbook(tmp_path):
+    config = tmp_path / "routes.json"
+    config.write_text(json.dumps({"targets": [{"where": {"Region": "North"}}]}))
+    with pytest.raises(ValueError, match="'excel'"):
+        load_routes(str(config))
+
+
+# The header for parsing comes from the sidecar, even a stale one: the
+# workbook is neither scanned nor is its index saved without the lock
+def test_header_from_a_stale_sidecar(master):
+    get_index(master)
+    wb = load_workbook(master)
+    wb["Data"].append([datetime(2025, 1, 20), "edited", 1])
+    wb.save(master)
+    before = open(index_path(master), "rb").read()
+
+    lock = try_lock(master)  # another updater is writing the workbook
+    try:
+        assert _route_header({"excel": master, "sheet": None}) == HEADER
+    finally:
+        lock.release()
+    assert open(index_path(master), "rb").read() == before
+    assert not os.path.exists(master + ".journal")
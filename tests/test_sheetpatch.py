@@ -0,0 +1,116 @@
+import os
+import zipfile
+from datetime import datetime
+
+import pytest
+from openpyxl import load_workbook
+
+from conftest import HEADER, make_master, new_rows, sheet_values, write_csv
+from csvtoxcl_updater import sheetpatch
+from csvtoxcl_updater.__main__ import run_import
+from csvtoxcl_updater.index import build_index, get_index, load_index, record_append
+from csvtoxcl_updater.sheetpatch import patch_append, patch_replace
+from csvtoxcl_updater.streaming import LossyRewrite, save_rewrite, write_rewrite
+
+
+def same_index(path):
+    index, fresh = load_index(path), build_index(path)
+    return index is not None and all(index[k] == fresh[k] for k in ("date_rows", "row_count", "last_data_row"))
+
+
+def test_patch_append_keeps_styles(master):
+    before = sheet_values(master)
+    index = get_index(master)
+    rows = new_rows()
+
+    layout = patch_append(master, index, iter(rows), len(rows), len(HEADER), date_column=0)
+    assert layout is not None
+    assert layout["added_rows"] == 3
+    record_append(master, index, layout)
+
+    assert sheet_values(master) == before + rows
+    assert sheet_values(master, "Notes") == [("hello",)]
+    assert same_index(master)
+    wb = load_workbook(master)
+    assert wb["Data"]["A1"].font.bold
+    assert wb["Data"].column_dimensions["B"].width == 40
+    assert wb["Data"]["A22"].is_date
+
+
+# openpyxl saves without a shared strings table: the first patch creates it,
+# the next one reuses its strings, inline columns stay out of it
+def test_patch_append_shared_strings(master):
+    index = get_index(master)
+    day = datetime(2025, 1, 10)
+    appended = []
+    for rows, inline_columns, strings in (
+            ([(day, "cust1", 1), (day, "cust1", 2)], (), {"reused": 0, "added": 1, "total": 1, "inline": 0}),
+            ([(day, "cust1", 3), (day, "Order 7", 4)], (), {"reused": 1, "added": 1, "total": 2, "inline": 0}),
+            ([(day, "Order 8", 5)], [1], {"reused": 0, "added": 0, "total": 2, "inline": 1})):
+        layout = patch_append(master, index, iter(rows), len(rows), len(HEADER), date_column=0,
+                              inline_columns=inline_columns)
+        assert layout["strings"] == strings
+        record_append(master, index, layout)
+        appended += rows
+    assert sheet_values(master)[-len(appended):] == appended
+
+
+def test_patch_replace_renumbers_rows_below(master):
+    index = get_index(master)
+    day = datetime(2025, 1, 2)
+    (first, last), = index["date_rows"][day.date()]
+    block = [(day, "fixed", -1), (day, "fixed", -2)]
+    rows = new_rows()
+
+    layout = patch_replace(master, index, [(first, last, block)], iter(rows), len(rows), len(HEADER),
+                           date_column=0)
+    assert layout is not None
+    assert layout["removed_rows"] == 5
+    record_append(master, index, layout)
+
+    values = sheet_values(master)
+    assert [r for r in values if r[0] == day] == block
+    assert len(values) == 1 + 20 - 5 + 2 + 3
+    assert values[-3:] == rows
+    assert same_index(master)
+
+
+# A value below the data: the sheet can't be patched and the rewrite would
+# drop the styles, so it is refused unless it is allowed
+def test_unpatchable_styled_master_falls_back(tmp_path):
+    master = make_master(tmp_path / "master.xlsx", below="checked")
+    before = open(master, "rb").read()
+    index = get_index(master)
+    rows = new_rows()
+
+    assert patch_append(master, index, iter(rows), len(rows), len(HEADER), date_column=0) is None
+    assert open(master, "rb").read() == before
+    with pytest.raises(LossyRewrite):
+        write_rewrite(master, iter(rows), date_column=0)
+    assert open(master, "rb").read() == before
+
+    src, dst, layout = write_rewrite(master, iter(rows), date_column=0, allow_lossy=True)
+    save_rewrite(master, src, dst)
+    record_append(master, index, layout)
+    values = sheet_values(master)
+    assert values[-3:] == rows
+    assert "checked" in [v for row in values for v in row]
+    assert same_index(master)
+
+
+# The zip size limit is only hit once the new rows are written: the import
+# still falls back to the rewrite, with the rows read again
+def test_zip_limit_falls_back_after_the_rows_are_written(tmp_path, master, monkeypatch):
+    with zipfile.ZipFile(master) as archive:
+        largest = max(max(i.file_size, i.header_offset) for i in archive.infolist())
+    monkeypatch.setattr(sheetpatch, "ZIP_LIMIT", max(largest, os.path.getsize(master)) + 1)
+    rows = [(datetime(2025, 1, 10), f"customer {i}", i) for i in range(500)]
+    index = get_index(master)
+    assert patch_append(master, index, iter(rows), len(rows), len(HEADER), date_column=0) is None
+    assert not os.path.exists(master + ".tmp")
+
+    assert run_import(write_csv(tmp_path / "daily.csv", rows), master, allow_rewrite=True) == 500
+    values = sheet_values(master)
+    assert len(values) == 1 + 20 + 500
+    assert [row[1] for row in values[-500:]] == [row[1] for row in rows]
+    assert same_index(master)
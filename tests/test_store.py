@@ -0,0 +1,103 @@
+import os
+from datetime import date, datetime
+
+import pandas as pd
+import pytest
+
+from conftest import new_rows, sheet_values, write_csv
+from csvtoxcl_updater import store as store_module
+from csvtoxcl_updater.batch import run_store_batch
+from csvtoxcl_updater.lock import try_lock
+from csvtoxcl_updater.store import export_excel, init_store, load_store, lock_store, store_path
+
+pytest.importorskip("pyarrow")
+
+
+def part_files(store_dir):
+    return sorted(f"{folder}/{file}" for folder in os.listdir(store_dir) if folder.startswith("month=")
+                  for file in os.listdir(os.path.join(store_dir, folder)))
+
+
+def stored_rows(store_dir):
+    return len(pd.read_parquet(store_dir, engine="pyarrow"))
+
+
+@pytest.fixture
+def store(master):
+    store_dir = store_path(master)
+    init_store(master, store_dir)
+    return store_dir
+
+
+def test_init_from_the_master(master, store):
+    manifest = load_store(store)
+    assert manifest["row_count"] == stored_rows(store) == 20
+    assert manifest["types"] == {"Date": "date", "Customer": "text", "Amount": "number"}
+    assert manifest["dates"] == {f"2025-01-0{d}": 5 for d in range(1, 5)}
+    assert part_files(store) == ["month=2025-01/part-init-00000.parquet"]
+    with pytest.raises(ValueError, match="already exists"):
+        init_store(master, store)
+
+
+def test_append_skips_stored_dates(tmp_path, master, store):
+    rows = [(datetime(2025, 1, 1), "cust0", 0)] + new_rows(day=10) + [(datetime(2025, 2, 1), "feb", 1)]
+    csv_path = write_csv(tmp_path / "daily.csv", rows)
+
+    assert run_store_batch(csv_path, master, workers=1) == 4
+    manifest = load_store(store)
+    assert manifest["row_count"] == stored_rows(store) == 24
+    assert set(manifest["parts"]) == {"2025-01", "2025-02"}
+    assert not [name for name in part_files(store) if name.split("/")[1].startswith("_")]
+    assert run_store_batch(csv_path, master, workers=1) == 0
+
+
+def test_replace_rewrites_the_touched_month(tmp_path, master, store):
+    rows = [(datetime(2025, 1, 2), "fixed", 1), (datetime(2025, 1, 2), "fixed", 2)]
+    assert run_store_batch(write_csv(tmp_path / "fixed.csv", rows), master, workers=1, replace=True) == 2
+
+    manifest = load_store(store)
+    assert manifest["dates"]["2025-01-02"] == 2
+    assert manifest["row_count"] == stored_rows(store) == 17
+    assert len(manifest["parts"]["2025-01"]) == 1
+    assert part_files(store) == sorted(manifest["parts"]["2025-01"])
+    frame = pd.read_parquet(store, engine="pyarrow")
+    assert frame.loc[frame["Date"].dt.date == date(2025, 1, 2), "Customer"].tolist() == ["fixed", "fixed"]
+
+
+# Cut off after the manifest was saved: the new part is still staged and the
+# superseded one still in place until the next writer takes the lock
+def test_cut_off_write_is_published_by_the_next_writer(tmp_path, master, store, monkeypatch):
+    def cut_off(store_dir, manifest):
+        store_module.save_store(store_dir, manifest)
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(store_module, "_commit", cut_off)
+    rows = [(datetime(2025, 1, 2), "fixed", 1)]
+    with pytest.raises(KeyboardInterrupt):
+        run_store_batch(write_csv(tmp_path / "fixed.csv", rows), master, workers=1, replace=True)
+    monkeypatch.undo()
+    assert stored_rows(store) == 20  # readers still see the old parts only
+    assert len(part_files(store)) == 2
+
+    with lock_store(store):
+        pass
+    manifest = load_store(store)
+    assert part_files(store) == sorted(manifest["parts"]["2025-01"])
+    assert stored_rows(store) == manifest["row_count"] == 16
+
+
+def test_writers_hold_the_store_lock(store):
+    with lock_store(store):
+        assert try_lock(os.path.normpath(store)) is None
+    lock = try_lock(os.path.normpath(store))
+    assert lock is not None
+    lock.release()
+
+
+def test_export_regenerates_the_master(tmp_path, master, store):
+    run_store_batch(write_csv(tmp_path / "daily.csv", new_rows()), master, workers=1)
+    export_excel(store, master, load_store(store), allow_rewrite=True)
+    values = sheet_values(master)
+    assert len(values) == 1 + 23
+    assert [row[1] for row in values[-3:]] == ["new0", "new1", "new2"]
+    assert sheet_values(master, "Notes") == [("hello",)]
@@ -0,0 +1,64 @@
+import os
+
+from conftest import HEADER, new_rows, sheet_values, write_csv
+from csvtoxcl_updater.index import build_index, get_index, load_index
+from csvtoxcl_updater.journal import begin_journal, journal_path
+from csvtoxcl_updater.watch import _Arrivals, run_watch
+
+
+def crashed_import(master, rows):
+    begin_journal(master, get_index(master), rows, dedup="date", column_count=len(HEADER), date_column=0,
+                  inline_columns=[], allow_rewrite=False)
+
+
+# A file still being copied does not hold back the ones that settled
+def test_settled_files_go_first():
+    arrivals = _Arrivals(settle=3)
+    arrivals.update({"a.csv": (10, 1), "b.csv": (10, 1)}, now=0)
+    assert arrivals.ready(now=2) == []
+    arrivals.update({"a.csv": (10, 1), "b.csv": (20, 2)}, now=2)
+    assert arrivals.ready(now=3) == ["a.csv"]
+    arrivals.finish(["a.csv"])
+    arrivals.update({"a.csv": (10, 1), "b.csv": (20, 2)}, now=4)
+    assert arrivals.ready(now=4) == []
+    assert arrivals.ready(now=5) == ["b.csv"]
+
+
+def test_changed_file_is_imported_again():
+    arrivals = _Arrivals(settle=0)
+    arrivals.skip_existing({"a.csv": (10, 1)})
+    arrivals.update({"a.csv": (10, 1)}, now=0)
+    assert arrivals.ready(now=0) == []
+    arrivals.update({"a.csv": (30, 2)}, now=1)
+    assert arrivals.ready(now=1) == ["a.csv"]
+
+
+# Another updater is half way through an import: a watch that starts meanwhile
+# leaves its journal and temp file alone
+def test_startup_leaves_a_running_import_alone(tmp_path, master):
+    folder = tmp_path / "drop"
+    folder.mkdir()
+    crashed_import(master, new_rows())
+    with open(master + ".tmp", "wb") as f:
+        f.write(b"half written")
+    before = open(master, "rb").read()
+
+    assert run_watch(str(folder), master, workers=1, poll=0.01, once=True) == 0
+    assert os.path.exists(journal_path(master))
+    assert os.path.exists(master + ".tmp")
+    assert open(master, "rb").read() == before
+
+
+# With the lock taken, the unfinished import is replayed before the new files go in
+def test_catch_up_replays_the_journal_under_the_lock(tmp_path, master):
+    folder = tmp_path / "drop"
+    folder.mkdir()
+    crashed_import(master, new_rows(day=10))
+    write_csv(folder / "daily.csv", new_rows(day=11, count=2))
+
+    assert run_watch(str(folder), master, workers=1, poll=0.01, settle=0, catch_up=True, once=True) == 2
+    assert not os.path.exists(journal_path(master))
+    values = sheet_values(master)
+    assert [(row[0].day, row[1]) for row in values[-5:]] == [(10, "new0"), (10, "new1"), (10, "new2"),
+                                                              (11, "new0"), (11, "new1")]
+    assert load_index(master)["date_rows"] == build_index(master)["date_rows"]